@@ -1 +1,5 @@
 from .tick_counter import TickCounter
+from .log_summary import LogSummary, summary_path
+from .board_timeline import BoardTimeline
+from .log_query import LogQuery, compile_expression
+from .json_lines import encode_json, encode_line
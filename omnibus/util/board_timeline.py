@@ -0,0 +1,70 @@
+CAN_TIME_ROLLOVER = 65.536  # boards send their time as a 16 bit count of milliseconds
+ROLLOVER_DROP = 5  # seconds the board time has to go back by to count as a rollover
+ROLLOVER_WINDOW = 10  # seconds after 0 (or before the rollover) a rollover is expected in
+
+
+class BoardTimeline:
+    """
+    Reconstructs a monotonic time for each board from the wrapped time in its
+    CAN messages, one message at a time so it works on live data and on logs
+    streamed from disk alike.
+
+    Times are tracked separately for each key (like a (board, message type)
+    pair). When a key's time jumps back to near 0 it has rolled over, or the
+    board reset and started counting again, and the time is offset from then
+    on: by the rollover period if the time was close to it, otherwise by the
+    last time seen so the timeline carries on from where it stopped.
+
+    Logs can hold a second, delayed copy of the CAN traffic, so messages from
+    before the latest rollover can still turn up after it. A time more than
+    half a rollover period ahead of the latest one is taken to be one of those
+    and placed before the rollover, instead of being dropped or misplaced.
+    """
+
+    def __init__(self, rollover_period=CAN_TIME_ROLLOVER):
+        self.rollover_period = rollover_period
+        self.offsets = {}  # the offset of the current and previous rollover for each key
+        self.latest = {}  # the latest wrapped time seen since the last rollover for each key
+        self.anchors = {}  # the difference between the log time and the board time for each key
+
+    def __contains__(self, key) -> bool:
+        return key in self.latest
+
+    def unwrap(self, key, board_time: float) -> tuple:
+        """
+        Return the monotonic time of a message with the given key and wrapped
+        board time, and whether the key's time rolled over (or reset) with it.
+        """
+        latest = self.latest.get(key)
+        if latest is None:
+            self.latest[key] = board_time
+            self.offsets[key] = (0, None)
+            return board_time, False
+
+        offset, previous_offset = self.offsets[key]
+        if board_time < latest - ROLLOVER_DROP and board_time < ROLLOVER_WINDOW:
+            if latest > self.rollover_period - ROLLOVER_WINDOW:
+                new_offset = offset + self.rollover_period
+            else:
+                new_offset = offset + latest  # a reset, carry on from the last time seen
+            self.offsets[key] = (new_offset, offset)
+            self.latest[key] = board_time
+            return new_offset + board_time, True
+
+        if previous_offset is not None and board_time > latest + self.rollover_period / 2:
+            return previous_offset + board_time, False  # a late message from before the last rollover
+
+        if board_time > latest:
+            self.latest[key] = board_time
+        return offset + board_time, False
+
+    def align(self, key, board_time: float, log_time: float) -> float:
+        """
+        Return the monotonic board time of a message moved onto the log's
+        clock, using the log time of the first message seen with its key.
+        """
+        time, _ = self.unwrap(key, board_time)
+        anchor = self.anchors.get(key)
+        if anchor is None:
+            anchor = self.anchors[key] = log_time - time
+        return time + anchor
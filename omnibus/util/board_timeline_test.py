@@ -0,0 +1,34 @@
+import pytest
+
+from omnibus.util import BoardTimeline
+
+
+class TestBoardTimeline:
+    def test_rollover(self):
+        timeline = BoardTimeline()
+        times = [timeline.unwrap("key", t) for t in [60.0, 65.0, 0.5, 1.0]]
+        assert times == [(60.0, False), (65.0, False),
+                         (pytest.approx(66.036), True), (pytest.approx(66.536), False)]
+
+    def test_keys_are_separate(self):
+        timeline = BoardTimeline()
+        timeline.unwrap("a", 65.0)
+        timeline.unwrap("a", 0.5)
+        assert timeline.unwrap("b", 0.5) == (0.5, False)
+        assert "a" in timeline and "c" not in timeline
+
+    def test_reset(self):
+        timeline = BoardTimeline()
+        timeline.unwrap("key", 20.0)
+        assert timeline.unwrap("key", 1.0) == (21.0, True)
+
+    def test_late_messages(self):
+        # a delayed copy of the messages, 3 seconds behind
+        timeline = BoardTimeline()
+        times = [timeline.unwrap("key", t)[0] for t in [63.0, 60.0, 0.5, 62.5, 1.0, 65.0, 0.5]]
+        assert times == pytest.approx([63.0, 60.0, 66.036, 62.5, 66.536, 65.0, 66.036])
+
+    def test_align(self):
+        timeline = BoardTimeline()
+        assert timeline.align("key", 65.0, 100.0) == 100.0
+        assert timeline.align("key", 0.5, 101.0) == pytest.approx(101.036)
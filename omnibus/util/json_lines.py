@@ -0,0 +1,95 @@
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    # the standard library's json is several times slower, see encode_json_line
+    # for how it's made to write the same JSON
+    orjson = None
+
+
+def json_default(value):
+    """
+    Encode the values msgpack can hold but JSON can't, bytes as hex and
+    anything else as its string.
+    """
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def json_key(key) -> str:
+    """
+    Return the JSON text of a dict key that isn't a string, the way orjson
+    writes numbers, booleans and null as keys, with bytes as hex like
+    json_default.
+    """
+    if isinstance(key, bytes):
+        return key.hex()
+    return json.dumps(key)
+
+
+def json_compatible(value):
+    """
+    Replace what JSON can't hold in a message: floats that aren't finite
+    become null, and dict keys that aren't strings become strings.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key if isinstance(key, str) else json_key(key): json_compatible(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_compatible(item) for item in value]
+    return value
+
+
+def json_text(value) -> str:
+    """
+    Return the JSON of a message, or any part of one, using the standard
+    library. NaN and infinity are written as null and non-string keys as
+    strings like orjson does, rather than as the invalid NaN token or failing
+    on bytes keys.
+    """
+    try:
+        return json.dumps(value, default=json_default, separators=(",", ":"), allow_nan=False)
+    except (ValueError, TypeError):  # only the messages that need it are converted, it's slow
+        return json.dumps(json_compatible(value), default=json_default, separators=(",", ":"))
+
+
+def encode_json_line(message) -> bytes:
+    """
+    Encode a message as a line of JSON with the standard library, see
+    json_text.
+    """
+    return (json_text(message) + "\n").encode()
+
+
+if orjson is not None:
+    def _orjson_dumps(value, options: int) -> bytes:
+        options |= orjson.OPT_NON_STR_KEYS
+        try:
+            return orjson.dumps(value, default=json_default, option=options)
+        except orjson.JSONEncodeError:  # keys orjson can't write, like bytes
+            return orjson.dumps(json_compatible(value), default=json_default, option=options)
+
+    def encode_json(value) -> bytes:
+        """
+        Encode a message, or any part of one, as JSON.
+        """
+        return _orjson_dumps(value, 0)
+
+    def encode_line(message) -> bytes:
+        """
+        Encode a message as a line of JSON.
+        """
+        return _orjson_dumps(message, orjson.OPT_APPEND_NEWLINE)
+else:
+    def encode_json(value) -> bytes:
+        """
+        Encode a message, or any part of one, as JSON.
+        """
+        return json_text(value).encode()
+
+    encode_line = encode_json_line
@@ -0,0 +1,28 @@
+import json
+
+from omnibus.util import encode_json, encode_line
+from omnibus.util.json_lines import encode_json_line, json_text
+
+MESSAGE = ["CAN/Parsley/0", 1.5, {"data": {"value": float("nan"), "limits": [float("-inf"), 2]},
+                                  1: "one", b"\x01": b"\x02", None: True, 2.5: False}]
+EXPECTED = ["CAN/Parsley/0", 1.5, {"data": {"value": None, "limits": [None, 2]},
+                                   "1": "one", "01": "02", "null": True, "2.5": False}]
+
+
+class TestJsonLines:
+    def test_standard_library(self):
+        line = encode_json_line(MESSAGE)
+        assert line.endswith(b"\n") and b"NaN" not in line and b"Infinity" not in line
+        assert json.loads(line) == EXPECTED
+        assert json.loads(json_text(MESSAGE[2])) == EXPECTED[2]
+
+        plain = ["DAQ", 2.0, {"data": {"a": [1, 2]}}]
+        assert encode_json_line(plain) == b'["DAQ",2.0,{"data":{"a":[1,2]}}]\n'
+
+    def test_encoder_in_use(self):
+        # orjson if it's installed, which writes the same JSON
+        line = encode_line(MESSAGE)
+        assert line.endswith(b"\n") and line.count(b"\n") == 1
+        assert json.loads(line) == EXPECTED
+        assert json.loads(encode_json(MESSAGE[2])) == EXPECTED[2]
+        assert b"\n" not in encode_json(MESSAGE)
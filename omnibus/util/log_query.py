@@ -0,0 +1,356 @@
+import ast
+import math
+import operator
+import os
+
+import msgpack
+
+from .log_summary import LogSummary, log_message, summary_path
+
+RESERVED_NAMES = {"channel": "channel", "time": "timestamp", "payload": "payload"}  # names in expressions that aren't payload fields
+STRING_METHODS = ("startswith", "endswith")
+
+COMPARISONS = {
+    ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=",
+    ast.In: "in", ast.NotIn: "not in",
+}
+OPERATORS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b,
+}
+
+
+class _Missing:
+    """
+    Stands in for payload fields a message doesn't have.
+    """
+
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+def get_field(value, path: tuple):
+    """
+    Follow a path of keys (like ("data", "value")) into a message payload,
+    returning MISSING if the payload doesn't have it.
+    """
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return MISSING
+    return value
+
+
+def compare(op, left, right) -> bool:
+    """
+    Compare two values with one of OPERATORS, with values that can't be
+    compared (like a string and a number) comparing as False.
+    """
+    try:
+        return op(left, right)
+    except TypeError:
+        return False
+
+
+def field_path(text: str) -> tuple:
+    """
+    Split a dotted field name like "data.value" into its path of keys.
+    """
+    return tuple(text.split("."))
+
+
+class _ExpressionCompiler:
+    """
+    Turns the syntax tree of a filter expression into the source of a Python
+    function, so the expression is only interpreted once rather than for every
+    message. Field lookups are stored in temporary variables so a message
+    missing a field compares as False instead of raising. While guarded is
+    set, every comparison goes through compare, so one that can't be made is
+    False without affecting the rest of the expression.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.guarded = False
+        self.constants = {}
+        self.temporaries = 0
+
+    def error(self, node, message: str):
+        return ValueError(f"{message} in query {self.expression!r} "
+                          f"(at column {getattr(node, 'col_offset', 0) + 1})")
+
+    def constant(self, value) -> str:
+        name = f"_c{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def temporary(self) -> str:
+        self.temporaries += 1
+        return f"_v{self.temporaries}"
+
+    def path(self, node) -> tuple | None:
+        """
+        The path of keys of a field like data.value or data["value"], or None
+        if the node isn't a field.
+        """
+        if isinstance(node, ast.Name):
+            if node.id == "payload":
+                return ()  # payload.data is the same field as data
+            return None if node.id in RESERVED_NAMES else (node.id,)
+        if isinstance(node, ast.Attribute):
+            parent = self.path(node.value)
+            return None if parent is None else parent + (node.attr,)
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant):
+            parent = self.path(node.value)
+            return None if parent is None else parent + (node.slice.value,)
+        return None
+
+    def operand(self, node) -> tuple[str, str | None]:
+        """
+        Compile one side of a comparison, returning its source and the check
+        that it's present (for payload fields).
+        """
+        if isinstance(node, ast.Name) and node.id in RESERVED_NAMES:
+            return RESERVED_NAMES[node.id], None
+        path = self.path(node)
+        if path is not None:
+            temporary = self.temporary()
+            lookup = f"({temporary} := payload.get({path[0]!r}, _MISSING) " \
+                "if isinstance(payload, dict) else _MISSING)" if len(path) == 1 \
+                else f"({temporary} := _get(payload, {path!r}))"
+            return temporary, f"{lookup} is not _MISSING"
+        if isinstance(node, ast.Constant):
+            return self.constant(node.value), None
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) \
+                and isinstance(node.operand, ast.Constant):
+            return self.constant(-node.operand.value), None
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            values = [self.literal(element) for element in node.elts]
+            try:
+                return self.constant(frozenset(values)), None
+            except TypeError:  # unhashable values, like lists
+                return self.constant(tuple(values)), None
+        raise self.error(node, f"Unsupported value {ast.dump(node)}")
+
+    def literal(self, node):
+        try:
+            return ast.literal_eval(node)
+        except ValueError:
+            raise self.error(node, "Lists can only hold constants") from None
+
+    def compile(self, node) -> str:
+        if isinstance(node, ast.Expression):
+            return self.compile(node.body)
+        if isinstance(node, ast.BoolOp):
+            joiner = " and " if isinstance(node.op, ast.And) else " or "
+            return "(" + joiner.join(self.compile(value) for value in node.values) + ")"
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return f"(not {self.compile(node.operand)})"
+        if isinstance(node, ast.Compare):
+            parts = []
+            left, left_check = self.operand(node.left)
+            checks = [left_check]
+            for op, comparator in zip(node.ops, node.comparators):
+                if type(op) not in COMPARISONS:
+                    raise self.error(node, f"Unsupported comparison {type(op).__name__}")
+                right, right_check = self.operand(comparator)
+                checks.append(right_check)
+                if self.guarded:
+                    parts.append(f"_compare({self.constant(OPERATORS[type(op)])}, {left}, {right})")
+                else:
+                    parts.append(f"{left} {COMPARISONS[type(op)]} {right}")
+                left = right
+            # the presence checks come first, they're also what assigns the field temporaries
+            return "(" + " and ".join([check for check in checks if check] + parts) + ")"
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and node.func.attr in STRING_METHODS and not node.keywords:
+            value, check = self.operand(node.func.value)
+            if not all(isinstance(arg, ast.Constant) for arg in node.args):
+                raise self.error(node, f"{node.func.attr} only takes constants")
+            args = ", ".join(self.operand(arg)[0] for arg in node.args)
+            checks = [check] if check else []
+            return "(" + " and ".join(checks + [f"isinstance({value}, str)",
+                                                f"{value}.{node.func.attr}({args})"]) + ")"
+        # anything else has to be a field or constant, which is tested for truth
+        value, check = self.operand(node)
+        return f"({check} and bool({value}))" if check else f"bool({value})"
+
+
+def compile_expression(expression: str):
+    """
+    Compile a filter expression into a predicate called with the channel,
+    timestamp and payload of a message, returning whether it matches.
+
+    Expressions are Python syntax over the fields of the payload (like
+    data.value or data["value"]), the message's channel, its logged time and
+    the whole payload (for payloads that aren't dicts), for example:
+    msg_type == "SENSOR_ANALOG" and data.value > 3000. Comparisons (including
+    in and chained ones like 1 < time < 5), and, or, not and the startswith and
+    endswith string methods are supported. A comparison with a field a message
+    doesn't have, or with a value of the wrong type, is False, so
+    not (data.value > 3) matches a message whose value is a string.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid query {expression!r}: {e.msg}") from None
+    compiler = _ExpressionCompiler(expression)
+    body = compiler.compile(tree)
+    # plain comparisons are much faster, so the guarded version is only run for
+    # the messages with a comparison that raised
+    compiler.guarded = True
+    guarded_body = compiler.compile(tree)
+    source = ("def predicate(channel, timestamp, payload):\n"
+              "    try:\n"
+              f"        return {body}\n"
+              "    except TypeError:\n"
+              f"        return {guarded_body}\n")
+    namespace = {"_get": get_field, "_MISSING": MISSING, "_compare": compare, **compiler.constants}
+    exec(compile(source, "<query>", "exec"), namespace)
+    return namespace["predicate"]
+
+
+def _bounds(node, start: float, stop: float) -> tuple[float, float]:
+    """
+    Narrow the time range [start, stop] by the time comparisons every message
+    matching the expression has to pass.
+    """
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        for value in node.values:
+            start, stop = _bounds(value, start, stop)
+        return start, stop
+    if not isinstance(node, ast.Compare):
+        return start, stop
+    operands = [node.left] + node.comparators
+    for left, op, right in zip(operands, node.ops, operands[1:]):
+        if isinstance(right, ast.Name) and right.id == "time":
+            # flip 3 < time into time > 3
+            left, right = right, left
+            op = {ast.Lt: ast.Gt(), ast.LtE: ast.GtE(), ast.Gt: ast.Lt(), ast.GtE: ast.LtE()}.get(type(op), op)
+        if not (isinstance(left, ast.Name) and left.id == "time"):
+            continue
+        try:
+            value = float(ast.literal_eval(right))
+        except (ValueError, TypeError):
+            continue
+        if isinstance(op, (ast.Gt, ast.GtE, ast.Eq)):
+            start = max(start, value)
+        if isinstance(op, (ast.Lt, ast.LtE, ast.Eq)):
+            stop = min(stop, value)
+    return start, stop
+
+
+def _channel_prefix(node) -> str | None:
+    """
+    The channel prefix every message matching the expression has, if it's
+    limited to one by channel == "..." or channel.startswith("...").
+    """
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        prefixes = [p for p in map(_channel_prefix, node.values) if p is not None]
+        return max(prefixes, key=len) if prefixes else None
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], ast.Eq):
+        sides = [node.left, node.comparators[0]]
+        for side, other in (sides, sides[::-1]):
+            if isinstance(side, ast.Name) and side.id == "channel" \
+                    and isinstance(other, ast.Constant) and isinstance(other.value, str):
+                return other.value
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+            and node.func.attr == "startswith" and isinstance(node.func.value, ast.Name) \
+            and node.func.value.id == "channel" and len(node.args) == 1 \
+            and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+        return node.args[0].value
+    return None
+
+
+class LogQuery:
+    """
+    A filter over the messages of Global Log files: a channel prefix, a range
+    of logged times and an expression over the payload (see
+    compile_expression), all optional. The expression is compiled once, and
+    when the log has an up to date summary its index is used to skip the
+    blocks of the log that can't hold matching messages, including the time
+    and channel limits the expression itself implies.
+    """
+
+    def __init__(self, expression: str | None = None, channel: str = "",
+                 start: float | None = None, stop: float | None = None):
+        self.expression = expression
+        self.channel = channel
+        self.predicate = compile_expression(expression) if expression else None
+        self.start = -math.inf if start is None else start
+        self.stop = math.inf if stop is None else stop
+        self.index_channel = channel
+        if expression:
+            tree = ast.parse(expression, mode="eval").body
+            self.start, self.stop = _bounds(tree, self.start, self.stop)
+            prefix = _channel_prefix(tree)
+            if prefix is not None and len(prefix) > len(channel) and prefix.startswith(channel):
+                self.index_channel = prefix
+
+    def matches(self, channel: str, timestamp: float, payload) -> bool:
+        """
+        Check if a message passes the query.
+        """
+        if not channel.startswith(self.channel) or not self.start <= timestamp <= self.stop:
+            return False
+        return self.predicate is None or self.predicate(channel, timestamp, payload)
+
+    def byte_ranges(self, log_path) -> list[tuple[int, int]]:
+        """
+        The (start, end) byte ranges of the log that can hold matching
+        messages, going by the log's summary. The whole log is a single range
+        if it doesn't have a summary. The part of the log written after the
+        summary was last saved is always included.
+        """
+        size = os.path.getsize(log_path)
+        summary = LogSummary.load(summary_path(log_path))
+        if summary is None or summary.size > size or not summary.index:
+            return [(0, size)] if size else []
+
+        ranges = []
+        has_channel = any(channel.startswith(self.index_channel) for channel in summary.channels)
+        if has_channel:
+            ends = [offset for offset, _, _ in summary.index[1:]] + [summary.size]
+            for (offset, first, last), end in zip(summary.index, ends):
+                if last < self.start or first > self.stop:
+                    continue
+                if ranges and ranges[-1][1] == offset:
+                    ranges[-1] = (ranges[-1][0], end)
+                else:
+                    ranges.append((offset, end))
+        if size > summary.size:
+            if ranges and ranges[-1][1] == summary.size:
+                ranges[-1] = (ranges[-1][0], size)
+            else:
+                ranges.append((summary.size, size))
+        return ranges
+
+    def run_range(self, log_path, start: int, end: int):
+        """
+        Yield the matching (channel, timestamp, payload) messages that start
+        between byte offsets start and end of the log, in log order. Records
+        that aren't messages are skipped, see log_message.
+        """
+        matches = self.matches
+        with open(log_path, "rb") as infile:
+            infile.seek(start)
+            unpacker = msgpack.Unpacker(infile)
+            for record in unpacker:
+                message = log_message(record)
+                if message is not None and matches(*message):
+                    yield message
+                if start + unpacker.tell() >= end:
+                    break
+
+    def run(self, log_path):
+        """
+        Yield every matching (channel, timestamp, payload) message of the log,
+        in log order.
+        """
+        for start, end in self.byte_ranges(log_path):
+            yield from self.run_range(log_path, start, end)
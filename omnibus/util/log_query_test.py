@@ -0,0 +1,105 @@
+import msgpack
+import pytest
+
+from omnibus.util import LogQuery, LogSummary, compile_expression, summary_path
+from omnibus.util import log_summary
+
+
+def can(time, msg_type, value=None, sensor_id="SENSOR_PRESSURE_OX", **data):
+    data = {"time": time, "sensor_id": sensor_id, **data}
+    if value is not None:
+        data["value"] = value
+    return ["CAN/Parsley", time, {"board_id": "SENSOR", "msg_type": msg_type, "data": data}]
+
+
+MESSAGES = [
+    can(1.0, "SENSOR_ANALOG", 2000),
+    ["DAQ", 1.5, {"timestamp": 1.5, "data": {"fake0": [0, 0]}}],
+    can(2.0, "SENSOR_ANALOG", 4000),
+    can(3.0, "ACTUATOR_STATUS", actuator="ACTUATOR_INJECTOR_VALVE", cur_state="ACTUATOR_ON"),
+    can(4.0, "SENSOR_ANALOG", 5000, sensor_id="SENSOR_PRESSURE_FUEL"),
+]
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / "test.log"
+    with open(path, "wb") as f:
+        for message in MESSAGES:
+            f.write(msgpack.packb(message))
+    return path
+
+
+def matching(expression):
+    predicate = compile_expression(expression)
+    return [m[1] for m in MESSAGES if predicate(*m)]
+
+
+class TestCompileExpression:
+    def test_fields(self):
+        assert matching('msg_type == "SENSOR_ANALOG" and data.value > 3000') == [2.0, 4.0]
+        assert matching('data["sensor_id"] in ["SENSOR_PRESSURE_FUEL"]') == [4.0]
+        assert matching('data.actuator == "ACTUATOR_INJECTOR_VALVE"') == [3.0]
+        assert matching('payload.data.actuator == "ACTUATOR_INJECTOR_VALVE"') == [3.0]
+
+    def test_missing_fields(self):
+        # messages without the field don't match, but don't stop the rest of the expression either
+        assert matching('data.value < 3000 or msg_type == "ACTUATOR_STATUS"') == [1.0, 3.0]
+        assert matching('not data.value') == [1.5, 3.0]
+
+    def test_channel_and_time(self):
+        assert matching('channel.startswith("DAQ")') == [1.5]
+        assert matching('1.5 <= time < 3') == [1.5, 2.0]
+        assert matching('time > -1 and channel == "DAQ"') == [1.5]
+
+    def test_wrong_types(self):
+        assert matching('msg_type > 3') == []
+        # a comparison that can't be made is False on its own, the rest of the expression still counts
+        assert matching('msg_type > 3 or channel == "DAQ"') == [1.5]
+        assert matching('not msg_type > 3') == [m[1] for m in MESSAGES]
+        assert matching('data.value > "a" or data.value > 4500') == [4.0]
+        unhashable = compile_expression('data.value in ["a", "b"] or time > 1')
+        assert unhashable("CAN", 2.0, {"data": {"value": [1]}})
+        assert not unhashable("CAN", 0.5, {"data": {"value": [1]}})
+
+    def test_payloads_that_arent_dicts(self):
+        predicate = compile_expression('msg_type == "A" or channel == "DAQ"')
+        assert predicate("DAQ", 1.0, 5)
+        assert not predicate("CAN", 1.0, [1, 2])
+        assert compile_expression('not msg_type == "A"')("DAQ", 1.0, 5)
+        assert compile_expression('not data.value')("DAQ", 1.0, "text")
+        assert compile_expression('payload == 5 and time < 2')("DAQ", 1.0, 5)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            compile_expression("msg_type ==")
+        with pytest.raises(ValueError):
+            compile_expression("__import__('os')")
+
+
+class TestLogQuery:
+    def test_run(self, log_path):
+        query = LogQuery('data.value >= 4000', channel="CAN", start=0, stop=3)
+        assert [m[1] for m in query.run(log_path)] == [2.0]
+
+    def test_records_that_arent_messages(self, tmp_path):
+        # the NI source's .dat backups hold bare DAQ payloads
+        path = tmp_path / "log_1.dat"
+        with open(path, "wb") as f:
+            for record in [{"timestamp": 1.0, "data": {"fake0": [0, 0]}}, ["DAQ", 2.0], "junk",
+                           [1, 3.0, {}], {"data": {}}, MESSAGES[2]]:
+                f.write(msgpack.packb(record))
+        assert list(LogQuery(channel="DAQ").run(path)) == [("DAQ", 1.0, {"timestamp": 1.0, "data": {"fake0": [0, 0]}})]
+        assert [m[1] for m in LogQuery('data.value > 0').run(path)] == [2.0]
+
+    def test_index(self, log_path, monkeypatch):
+        monkeypatch.setattr(log_summary, "INDEX_BLOCK_SIZE", 1)  # a block per message
+        summary = LogSummary.for_log(log_path)
+        assert len(summary.index) == len(MESSAGES)
+
+        query = LogQuery('time >= 2 and time <= 3.5 and msg_type == "SENSOR_ANALOG"')
+        assert query.byte_ranges(log_path) == [(summary.index[2][0], summary.index[4][0])]
+        assert [m[1] for m in query.run(log_path)] == [2.0]
+
+        assert LogQuery('channel == "RLCS"').byte_ranges(log_path) == []
+        assert LogQuery(channel="DAQ").byte_ranges(log_path) == [(0, summary.size)]
@@ -0,0 +1,230 @@
+import os
+
+import msgpack
+
+SUMMARY_SUFFIX = ".summary"  # appended to the log file name to get the sidecar's name
+SUMMARY_VERSION = 3  # bumped when the meaning of a field changes, so old sidecars are rebuilt
+INDEX_BLOCK_SIZE = 256 * 1024  # bytes of log covered by each index entry
+
+
+def summary_path(log_path) -> str:
+    """
+    Return the path of the summary sidecar that belongs to a log file.
+    """
+    return f"{log_path}{SUMMARY_SUFFIX}"
+
+
+def can_signature(payload: dict) -> tuple:
+    """
+    Return the (board_id, msg_type, sensor_id, actuator) signature of a parsed
+    CAN message. Parts that are missing from the message are None.
+    """
+    data = payload.get("data")
+    if not isinstance(data, dict):
+        data = {}
+    return (payload.get("board_id"), payload.get("msg_type"),
+            data.get("sensor_id"), data.get("actuator"))
+
+
+def log_message(record):
+    """
+    Return a record unpacked from a log as a (channel, timestamp, payload)
+    message, or None if it isn't one. Besides [channel, timestamp, payload]
+    lists, the log_*.dat backups written by the NI source hold bare DAQ
+    payloads, which are messages on the DAQ channel.
+    """
+    if isinstance(record, dict):
+        timestamp = record.get("timestamp")
+        channel, payload = "DAQ", record
+    elif isinstance(record, list) and len(record) == 3 and isinstance(record[0], str):
+        channel, timestamp, payload = record
+    else:
+        return None
+    if not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool):
+        return None
+    return channel, timestamp, payload
+
+
+class LogSummary:
+    """
+    Running statistics about a Global Log file, kept in a sidecar next to it.
+
+    For every channel this tracks the number of messages, the smallest and
+    largest timestamp seen and the number of bytes used. It also remembers the
+    fields present in DAQ messages and the signatures of parsed CAN messages so
+    tools can find out which columns a log has without reading the log itself.
+
+    The summary covers the first `size` bytes of the log, so a summary left
+    behind by a crashed logger can be brought up to date by scanning only the
+    part of the log written after its last checkpoint.
+
+    The log is also indexed in blocks of about INDEX_BLOCK_SIZE bytes. Each
+    entry of `index` is [offset, min timestamp, max timestamp] for the block
+    starting at that byte offset, which lets readers jump to a point in time
+    without reading everything before it, even if timestamps aren't in order.
+    """
+
+    def __init__(self):
+        self.size = 0  # number of bytes of the log that have been summarized
+        self.count = 0
+        self.start = None  # smallest timestamp seen
+        self.end = None  # largest timestamp seen
+        self.channels = {}
+        # dicts are used as ordered sets so columns keep the order they're encountered in
+        self.daq_fields = {}
+        self.can_signatures = {}
+        self.index = []
+
+    def add(self, channel: str, timestamp: float, payload, size: int):
+        """
+        Add one message that takes up size bytes in the log to the summary.
+        """
+        stats = self.channels.get(channel)
+        if stats is None:
+            stats = self.channels[channel] = {
+                "count": 0, "first": timestamp, "last": timestamp, "bytes": 0}
+        stats["count"] += 1
+        # timestamps aren't always in order (like the delayed copy of the CAN stream)
+        if timestamp < stats["first"]:
+            stats["first"] = timestamp
+        elif timestamp > stats["last"]:
+            stats["last"] = timestamp
+        stats["bytes"] += size
+
+        block = self.index[-1] if self.index else None
+        if block is None or self.size - block[0] >= INDEX_BLOCK_SIZE:
+            self.index.append([self.size, timestamp, timestamp])
+        elif timestamp < block[1]:
+            block[1] = timestamp
+        elif timestamp > block[2]:
+            block[2] = timestamp
+
+        self.size += size
+        self.count += 1
+        if self.start is None or timestamp < self.start:
+            self.start = timestamp
+        if self.end is None or timestamp > self.end:
+            self.end = timestamp
+
+        # the logger records whatever is on the bus, so don't trust payloads to be well formed
+        if not isinstance(payload, dict):
+            return
+        if channel.startswith("DAQ"):
+            data = payload.get("data")
+            for field in data if isinstance(data, dict) else ():
+                if field not in self.daq_fields:
+                    self.daq_fields[field] = None
+        elif channel.startswith("CAN/Parsley"):
+            signature = can_signature(payload)
+            if signature not in self.can_signatures:
+                self.can_signatures[signature] = None
+
+    def scan(self, infile):
+        """
+        Summarize every complete message in infile past the bytes already covered.
+        Records that aren't messages are skipped.
+        """
+        infile.seek(self.size)
+        base = self.size
+        unpacker = msgpack.Unpacker(infile)
+        for record in unpacker:
+            offset = base + unpacker.tell()
+            message = log_message(record)
+            if message is not None:
+                self.add(*message, offset - self.size)
+            else:
+                self.size = offset  # not a message, so there's nothing to summarize
+
+    def seek_offset(self, timestamp: float) -> int:
+        """
+        Return the byte offset to start reading from to see every message with a
+        timestamp at or after the given one.
+        """
+        for offset, _, max_timestamp in self.index:
+            if max_timestamp >= timestamp:
+                return offset
+        return self.size
+
+    def end_offset(self, timestamp: float) -> int:
+        """
+        Return the byte offset after which no message has a timestamp at or
+        before the given one.
+        """
+        end = 0
+        for i, (_, min_timestamp, _) in enumerate(self.index):
+            if min_timestamp <= timestamp:
+                end = self.index[i + 1][0] if i + 1 < len(self.index) else self.size
+        return end
+
+    def to_dict(self) -> dict:
+        return {
+            "version": SUMMARY_VERSION,
+            "size": self.size,
+            "count": self.count,
+            "start": self.start,
+            "end": self.end,
+            "channels": self.channels,
+            "daq_fields": list(self.daq_fields),
+            "can_signatures": [list(s) for s in self.can_signatures],
+            "index": self.index,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogSummary":
+        if data.get("version") != SUMMARY_VERSION:
+            raise ValueError(f"Unsupported log summary version {data.get('version')}")
+        summary = cls()
+        summary.size = data["size"]
+        summary.count = data["count"]
+        summary.start = data["start"]
+        summary.end = data["end"]
+        summary.channels = data["channels"]
+        summary.daq_fields = dict.fromkeys(data["daq_fields"])
+        summary.can_signatures = dict.fromkeys(tuple(s) for s in data["can_signatures"])
+        summary.index = data["index"]
+        return summary
+
+    def save(self, path):
+        """
+        Write the summary to path, replacing any previous summary atomically so
+        a crash while checkpointing never leaves a corrupt sidecar behind.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(msgpack.packb(self.to_dict()))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> "LogSummary | None":
+        """
+        Read a summary sidecar, returning None if it's missing or unreadable.
+        """
+        try:
+            with open(path, "rb") as f:
+                return cls.from_dict(msgpack.unpackb(f.read()))
+        except (OSError, ValueError, KeyError, TypeError, msgpack.UnpackException):
+            return None
+
+    @classmethod
+    def for_log(cls, log_path, save=True) -> "LogSummary":
+        """
+        Return the summary of a log file, reading its sidecar if there is one.
+
+        Logs without a sidecar (or with one that's behind the log) are scanned
+        from where the sidecar left off, and the sidecar is updated so later
+        calls don't need to read the log at all. Logs where the sidecar can't
+        be written (like in a read-only directory) just get the summary.
+        """
+        summary = cls.load(summary_path(log_path))
+        log_size = os.path.getsize(log_path)
+        if summary is None or summary.size > log_size:
+            summary = cls()
+        if summary.size < log_size:
+            with open(log_path, "rb") as f:
+                summary.scan(f)
+            if save:
+                try:
+                    summary.save(summary_path(log_path))
+                except OSError:
+                    pass  # the sidecar only saves rescanning, the summary is still right
+        return summary
@@ -0,0 +1,107 @@
+import msgpack
+import pytest
+
+from omnibus.util import LogSummary, summary_path
+
+MESSAGES = [
+    ["DAQ", 1.0, {"timestamp": 1.0, "data": {"fake0": [0, 0], "fake1": [1, 1]}}],
+    ["CAN/Parsley/0", 2.0, {"board_id": "CHARGING", "msg_type": "SENSOR_ANALOG",
+                            "data": {"time": 1.5, "sensor_id": "SENSOR_BATT_CURR", "value": 3}}],
+    ["DAQ", 3.0, {"timestamp": 3.0, "data": {"fake1": [1, 1], "fake2": [2, 2]}}],
+    ["RLCS", 4.0, {"state": 1}],
+]
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / "test.log"
+    with open(path, "wb") as f:
+        for message in MESSAGES:
+            f.write(msgpack.packb(message))
+    return path
+
+
+class TestLogSummary:
+    def test_scan(self, log_path):
+        summary = LogSummary()
+        with open(log_path, "rb") as f:
+            summary.scan(f)
+
+        assert summary.count == 4
+        assert summary.size == log_path.stat().st_size
+        assert (summary.start, summary.end) == (1.0, 4.0)
+        assert summary.channels["DAQ"]["count"] == 2
+        assert summary.channels["DAQ"]["first"] == 1.0
+        assert summary.channels["DAQ"]["last"] == 3.0
+        assert list(summary.daq_fields) == ["fake0", "fake1", "fake2"]
+        assert list(summary.can_signatures) == [
+            ("CHARGING", "SENSOR_ANALOG", "SENSOR_BATT_CURR", None)]
+
+    def test_out_of_order_timestamps(self):
+        summary = LogSummary()
+        for timestamp in [2.0, 1.0, 3.0, 2.5]:
+            summary.add("CAN/Parsley/0", timestamp, {}, 10)
+
+        assert summary.channels["CAN/Parsley/0"]["first"] == 1.0
+        assert summary.channels["CAN/Parsley/0"]["last"] == 3.0
+
+    def test_scan_ni_backup(self, tmp_path):
+        # the NI source's backups hold bare DAQ payloads instead of messages
+        path = tmp_path / "log_0.dat"
+        with open(path, "wb") as f:
+            for message in MESSAGES:
+                if message[0] == "DAQ":
+                    f.write(msgpack.packb(message[2]))
+            f.write(msgpack.packb("not a message"))
+
+        summary = LogSummary.for_log(path)
+        assert summary.count == 2
+        assert summary.size == path.stat().st_size
+        assert summary.channels["DAQ"]["first"] == 1.0
+        assert summary.channels["DAQ"]["last"] == 3.0
+        assert list(summary.daq_fields) == ["fake0", "fake1", "fake2"]
+
+    def test_scan_malformed_records(self, tmp_path):
+        path = tmp_path / "test.log"
+        with open(path, "wb") as f:
+            for record in [[1, 2.0, {}], ["DAQ", "late", {}], ["DAQ", True, {}], ["DAQ", 1.0],
+                           {"timestamp": None}, ["DAQ", 2.0, {"data": 5}], ["RLCS", 3.0, "state"],
+                           MESSAGES[0]]:
+                f.write(msgpack.packb(record))
+
+        summary = LogSummary.for_log(path)
+        assert summary.count == 3
+        assert summary.size == path.stat().st_size
+        assert (summary.start, summary.end) == (1.0, 3.0)
+        assert list(summary.daq_fields) == ["fake0", "fake1"]
+
+    def test_for_log_read_only(self, log_path, monkeypatch):
+        # a log somewhere the sidecar can't be written still gets summarized
+        def save(self, path):
+            raise PermissionError("read-only file system")
+        monkeypatch.setattr(LogSummary, "save", save)
+
+        summary = LogSummary.for_log(log_path)
+        assert summary.count == 4
+        assert LogSummary.load(summary_path(log_path)) is None
+
+    def test_save_load(self, log_path, tmp_path):
+        summary = LogSummary()
+        with open(log_path, "rb") as f:
+            summary.scan(f)
+        summary.save(tmp_path / "test.summary")
+
+        loaded = LogSummary.load(tmp_path / "test.summary")
+        assert loaded.to_dict() == summary.to_dict()
+        assert LogSummary.load(tmp_path / "missing.summary") is None
+
+    def test_for_log_continues_stale_summary(self, log_path):
+        # summarize only the first message, as if the logger crashed after a checkpoint
+        partial = LogSummary()
+        partial.add(*MESSAGES[0], len(msgpack.packb(MESSAGES[0])))
+        partial.save(summary_path(log_path))
+
+        summary = LogSummary.for_log(log_path)
+        assert summary.count == 4
+        assert summary.size == log_path.stat().st_size
+        assert LogSummary.load(summary_path(log_path)).count == 4
@@ -3,3 +3,10 @@ GRAPH_RESOLUTION = 10  # data points per second
 GRAPH_STEP = GRAPH_DURATION / 60  # how often to shift the graphs left in seconds.
 # last n seconds to be accounted for in running average, please don't set it larger than GRAPH_DURATION
 RUNNING_AVG_DURATION = 2
+# the fastest rate in Hz a numeric stream is expected to publish at. DAQ sensors come in at
+# 50 Hz (1000 Hz read in bulks of 20) and CAN sensors slower, this leaves room for replaying
+# logs a few times faster than real time. Streams faster than this only keep the latest
+# SERIES_CAPACITY samples, so their plots and running extremes cover less than GRAPH_DURATION
+MAX_STREAM_RATE = 500
+# samples of history kept for each numeric stream (16 bytes per sample, stored twice)
+SERIES_CAPACITY = GRAPH_DURATION * MAX_STREAM_RATE
@@ -36,6 +36,7 @@ from publisher import publisher
 from typing import Optional
 from omnibus import Sender
 from items.dashboard_item import DashboardItem
+from ingest import DROPPED_STREAM, LAG_STREAM
 
 # These need to be imported to be added to the registry
 from items.plot_dash_item import PlotDashItem
@@ -49,6 +50,8 @@ from items.can_sender import CanSender
 from items.standard_display_item import StandardDisplayItem
 
 
+LAG_WARNING = 0.5  # seconds behind the incoming messages the dashboard has to be to show it
+
 pyqtgraph.setConfigOption('background', 'w')
 pyqtgraph.setConfigOption('foreground', 'k')
 
@@ -127,6 +130,9 @@ class Dashboard(QWidget):
         # Called every frame to get new data
         self.callback = callback
 
+        # Dash items with new data to draw at the end of the frame, see DashboardItem.mark_dirty
+        self.dirty_items = []
+
         # Dictionary to map rectitems to widgets and dashitems
         self.widgets: dict[QGraphicsRectItem, tuple[QGraphicsProxyWidget, DashboardItem]] = {}
 
@@ -266,6 +272,15 @@ class Dashboard(QWidget):
         help_action = add_help_menu.addAction("Omnibus Help")
         help_action.triggered.connect(self.help)
 
+        # Show when the dashboard falls behind the incoming messages
+        self.lag_label = QLabel("")
+        self.lag_label.setStyleSheet("color: red; padding-right: 5px")
+        menubar.setCornerWidget(self.lag_label)
+        self.lag = 0
+        self.dropped = 0
+        publisher.subscribe(LAG_STREAM, self.show_lag)
+        publisher.subscribe(DROPPED_STREAM, self.show_dropped)
+
         self.layout.setMenuBar(menubar)
 
         # Set the counter
@@ -401,6 +416,24 @@ class Dashboard(QWidget):
 
                 self.lockableActions.append(new_action)
 
+    def show_lag(self, stream, payload):
+        _, self.lag = payload
+        self.update_lag_label()
+
+    def show_dropped(self, stream, payload):
+        _, self.dropped = payload
+        self.update_lag_label()
+
+    def update_lag_label(self):
+        warnings = []
+        if self.lag >= LAG_WARNING:
+            warnings.append(f"Behind by {self.lag:.1f} s")
+        if self.dropped:
+            warnings.append(f"Dropped {self.dropped} messages")
+        text = ", ".join(warnings)
+        if text != self.lag_label.text():
+            self.lag_label.setText(text)
+
     def send_can_message(self, stream, payload):
         payload['parsley'] = self.parsley_instance
         self.omnibus_sender.send("CAN/Commands", payload)
@@ -519,6 +552,8 @@ class Dashboard(QWidget):
         self.scene.removeItem(item)
         proxy.deleteLater()
         dashitem.on_delete()
+        if dashitem.dirty:
+            self.dirty_items.remove(dashitem)
 
     # Method to remove all widgets
     def remove_all(self, hide_confirm=False):
@@ -825,6 +860,18 @@ class Dashboard(QWidget):
     def update(self):
         self.counter.tick()
         self.callback()
+        self.render_dirty()
+
+    def schedule_render(self, dashitem):
+        self.dirty_items.append(dashitem)
+
+    # Method to draw the new data of every dash item that got some this frame,
+    # once each however many messages they got
+    def render_dirty(self):
+        dirty_items, self.dirty_items = self.dirty_items, []
+        for dashitem in dirty_items:
+            dashitem.dirty = False
+            dashitem.render()
 
     # Method to center the view
     def reset_zoom(self):
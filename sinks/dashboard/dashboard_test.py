@@ -0,0 +1,66 @@
+import pytest
+
+from items.dashboard_item import DashboardItem
+
+# the dashboard needs parsley for its CAN senders
+Dashboard = pytest.importorskip("dashboard").Dashboard
+
+
+class StubDashboard:
+    """
+    The render scheduling of the dashboard, without its window.
+    """
+
+    def __init__(self):
+        self.dirty_items = []
+
+    schedule_render = Dashboard.schedule_render
+    render_dirty = Dashboard.render_dirty
+
+
+class StubItem:
+    """
+    A dash item that counts its renders, without its widgets.
+    """
+
+    def __init__(self, dashboard):
+        self.dashboard = dashboard
+        self.dirty = False
+        self.renders = 0
+        self.mark_again = False
+
+    mark_dirty = DashboardItem.mark_dirty
+
+    def render(self):
+        assert not self.dirty  # cleared before rendering, so the render can ask for another
+        self.renders += 1
+        if self.mark_again:
+            self.mark_again = False
+            self.mark_dirty()
+
+
+class TestRenderDirty:
+    def test_dirty_items_render_once(self):
+        dashboard = StubDashboard()
+        clean, dirty = StubItem(dashboard), StubItem(dashboard)
+        for _ in range(3):
+            dirty.mark_dirty()
+        assert dirty.dirty and dashboard.dirty_items == [dirty]
+
+        dashboard.render_dirty()
+        assert (clean.renders, dirty.renders) == (0, 1)
+        assert not dirty.dirty and dashboard.dirty_items == []
+
+        dashboard.render_dirty()  # a frame without new data
+        assert dirty.renders == 1
+
+    def test_marked_while_rendering(self):
+        dashboard = StubDashboard()
+        item = StubItem(dashboard)
+        item.mark_again = True
+        item.mark_dirty()
+
+        dashboard.render_dirty()
+        assert item.renders == 1 and item.dirty and dashboard.dirty_items == [item]
+        dashboard.render_dirty()
+        assert item.renders == 2 and not item.dirty
@@ -0,0 +1,91 @@
+import collections
+import threading
+import time
+
+FRAME_BUDGET = 0.008  # seconds of each frame spent publishing messages, leaving the rest for drawing
+MAX_BACKLOG = 200000  # parsed messages waiting to be published before the oldest are dropped
+POLL_TIMEOUT = 100  # ms the ingestion thread waits for a message before checking if it should stop
+LAG_STREAM = "Dashboard/Lag"  # stream the lag behind incoming messages is published on
+DROPPED_STREAM = "Dashboard/Dropped"  # stream the number of messages dropped from a full backlog is published on
+LAG_INTERVAL = 0.5  # seconds between publishing the lag and dropped messages
+
+
+class Ingestor:
+    """
+    Receives, decodes and parses messages on a background thread, so bursts of
+    messages don't hold up the GUI. Parsed messages are handed over through a
+    deque (which is safe to append to and pop from on different threads
+    without a lock) and published on the GUI thread, a frame's time budget at a
+    time. Anything that doesn't fit in a frame waits for the next one, and how
+    far behind the dashboard is gets published on LAG_STREAM. If it falls
+    MAX_BACKLOG messages behind the oldest are dropped, and how many have been
+    dropped so far gets published on DROPPED_STREAM.
+    """
+
+    def __init__(self, make_receiver, parse):
+        # the receiver is made on the ingestion thread, since sockets can't be shared between threads
+        self.make_receiver = make_receiver
+        self.parse = parse
+        # (time received, [(stream, payload), ...]) for every message, oldest first
+        self.pending = collections.deque(maxlen=MAX_BACKLOG)
+        self.dropped = 0
+        self.lag = 0
+        self.last_lag_time = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="ingestion", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        receiver = self.make_receiver()
+        pending = self.pending
+        while not self.stopped.is_set():
+            try:
+                msg = receiver.recv_message(POLL_TIMEOUT)
+            except Exception as e:  # like a message that isn't valid msgpack
+                print(f"Error receiving message: {e!r}")
+                # wait before trying again, in case the socket itself is broken
+                self.stopped.wait(POLL_TIMEOUT / 1000)
+                continue
+            if msg is None:
+                continue
+            try:
+                publications = self.parse(msg.channel, msg.payload)
+            except Exception as e:  # one bad message shouldn't stop the dashboard getting data
+                print(f"Error parsing message on {msg.channel}: {e!r}")
+                continue
+            if len(pending) == MAX_BACKLOG:
+                self.dropped += 1
+            pending.append((time.monotonic(), publications))
+
+    def publish_pending(self, publisher, budget=FRAME_BUDGET):
+        """
+        Publish the parsed messages waiting to be published, oldest first, until
+        there are none left or budget seconds have passed. Call this from the GUI
+        thread.
+        """
+        publisher.create_pending_streams()
+        pending = self.pending
+        handles, handle = publisher.handles, publisher.handle
+        now = start = time.monotonic()
+        # at least one message is published every frame, so the dashboard always catches up eventually
+        while pending:
+            _, publications = pending.popleft()
+            for stream, payload in publications:
+                # going straight to the stream's handle saves a call per publication
+                (handles.get(stream) or handle(stream)).update(payload)
+            now = time.monotonic()
+            if now - start > budget:
+                break
+
+        # the lag is how long the oldest message still waiting has been waiting
+        self.lag = now - pending[0][0] if pending else 0
+        if now - self.last_lag_time > LAG_INTERVAL:
+            self.last_lag_time = now
+            publisher.update(LAG_STREAM, (time.time(), self.lag))
+            publisher.update(DROPPED_STREAM, (time.time(), self.dropped))
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from omnibus import Message
+
+import ingest
+from ingest import Ingestor
+from publisher import Publisher
+
+
+class MockReceiver:
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def recv_message(self, timeout=None):
+        if self.messages:
+            message = self.messages.pop(0)
+            if isinstance(message, Exception):
+                raise message
+            return message
+        time.sleep(timeout / 1000)
+        return None
+
+
+def parse(channel, payload):
+    if payload is None:
+        raise ValueError("bad message")
+    return [(channel, (payload, payload * 2))]
+
+
+def run_ingestor(messages):
+    ingestor = Ingestor(lambda: MockReceiver(messages), parse)
+    ingestor.start()
+    deadline = time.monotonic() + 5
+    while len(ingestor.pending) < len([m for m in messages if isinstance(m, Message) and m.payload is not None]):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    ingestor.stop()
+    return ingestor
+
+
+class TestIngestor:
+    def test_publish_in_order(self):
+        messages = [Message("a" if i % 2 else "b", 0, i) for i in range(100)]
+        messages.insert(10, Message("a", 0, None))  # skipped, without stopping the thread
+        messages.insert(20, ValueError("not msgpack"))  # same for errors receiving a message
+        ingestor = run_ingestor(messages)
+
+        p = Publisher()
+        received = []
+        p.subscribe("a", lambda stream, payload: received.append(payload[0]))
+        p.subscribe("b", lambda stream, payload: received.append(payload[0]))
+        ingestor.publish_pending(p)
+        assert received == list(range(100))
+        assert ingestor.lag == 0
+        assert p.store.get(ingest.LAG_STREAM) is not None
+        assert p.store.get(ingest.DROPPED_STREAM).last()[1] == 0
+
+    def test_budget(self):
+        ingestor = run_ingestor([Message("a", 0, i) for i in range(100)])
+
+        p = Publisher()
+        received = []
+        p.subscribe("a", lambda stream, payload: received.append(payload[0]))
+        # at least one message is published a frame, however small the budget
+        ingestor.publish_pending(p, budget=-1)
+        assert received == [0]
+        assert ingestor.lag > 0
+        ingestor.publish_pending(p)
+        assert received == list(range(100))
+
+    def test_dropped(self, monkeypatch):
+        monkeypatch.setattr(ingest, "MAX_BACKLOG", 10)
+        ingestor = Ingestor(lambda: MockReceiver([Message("a", 0, i) for i in range(25)]), parse)
+        ingestor.start()
+        deadline = time.monotonic() + 5
+        while ingestor.dropped < 15:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        ingestor.stop()
+
+        p = Publisher()
+        received = []
+        p.subscribe("a", lambda stream, payload: received.append(payload[0]))
+        ingestor.publish_pending(p)
+        # the oldest messages are the ones dropped
+        assert received == list(range(15, 25))
+        assert p.store.get(ingest.DROPPED_STREAM).last()[1] == 15
+
+
+class TestPendingStreams:
+    def test_ensure_exists_off_thread(self):
+        p = Publisher()
+        updates = []
+        p.register_stream_callback(updates.append)
+
+        thread = threading.Thread(target=p.ensure_exists, args=("test1",))
+        thread.start()
+        thread.join()
+        assert "test1" not in p.streams
+        assert updates == []
+
+        p.create_pending_streams()
+        assert "test1" in p.streams
+        assert updates == [["test1"]]
@@ -29,6 +29,7 @@ class DashboardItem(QWidget):
         self.corner_index = 3 # 0: left up, 1: right up, 2: left down, 3: right down
         self.temp_pos = None # Used to store the temp position of the widget when resizing
         self.resize_callback = dashboard.on_item_resize
+        self.dirty = False  # whether render is due at the end of the frame
         """
         We use pyqtgraph's ParameterTree functionality to make an easy interface for setting
         parameters. Subclasses should add their own parameters in their __init__ as follows:
@@ -114,6 +115,23 @@ class DashboardItem(QWidget):
         """
         return json.dumps(self.parameters.saveState(filter='user'))
 
+    def mark_dirty(self):
+        """
+        Ask for render() to be called at the end of the frame. Data callbacks should only update the
+        dashitem's state and call this, so the dashitem is redrawn once a frame however many messages
+        came in during it.
+        """
+        if not self.dirty:
+            self.dirty = True
+            self.dashboard.schedule_render(self)
+
+    def render(self):
+        """
+        This function is called at the end of a frame in which mark_dirty was called, to show the
+        data that came in since the last one.
+        """
+        pass
+
     def on_delete(self):
         """
         This function is called when a dashitem is removed from the screen. In practice, this will likely be used to
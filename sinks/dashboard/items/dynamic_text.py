@@ -47,6 +47,8 @@ class DynamicTextItem(DashboardItem):
         super().__init__(*args)
 
         self.condition_count = 0
+        self.style_sheet = ''
+        self.latest = None  # the stream and data of the latest message
         self.setAttribute(Qt.WidgetAttribute.WA_StyledBackground, True)
 
         # Specify the layout
@@ -75,8 +77,8 @@ class DynamicTextItem(DashboardItem):
         # Apply initial stylesheet
         self.on_font_change(None, self.parameters.param("font size").value())
 
+        # the number of latest values averaged, read from publisher.store
         self.buffer_size = self.parameters.param('buffer size').value()
-        self.buffer = []
 
     def add_parameters(self):
         font_param = {'name': 'font size', 'type': 'int', 'value': 12}
@@ -91,19 +93,22 @@ class DynamicTextItem(DashboardItem):
         publisher.unsubscribe_from_all(self.on_data_update)
         publisher.subscribe(value, self.on_data_update)
 
-    def on_data_update(self, _, payload):
-        time, data = payload
-
-        self.buffer.append(data)
-        if len(self.buffer) > self.buffer_size:
-            self.buffer.pop(0)
-
-        if isinstance(data, int):
-            value = sum(self.buffer)/len(self.buffer)
-            self.widget.setText(f"{value + self.offset:.0f}")
-        elif isinstance(data, float):
-            value = sum(self.buffer)/len(self.buffer)
-            self.widget.setText(f"{value + self.offset:.3f}")
+    def on_data_update(self, stream, payload):
+        # only the latest message of the frame is shown
+        self.latest = (stream, payload[1])
+        self.mark_dirty()
+
+    def render(self):
+        stream, data = self.latest
+
+        if isinstance(data, (int, float)):
+            # the average of the latest buffer size values
+            _, values = publisher.store.get(stream).latest(max(self.buffer_size, 1))
+            value = values.mean() + self.offset
+            if isinstance(data, int):
+                self.widget.setText(f"{value:.0f}")
+            else:
+                self.widget.setText(f"{value:.3f}")
         else:
             self.widget.setText(str(data))
 
@@ -113,10 +118,10 @@ class DynamicTextItem(DashboardItem):
             condition_reference = self.parameters.param('condition_label' + str(i + 1))
             if self.condition_true(condition_reference):
                 background_color = condition_reference.childs[2].value().name()
-                self.setStyleSheet('background: ' + background_color)
+                self.set_style('background: ' + background_color)
                 break
         else:
-            self.setStyleSheet('')
+            self.set_style('')
 
         self.expired_timeout.stop()
         self.expired_timeout.start(int(EXPIRED_TIME * 1000))
@@ -141,8 +146,14 @@ class DynamicTextItem(DashboardItem):
             case _:
                 return False
 
+    def set_style(self, style):
+        # restyling is slow, so only do it when the style changes
+        if style != self.style_sheet:
+            self.setStyleSheet(style)
+            self.style_sheet = style
+
     def expire(self):
-        self.setStyleSheet("color: red")
+        self.set_style("color: red")
 
     def on_font_change(self, _, fsize):
         self.widget.setStyleSheet(f"font-size: {fsize}px")
@@ -177,7 +188,6 @@ class DynamicTextItem(DashboardItem):
 
     def on_buffer_size_change(self, _, bufsize):
         self.buffer_size = bufsize
-        self.buffer = []
 
     @staticmethod
     def get_name():
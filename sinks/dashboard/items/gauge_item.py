@@ -80,6 +80,9 @@ class GaugeItem(DashboardItem):
     def on_data_update(self, stream, payload):
         time, point = payload
         self.data = float(point)
+        self.mark_dirty()
+
+    def render(self):
         self.widget.update()
 
     def on_delete(self):
@@ -1,4 +1,5 @@
 from publisher import publisher
+from time_series import decimate
 from pyqtgraph.Qt.QtWidgets import QGridLayout, QMenu
 from pyqtgraph.parametertree.parameterTypes import ChecklistParameter
 from pyqtgraph.Qt.QtCore import QEvent
@@ -10,6 +11,8 @@ import config
 from .registry import Register
 from .series_parameter import SeriesChecklistParameter
 
+GRAPH_POINTS = config.GRAPH_DURATION * config.GRAPH_RESOLUTION  # points drawn for each curve
+
 
 @Register
 class PlotDashItem(DashboardItem):
@@ -17,12 +20,10 @@ class PlotDashItem(DashboardItem):
         # Call this in **every** dash item constructor
         super().__init__(*args)
 
+        # the time each series was last redrawn at, the points themselves are in publisher.store
         self.last = {}
-
-        # storing the series name as key, its time and points as value
-        # since each PlotDashItem can contain more than one curve
-        self.times = {}
-        self.points = {}
+        # the series with new points to draw at the end of the frame
+        self.dirty_series = set()
 
         # Specify the layout
         self.layout = QGridLayout()
@@ -63,6 +64,7 @@ class PlotDashItem(DashboardItem):
             self.parameters.param('series').setValue(value[:6])
         self.series = self.parameters.param('series').childrenValue()
         # resubscribe to the new streams
+        self.dirty_series.clear()
         publisher.unsubscribe_from_all(self.on_data_update)
         for series in self.series:
             publisher.subscribe(series, self.on_data_update)
@@ -92,8 +94,6 @@ class PlotDashItem(DashboardItem):
         for i, series in enumerate(self.series):
             curve = plot.plot([], [], pen=self.color[i], name=series)
             self.curves[series] = curve
-            self.times[series] = []
-            self.points[series] = []
             self.last[series] = 0
 
         # initialize the threshold line, but do not plot it unless a limit is specified
@@ -104,51 +104,54 @@ class PlotDashItem(DashboardItem):
     def on_data_update(self, stream, payload):
         time, point = payload
 
-        point += self.offset
-
         # time should be passed as seconds, GRAPH_RESOLUTION is points per second
         if time - self.last[stream] < 1 / config.GRAPH_RESOLUTION:
             return
 
-        self.last[stream] = time
-
-        self.times[stream].append(time)
-        self.points[stream].append(point)
-
-        while self.times[stream][0] < time - config.GRAPH_DURATION:
-            self.times[stream].pop(0)
-            self.points[stream].pop(0)
+        if publisher.store.get(stream) is None:  # not a number, so there's nothing to plot
+            return
 
-        # get the min/max point in the whole data set
+        self.last[stream] = time
+        self.dirty_series.add(stream)
+        self.mark_dirty()
 
-        values = list(self.points.values())
+    def render(self):
+        histories = [publisher.store.get(series) for series in self.series]
+        extremes = [h.extremes() for h in histories if h is not None and len(h)]
+        if not self.dirty_series or not extremes:
+            return
 
-        if not any(values):
-            min_point = 0
-            max_point = 0
-        else:
-            min_point = min(min(v) for v in values if v)
-            max_point = max(max(v) for v in values if v)
+        # get the min/max point in the whole data set, kept up to date by the history of each series
+        min_point = min(low for low, _ in extremes) + self.offset
+        max_point = max(high for _, high in extremes) + self.offset
 
         # set the displayed range of Y axis
         self.plot.setYRange(min_point, max_point, padding=0.1)
 
+        # update the data curves with the last GRAPH_DURATION of each series, decimated to the
+        # GRAPH_RESOLUTION points a second that fit the plot while keeping the peaks, and moved
+        # up by the offset rather than adding it to every point
+        latest = None
+        for stream in self.dirty_series:
+            times, points = publisher.store.get(stream).recent(config.GRAPH_DURATION)
+            self.curves[stream].setData(*decimate(times, points, GRAPH_POINTS))
+            self.curves[stream].setPos(0, self.offset)
+            if latest is None or times[-1] > latest[1]:
+                latest = (times[0], times[-1])
+        self.dirty_series.clear()
+
         limit = self.parameters.param('limit').value()
         if limit != 0:
             # plot the warning line, using two points (start and end)
-            self.warning_line.setData(
-                [self.times[stream][0], self.times[stream][-1]], [limit] * 2)
+            self.warning_line.setData(list(latest), [limit] * 2)
             # set the red tint
             self.warning_line.setFillLevel(max_point*2)
         else:
             self.warning_line.setData([], [])
             self.warning_line.setFillLevel(0)
 
-        # update the data curve
-        self.curves[stream].setData(self.times[stream], self.points[stream])
-
         # round the time to the nearest GRAPH_STEP
-        t = round(self.times[stream][-1] / config.GRAPH_STEP) * config.GRAPH_STEP
+        t = round(latest[1] / config.GRAPH_STEP) * config.GRAPH_STEP
         self.plot.setXRange(t - config.GRAPH_DURATION + config.GRAPH_STEP,
                             t + config.GRAPH_STEP, padding=0)
 
@@ -157,8 +160,8 @@ class PlotDashItem(DashboardItem):
         if len(self.series) <= 2:
             # avg values
             title += "    current: "
-            last_values = [self.points[item][-1]
-                           if self.points[item] else 0 for item in self.series]
+            last_values = [h.last()[1] + self.offset
+                           if h is not None and len(h) else 0 for h in histories]
             for v in last_values:
                 title += f"[{v: < 4.4f}]"
             title += "    "
@@ -152,6 +152,9 @@ class ProgressBarItem(DashboardItem):
     def on_data_update(self, stream, payload):
         time, point = payload
         self.data = float(point)
+        self.mark_dirty()
+
+    def render(self):
         self.update_data()
 
     def on_delete(self):
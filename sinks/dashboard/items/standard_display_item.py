@@ -18,13 +18,9 @@ class StandardDisplayItem(DashboardItem):
         # Call this in **every** dash item constructor
         super().__init__(*args)
 
+        # the time each series was last redrawn at, the points themselves are in publisher.store
         self.last = {}
 
-        # storing the series name as key, its time and points as value
-        # since each StandardDisplayItem can contain more than one curve
-        self.times = {}
-        self.points = {}
-
         # Specify the layout
         self.layout = QGridLayout()
         self.setLayout(self.layout)
@@ -36,6 +32,7 @@ class StandardDisplayItem(DashboardItem):
         self.parameters.param('num-decimals').sigValueChanged.connect(self.on_decimal_change)
         self.parameters.param('display-sparkline').sigValueChanged.connect(self.on_display_sparkline_change)
 
+        self.expired = False
         self.expired_timeout = QTimer()
         self.expired_timeout.setSingleShot(True)
         self.expired_timeout.timeout.connect(self.expire)
@@ -159,8 +156,6 @@ class StandardDisplayItem(DashboardItem):
         for i, series in enumerate(self.series):
             curve = plot.plot([], [], pen=self.color[i], name=series)
             self.curves[series] = curve
-            self.times[series] = []
-            self.points[series] = []
             self.last[series] = 0
 
         # initialize the threshold line, but do not plot it unless a limit is specified
@@ -170,58 +165,61 @@ class StandardDisplayItem(DashboardItem):
 
     def on_data_update(self, stream, payload):
         time, point = payload
-        point += self.offset
 
         # time should be passed as seconds, GRAPH_RESOLUTION is points per second
         if time - self.last[stream] < 1 / config.GRAPH_RESOLUTION:
             return
 
+        if publisher.store.get(stream) is None:  # not a number, so there's nothing to plot
+            return
+
         self.last[stream] = time
-        self.times[stream].append(time)
-        self.points[stream].append(point)
-
-        while self.times[stream][0] < time - config.GRAPH_DURATION:
-            self.times[stream].pop(0)
-            self.points[stream].pop(0)
-
-        # get the min/max point in the whole data set
-        values = list(self.points.values())
-        if not any(values):
-            min_point = 0
-            max_point = 0
-        else:
-            min_point = min(min(v) for v in values if v)
-            max_point = max(max(v) for v in values if v)
+        self.mark_dirty()
+
+    def render(self):
+        history = publisher.store.get(self.series[0])
+        if history is None or len(history) == 0:
+            return
+        # the last GRAPH_DURATION of the series, as views of the shared history
+        times, points = history.recent(config.GRAPH_DURATION)
+
+        # get the min/max point in the whole data set, kept up to date by the history
+        min_point, max_point = history.extremes()
+        min_point += self.offset
+        max_point += self.offset
 
         # set the displayed range of Y axis
         self.plot.setYRange(min_point, max_point, padding=0.1)
         limit = self.parameters.param('limit').value()
         if limit != 0.0:
             # plot the warning line, using two points (start and end)
-            self.warning_line.setData(
-                [self.times[stream][0], self.times[stream][-1]], [limit] * 2)
+            self.warning_line.setData([times[0], times[-1]], [limit] * 2)
             # set the red tint
             self.warning_line.setFillLevel(max_point*2)
         else:
             self.warning_line.setData([], [])
             self.warning_line.setFillLevel(0)
 
-        # update the data curve
-        self.curves[stream].setData(self.times[stream], self.points[stream])
+        # update the data curve, moved up by the offset rather than adding it to every point
+        self.curves[self.series[0]].setData(times, points)
+        self.curves[self.series[0]].setPos(0, self.offset)
         # round the time to the nearest GRAPH_STEP
-        t = round(self.times[stream][-1] / config.GRAPH_STEP) * config.GRAPH_STEP
+        t = round(times[-1] / config.GRAPH_STEP) * config.GRAPH_STEP
         self.plot.setXRange(t - config.GRAPH_DURATION + config.GRAPH_STEP,
                             t + config.GRAPH_STEP, padding=0)
         # For the numerical readout label
-        self.data = float(point)
+        self.data = float(points[-1]) + self.offset
         self.numRead.setText(f"{self.data:.{self.decimals}f}")
-        # Restart timer
-        self.setStyleSheet("")
+        # Restart timer, only restyling if the data had expired since restyling is slow
+        if self.expired:
+            self.setStyleSheet("")
+            self.expired = False
         self.expired_timeout.stop()
         self.expired_timeout.start(int(EXPIRED_TIME * 1000))
 
     def expire(self):
         self.setStyleSheet("color: red")
+        self.expired = True
 
     @staticmethod
     def get_name():
@@ -45,6 +45,8 @@ class TVTableWidgetItem(QTableWidgetItem):
         self.path = None
         self.value = ''
         self.first_col = True
+        self.dirty = False  # whether the table is due to redraw the cell at the end of the frame
+        self.expired = False
 
         self.expired_timeout = QTimer()
         self.expired_timeout.setSingleShot(True)
@@ -99,6 +101,7 @@ class TVTableWidgetItem(QTableWidgetItem):
 
     def expire(self):
         self.setForeground(QColorConstants.Gray)
+        self.expired = True
 
     def set_board(self, board):
         self.board = board
@@ -123,9 +126,19 @@ class TVTableWidgetItem(QTableWidgetItem):
         else:
             self.value = str(data)
 
-        self.setForeground(QColorConstants.Black)
+        # the table redraws its new values once a frame
+        if not self.dirty:
+            table = self.tableWidget()
+            if table is not None:
+                self.dirty = True
+                table.parentWidget().mark_cell_dirty(self)
+
+    def render(self):
+        self.dirty = False
+        if self.expired:
+            self.setForeground(QColorConstants.Black)
+            self.expired = False
         self.expired_timeout.start(EXPIRED_TIME * 1000)
-        self.tableWidget().viewport().update()
 
     def on_delete(self):
         publisher.unsubscribe_from_all(self.on_data_update)
@@ -200,6 +213,7 @@ class TableViewItem(DashboardItem):
         self.parameters.param('cols').sigValueChanged.connect(self.on_cols_change)
 
         self.widget = QTableWidget()
+        self.dirty_cells = []  # cells with new values to draw at the end of the frame
 
         self.widget.setSelectionMode(QAbstractItemView.ContiguousSelection)
         self.widget.setItemPrototype(TVTableWidgetItem())
@@ -350,6 +364,19 @@ class TableViewItem(DashboardItem):
             if item:
                 item.set_board(text)
 
+    def mark_cell_dirty(self, cell):
+        self.dirty_cells.append(cell)
+        self.mark_dirty()
+
+    def render(self):
+        for cell in self.dirty_cells:
+            try:
+                cell.render()
+            except RuntimeError:  # the cell was deleted since it got its value
+                pass
+        self.dirty_cells = []
+        self.widget.viewport().update()
+
     def on_rows_change(self, _, rows):
         oldrow = self.widget.rowCount()
         self.widget.setRowCount(rows)
@@ -2,15 +2,17 @@ from omnibus import Receiver
 
 import parsers
 from dashboard import dashboard_driver
+from ingest import Ingestor
+from publisher import publisher
 
-receiver = Receiver("")  # subscribe to all channels
+# receives and parses messages on a background thread, subscribed to all channels
+ingestor = Ingestor(lambda: Receiver(""), parsers.parse_message)
+ingestor.start()
 
 
 def update():  # gets called every frame
-    # read all the messages in the queue and no more (zero timeout)
-    while msg := receiver.recv_message(0):
-        # updates streams, which them updates the dashitems
-        parsers.parse(msg.channel, msg.payload)
+    # publish the parsed messages, as many as fit in the frame, which then updates the dashitems
+    ingestor.publish_pending(publisher)
 
 
 dashboard_driver(update)
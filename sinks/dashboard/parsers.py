@@ -1,4 +1,5 @@
 from publisher import publisher
+from omnibus.util import BoardTimeline
 
 import time
 
@@ -25,11 +26,15 @@ func = Register("Chan").__call__(func)
 # using the Register decorator, it is added to the
 # function map. IE,
 #   func_map[channel].append(function)
-# Then, when parse is called, it searches
+# Then, when parse is called, it searches for the functions
+# of every channel that's a prefix of the message's channel.
+# The search is only done once for each channel, the
+# functions it found are kept in channel_cache
 
 
 class Register:
     func_map = {}
+    channel_cache = {}
 
     def __init__(self, msg_channels):
         if isinstance(msg_channels, str):
@@ -43,17 +48,35 @@ class Register:
                 Register.func_map[msg_channel] = [func]
             else:
                 Register.func_map[msg_channel].append(func)
+        # the new function may apply to channels that have already been looked up
+        Register.channel_cache.clear()
 
         return func
 
+    @staticmethod
+    def lookup(msg_channel):
+        funcs = Register.channel_cache.get(msg_channel)
+        if funcs is None:
+            funcs = [func for channel, channel_funcs in Register.func_map.items()
+                     if msg_channel.startswith(channel) for func in channel_funcs]
+            Register.channel_cache[msg_channel] = funcs
+        return funcs
+
+
+def parse_message(msg_channel, msg_payload):
+    # Returns the (stream_name, payload) updates for a message instead of publishing them,
+    # so messages can be parsed on the ingestion thread and published on the GUI thread
+    publications = []
+    for func in Register.lookup(msg_channel):
+        # For an explanation, please refer to later block of comments
+        for stream_name, timestamp, parsed_message in func(msg_payload):
+            publications.append((stream_name, (timestamp, parsed_message)))
+    return publications
+
 
 def parse(msg_channel, msg_payload):
-    for channel in Register.func_map:
-        if msg_channel.startswith(channel):
-            for func in Register.func_map[channel]:
-                # For an explanation, please refer to later block of comments
-                for stream_name, timestamp, parsed_message in func(msg_payload):
-                    publisher.update(stream_name, (timestamp, parsed_message))
+    for stream_name, payload in parse_message(msg_channel, msg_payload):
+        publisher.update(stream_name, payload)
 
 # We insist that each parse have the following signature
 # parser : message -> [(stream_name, timestamp, parsed_message) ...]
@@ -89,8 +112,7 @@ splits = {
     "SENSOR_ANALOG": "sensor_id",
     "STATE_EST_DATA": "state_id",
 }
-last_timestamp = {}  # Last timestamp seen for each board + message type
-offset_timestamp = {}  # per-board-and-message offset to account for time rollovers
+board_timeline = BoardTimeline()  # unwraps the time rollovers of each board + message type
 
 
 @Register("CAN/Parsley")
@@ -116,18 +138,13 @@ def can_parser(payload):
     error_series = []  # additional series to publish to on error
 
     timestamp = data.pop("time", time.time())  # default back to system time
-    time_key = board_id + message_type
-    if time_key not in last_timestamp:
-        last_timestamp[time_key] = 0
-        offset_timestamp[time_key] = 0
+    time_key = (board_id, message_type)
+    if time_key not in board_timeline:
         publisher.ensure_exists(f"{board_id}/RESET")
         publisher.ensure_exists(f"{board_id}/ERROR")
-    if timestamp < last_timestamp[time_key] - 5 and timestamp < 10:  # detect rollover
-        offset_timestamp[time_key] += last_timestamp[time_key]
-        if message_type == "GENERAL_BOARD_STATUS":
-            error_series.append((f"{board_id}/RESET", time.time(), time.strftime("%I:%M:%S")))
-    last_timestamp[time_key] = timestamp
-    timestamp += offset_timestamp[time_key]
+    timestamp, rolled_over = board_timeline.unwrap(time_key, timestamp)
+    if rolled_over and message_type == "GENERAL_BOARD_STATUS":
+        error_series.append((f"{board_id}/RESET", time.time(), time.strftime("%I:%M:%S")))
 
     if message_type == "GENERAL_BOARD_STATUS" and data['status'] != "E_NOMINAL":
         error_series.append((f"{board_id}/ERROR", timestamp, payload["data"]))
@@ -2,6 +2,7 @@ import pytest
 
 from parsers import daq_parser
 from parsers import can_parser
+from parsers import all_parser, Register
 
 
 class TestParser:
@@ -30,3 +31,22 @@ class TestParser:
 
         assert can_parser(can_message) == [
             ("CHARGING/SENSOR_ANALOG/SENSOR_GROUND_VOLT/value", 37.595, 13104)]
+
+    def test_can_parser_rollover(self):
+        def can_message(board_time):
+            return {
+                'board_id': 'CHARGING',
+                'msg_type': 'SENSOR_TEMP',
+                'data': {'time': board_time, 'sensor_id': 'SENSOR_BATT_TEMP', 'value': 20}
+            }
+
+        stream = "CHARGING/SENSOR_TEMP/SENSOR_BATT_TEMP/value"
+        assert can_parser(can_message(65.0)) == [(stream, 65.0, 20)]
+        assert can_parser(can_message(0.5)) == [(stream, pytest.approx(66.036), 20)]
+
+    def test_lookup(self):
+        assert Register.lookup("DAQ") == [daq_parser, all_parser]
+        assert Register.lookup("CAN/Parsley/0") == [can_parser, all_parser]
+        assert Register.lookup("Other") == [all_parser]
+        # the functions are only looked up once per channel
+        assert Register.lookup("CAN/Parsley/0") is Register.lookup("CAN/Parsley/0")
@@ -1,3 +1,34 @@
+import collections
+import threading
+
+from time_series import TimeSeriesStore, is_sample
+
+
+class StreamHandle:
+    """
+    A stream resolved ahead of time, to publish to it without looking
+    it up. It holds the stream's list of callbacks itself (which
+    subscribing and unsubscribing change in place) and its history
+    once it has one.
+    """
+
+    def __init__(self, publisher, stream):
+        self.stream = stream
+        self.callbacks = publisher.streams[stream]
+        self.store = publisher.store
+        self.series = publisher.store.get(stream)
+
+    def update(self, payload):
+        if is_sample(payload):
+            series = self.series
+            if series is None:
+                series = self.series = self.store.series_for(self.stream)
+            series.append(payload[0], payload[1])
+        stream = self.stream
+        for callback in self.callbacks:
+            callback(stream, payload)
+
+
 class Publisher:
     """
     The core data bus of the dashboard. 
@@ -6,11 +37,18 @@ class Publisher:
     subscribe to these streams to recieve notifications 
     upon updates. This is done by providing a callback, which
     is called when the data is updated.
+
+    The history of every numeric stream is kept in the store,
+    so subscribers can look back at windows of it rather than
+    keeping their own.
     """
 
     def __init__(self):
         self.streams = {}
         self.stream_update_callbacks = []
+        self.store = TimeSeriesStore()
+        self.pending_streams = collections.deque()
+        self.handles = {}
 
     def register_stream_callback(self, cb):
         self.stream_update_callbacks.append(cb)
@@ -30,17 +68,37 @@ class Publisher:
                 self.streams[stream].remove(callback)
 
     def update(self, stream, payload):
-        self.ensure_exists(stream)
-        for callback in self.streams[stream]:
-            callback(stream, payload)
+        handle = self.handles.get(stream) or self.handle(stream)
+        handle.update(payload)
+
+    def handle(self, stream):
+        """
+        Return the handle of a stream, creating the stream if needed. Call
+        this from the GUI thread, like update.
+        """
+        handle = self.handles.get(stream)
+        if handle is None:
+            self.ensure_exists(stream)
+            handle = self.handles[stream] = StreamHandle(self, stream)
+        return handle
 
     def ensure_exists(self, stream):
-        if stream not in self.streams:
-            self.streams[stream] = []
-            streams = list(self.streams.keys())
-            streams.sort()
-            for cb in self.stream_update_callbacks:
-                cb(streams)
+        if stream in self.streams:
+            return
+        if threading.current_thread() is not threading.main_thread():
+            # the stream callbacks update the GUI, so streams asked for by other threads
+            # (like the ingestion thread) are created by create_pending_streams instead
+            self.pending_streams.append(stream)
+            return
+        self.streams[stream] = []
+        streams = list(self.streams.keys())
+        streams.sort()
+        for cb in self.stream_update_callbacks:
+            cb(streams)
+
+    def create_pending_streams(self):
+        while self.pending_streams:
+            self.ensure_exists(self.pending_streams.popleft())
 
 
 publisher = Publisher()
@@ -58,3 +58,30 @@ class TestPublisher:
         p.unsubscribe_from_all(mutate_counter)
         p.update("test1", 3)
         assert data == [2]
+
+    def test_store(self):
+        p = Publisher()
+        seen = []
+
+        def record(stream, payload):
+            seen.append(list(p.store.get(stream).latest()[1]))
+
+        p.subscribe("test1", record)
+        p.update("test1", (1, 5))
+        p.update("test1", (2, 6))
+        # subscribers see the history including the update they're called for
+        assert seen == [[5], [5, 6]]
+
+    def test_handle(self):
+        p = Publisher()
+        handle = p.handle("test1")
+        assert "test1" in p.streams
+        assert p.handle("test1") is handle
+
+        # subscribers added after the handle is made still get its updates
+        data = []
+        p.subscribe("test1", lambda stream, payload: data.append((stream, payload)))
+        handle.update((1, 5))
+        p.update("test1", (2, "ON"))
+        assert data == [("test1", (1, 5)), ("test1", (2, "ON"))]
+        assert list(p.store.get("test1").latest()[1]) == [5]
@@ -0,0 +1,231 @@
+import collections
+
+import numpy as np
+
+import config
+
+
+def is_sample(payload):
+    """
+    Check if a published payload is a (timestamp, value) pair of numbers, which
+    are kept in the stream's history.
+    """
+    return (isinstance(payload, tuple) and len(payload) == 2
+            and isinstance(payload[0], (int, float)) and isinstance(payload[1], (int, float)))
+
+
+def decimate(times, values, points):
+    """
+    Return the times and values of about the given number of points picked
+    from a stream's samples to draw it, keeping its peaks: the samples are
+    split into points / 2 buckets and the smallest and largest value of each
+    is kept, in order, along with the first and last sample. Fewer samples
+    than that are returned as they are.
+    """
+    count = len(times)
+    buckets = max(points // 2, 1)
+    if count <= max(points, 2):
+        return times, values
+    size = -(-count // buckets)  # samples per bucket, rounded up so there are at most the given number of buckets
+    whole = count // size
+    indexes = [np.zeros(1, dtype=np.intp)]
+    if whole:
+        grouped = values[:whole * size].reshape(whole, size)
+        picked = np.sort(np.stack([grouped.argmin(axis=1), grouped.argmax(axis=1)], axis=1), axis=1)
+        indexes.append((picked + np.arange(whole)[:, None] * size).ravel())
+    if whole * size < count:  # the last, partial bucket
+        rest = values[whole * size:]
+        indexes.append(np.sort([rest.argmin(), rest.argmax()]) + whole * size)
+    indexes.append(np.array([count - 1]))
+    indexes = np.concatenate(indexes)
+    return times[indexes], values[indexes]
+
+
+class TimeSeries:
+    """
+    The recent history of one numeric stream, as times and values in a
+    preallocated ring buffer, so memory stays bounded and adding a sample
+    takes the same time however long the dashboard has been running.
+
+    Every sample is written twice, capacity apart, so the latest samples are
+    always one contiguous slice of the buffer and windows of them are handed
+    out as NumPy views without copying. A view holds the samples it was taken
+    with until capacity more samples come in and overwrite them.
+
+    The smallest and largest values of the last window seconds are kept up to
+    date as samples come in, using monotonic deques: each holds the samples
+    that could still become the window's extreme, in order, so the extreme is
+    always at the front and every sample is added and removed at most once.
+
+    Samples that come in late (like from a second, delayed source of the same
+    data, or a sensor with jittered timestamps) are inserted in order, which
+    rewrites the buffer and the deques, so it's slower than an append and
+    views taken before it may no longer hold the samples they were taken with.
+    A sample more than GRAPH_DURATION back means the source restarted (like a
+    replayed log looping), which starts a new history.
+
+    Only the latest capacity samples are kept, so a stream publishing faster
+    than capacity / window samples a second (config.MAX_STREAM_RATE for the
+    default sizes) has less than window seconds of history, and its extremes
+    only cover the samples still kept.
+    """
+
+    def __init__(self, capacity=config.SERIES_CAPACITY, window=config.GRAPH_DURATION):
+        self.capacity = capacity
+        self.window = window
+        self._times = np.zeros(2 * capacity)
+        self._values = np.zeros(2 * capacity)
+        self.end = 0  # where the next sample goes, in the first copy
+        self.size = 0
+        self.count = 0  # samples added since the history started, to tell which have been overwritten
+        self.last_time = 0  # time of the latest sample, kept as a float to compare without indexing the buffer
+        # (count, time, value) of the samples that could still be the smallest/largest of the window
+        self._mins = collections.deque()
+        self._maxes = collections.deque()
+
+    def __len__(self):
+        return self.size
+
+    def append(self, time, value):
+        if self.size and time < self.last_time:
+            if time > self.last_time - config.GRAPH_DURATION:
+                self._insert(time, value)
+                return
+            self.clear()
+        self.last_time = time
+
+        end = self.end
+        self._times[end] = self._times[end + self.capacity] = time
+        self._values[end] = self._values[end + self.capacity] = value
+        self.end = (end + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+        mins, maxes = self._mins, self._maxes
+        while mins and mins[-1][2] >= value:
+            mins.pop()
+        mins.append((self.count, time, value))
+        while maxes and maxes[-1][2] <= value:
+            maxes.pop()
+        maxes.append((self.count, time, value))
+        self.count += 1
+        # drop the samples that have left the window, or been overwritten
+        oldest, start = self.count - self.size, time - self.window
+        while mins[0][0] < oldest or mins[0][1] < start:
+            mins.popleft()
+        while maxes[0][0] < oldest or maxes[0][1] < start:
+            maxes.popleft()
+
+    def _insert(self, time, value):
+        """
+        Insert a sample older than the latest one where it belongs in time,
+        after any samples at the same time, by rewriting the buffer.
+        """
+        times, values = self.latest()
+        index = np.searchsorted(times, time, side="right")
+        times = np.insert(times, index, time)[-self.capacity:]
+        values = np.insert(values, index, value)[-self.capacity:]
+
+        size = len(times)
+        self._times[:size] = self._times[self.capacity:self.capacity + size] = times
+        self._values[:size] = self._values[self.capacity:self.capacity + size] = values
+        self.end = size % self.capacity
+        self.size = self.count = size
+
+        # the deques hold the samples of the window smaller/larger than every later one
+        first = np.searchsorted(times, self.last_time - self.window, side="left")
+        window = values[first:]
+        for deque, accumulate, compare in [(self._mins, np.minimum, np.less),
+                                           (self._maxes, np.maximum, np.greater)]:
+            later = accumulate.accumulate(window[::-1])[::-1]
+            kept = np.flatnonzero(np.append(compare(window[:-1], later[1:]), True)) + first
+            deque.clear()
+            deque.extend(zip(kept.tolist(), times[kept].tolist(), values[kept].tolist()))
+
+    def clear(self):
+        self.end = 0
+        self.size = 0
+        self.count = 0
+        self._mins.clear()
+        self._maxes.clear()
+
+    def latest(self, count=None):
+        """
+        Return views of the times and values of the latest count samples (or
+        all of them), oldest first.
+        """
+        count = self.size if count is None else min(count, self.size)
+        stop = self.end + self.capacity
+        return self._times[stop - count:stop], self._values[stop - count:stop]
+
+    def since(self, start):
+        """
+        Return views of the times and values of the samples at or after start.
+        """
+        times, values = self.latest()
+        first = np.searchsorted(times, start, side="left")
+        return times[first:], values[first:]
+
+    def recent(self, duration):
+        """
+        Return views of the times and values of the samples in the last
+        duration seconds before the latest one.
+        """
+        if self.size == 0:
+            return self.latest()
+        return self.since(self._times[self.end + self.capacity - 1] - duration)
+
+    def extremes(self):
+        """
+        Return the smallest and largest values of recent(window), or None if
+        there are no samples.
+        """
+        if self.size == 0:
+            return None
+        return self._mins[0][2], self._maxes[0][2]
+
+    def last(self):
+        """
+        Return the time and value of the latest sample, or None if there are none.
+        """
+        if self.size == 0:
+            return None
+        index = self.end + self.capacity - 1
+        return self._times[index], self._values[index]
+
+
+class TimeSeriesStore:
+    """
+    The shared history of every numeric stream on the dashboard. It's filled
+    once per message by the publisher, so dash items showing the same stream
+    all read the same buffer instead of each keeping their own copy.
+    """
+
+    def __init__(self, capacity=config.SERIES_CAPACITY, window=config.GRAPH_DURATION):
+        self.capacity = capacity
+        self.window = window
+        self.series = {}
+
+    def record(self, stream, payload):
+        """
+        Add a published (timestamp, value) payload to the stream's history, if
+        its value is a number. Anything else (like actuator states as strings)
+        is only passed on to subscribers.
+        """
+        if is_sample(payload):
+            self.series_for(stream).append(*payload)
+
+    def series_for(self, stream):
+        """
+        Return the history of a stream, starting an empty one if it has none.
+        """
+        series = self.series.get(stream)
+        if series is None:
+            series = self.series[stream] = TimeSeries(self.capacity, self.window)
+        return series
+
+    def get(self, stream):
+        """
+        Return the history of a stream, or None if it hasn't had any numbers.
+        """
+        return self.series.get(stream)
@@ -0,0 +1,127 @@
+import random
+
+import numpy as np
+
+import config
+from time_series import TimeSeries, TimeSeriesStore, decimate
+
+
+class TestTimeSeries:
+    def test_wraps_around(self):
+        series = TimeSeries(capacity=4)
+        for i in range(10):
+            series.append(i, i * 10)
+            times, values = series.latest()
+            assert len(series) == min(i + 1, 4)
+            assert list(times) == list(range(max(0, i - 3), i + 1))
+            assert list(values) == [t * 10 for t in times]
+
+        times, values = series.latest(2)
+        assert list(times) == [8, 9]
+        assert series.last() == (9, 90)
+        # windows are views of the buffer, not copies
+        assert np.shares_memory(times, series._times)
+
+    def test_windows(self):
+        series = TimeSeries(capacity=100)
+        assert series.last() is None
+        assert len(series.recent(5)[0]) == 0
+        for i in range(50):
+            series.append(i * 0.5, i)
+
+        assert list(series.since(20)[1]) == list(range(40, 50))
+        assert list(series.recent(2)[0]) == [22.5, 23, 23.5, 24, 24.5]
+
+    def test_out_of_order(self):
+        series = TimeSeries(capacity=10)
+        series.append(100, 1)
+        series.append(101, 2)
+        series.append(100.5, 3)  # a delayed copy, inserted in order
+        series.append(100, 0)
+        assert list(series.latest()[0]) == [100, 100, 100.5, 101]
+        assert list(series.latest()[1]) == [1, 0, 3, 2]
+        assert series.last() == (101, 2)
+        assert series.extremes() == (0, 3)
+
+        series.append(102, 5)
+        assert list(series.latest()[1]) == [1, 0, 3, 2, 5]
+        assert series.extremes() == (0, 5)
+
+        series.append(101 - config.GRAPH_DURATION - 1, 4)  # the source restarted
+        assert list(series.latest()[1]) == [4]
+
+    def test_jittered(self):
+        # every sample stays and the times stay sorted, however the buffer wraps
+        random.seed(2)
+        for capacity, window in [(1000, 5), (50, 1000)]:
+            series = TimeSeries(capacity=capacity, window=window)
+            samples = []
+            for i in range(600):
+                time = i * 0.1 + random.uniform(-0.3, 0.3)
+                value = random.uniform(-100, 100)
+                series.append(time, value)
+                samples.append((time, value))
+
+                times, values = series.latest()
+                expected = sorted(samples, key=lambda sample: sample[0])[-capacity:]
+                assert list(times) == [t for t, _ in expected]
+                assert sorted(values) == sorted(v for _, v in expected)
+                _, values = series.recent(window)
+                assert series.extremes() == (values.min(), values.max())
+
+    def test_extremes(self):
+        # a short window, then a small capacity, limiting which samples count
+        for capacity, window in [(1000, 5), (20, 1000)]:
+            series = TimeSeries(capacity=capacity, window=window)
+            assert series.extremes() is None
+            for i in range(500):
+                series.append(i * 0.1, random.uniform(-100, 100))
+                _, values = series.recent(window)
+                assert series.extremes() == (values.min(), values.max())
+
+
+    def test_capacity(self):
+        # a stream at the max rate keeps the whole graph, a faster one only the latest capacity samples
+        for rate, kept in [(config.MAX_STREAM_RATE, config.GRAPH_DURATION),
+                           (config.MAX_STREAM_RATE * 2, config.GRAPH_DURATION / 2)]:
+            series = TimeSeries()
+            for i in range(2 * config.GRAPH_DURATION * rate):
+                series.append(i / rate, i)
+            times, _ = series.recent(config.GRAPH_DURATION)
+            assert times[-1] - times[0] >= kept - 2 / rate
+            assert times[-1] - times[0] <= kept
+
+
+class TestTimeSeriesStore:
+    def test_record(self):
+        store = TimeSeriesStore(capacity=10)
+        store.record("a", (1, 2))
+        store.record("a", (2, 3.5))
+        store.record("b", (1, "ACTUATOR_ON"))
+        store.record("c", {"not": "a sample"})
+
+        assert list(store.get("a").latest()[1]) == [2, 3.5]
+        assert store.get("b") is None
+        assert store.get("c") is None
+
+
+class TestDecimate:
+    def test_few_samples(self):
+        times, values = np.arange(10.0), np.arange(10.0) * 2
+        assert decimate(times, values, 300)[0] is times
+        assert decimate(times, values, 10)[1] is values
+
+    def test_keeps_peaks(self):
+        points = config.GRAPH_DURATION * config.GRAPH_RESOLUTION
+        for count in [301, 15000, 14999, 1234]:
+            times = np.arange(count) / 500
+            values = np.sin(times * 7)
+            values[count // 3] = 50  # a spike a plain stride would likely miss
+            values[count // 2] = -50
+            kept_times, kept_values = decimate(times, values, points)
+            assert len(kept_times) <= points + 4
+            assert kept_times[0] == times[0] and kept_times[-1] == times[-1]
+            assert np.all(np.diff(kept_times) >= 0)
+            assert kept_values.max() == 50 and kept_values.min() == -50
+            assert np.array_equal(np.interp(kept_times, times, values), kept_values)
+
@@ -2,11 +2,13 @@
 
 import signal
 import sys
+import time
 from datetime import datetime
 
 import msgpack
 
 from omnibus import Receiver
+from omnibus.util import LogSummary, summary_path
 
 # Will log all messages passing through bus
 CHANNEL = ""
@@ -16,6 +18,11 @@ CURTIME = datetime.now().strftime("%Y_%m_%d-%I_%M_%S_%p")
 fname = CURTIME + ".log"
 receiver = Receiver(CHANNEL)
 
+# Running per-channel statistics, checkpointed to a sidecar file so a crash loses little
+summary = LogSummary()
+CHECKPOINT_INTERVAL = 5  # seconds between summary checkpoints
+last_checkpoint = time.time()
+
 dots = 0
 counter = 0
 exit_program = False  # Exit flag
@@ -58,12 +65,22 @@ with open(fname, "wb") as f:
             # Try receiving message with timeout (if possible) to avoid blocking
             msg = receiver.recv_message(timeout=10)  # 10 ms timeout
             if msg:
-                f.write(msgpack.packb([msg.channel, msg.timestamp, msg.payload]))
+                packed = msgpack.packb([msg.channel, msg.timestamp, msg.payload])
+                f.write(packed)
+                summary.add(msg.channel, msg.timestamp, msg.payload, len(packed))
+
+            if time.time() - last_checkpoint > CHECKPOINT_INTERVAL:
+                # the summary must never cover more bytes than have hit the disk
+                f.flush()
+                summary.save(summary_path(fname))
+                last_checkpoint = time.time()
 
     finally:
         f.close()
+        summary.save(summary_path(fname))
         # Shows cursor
         print("\033[?25h", end="")
         print("Program has exited gracefully.")
         print(f"Data has been logged to {fname}")
+        print(f"Log summary has been saved to {summary_path(fname)}")
         sys.exit(0)  # Exit the program
@@ -1,9 +1,12 @@
 from pathlib import Path
 from datetime import datetime
 import argparse
+import contextlib
+import math
 import os
 import sys
 
+from omnibus.util import LogSummary, compile_expression, summary_path
 import replay_log
 
 GLOBAL_LOGS = Path("../..")
@@ -14,19 +17,62 @@ def parse_arguments() -> argparse.Namespace:
     Parses command line arguments.
     """
     def valid_replay_speed(n):
+        if n == "max":
+            return math.inf
         n = float(n)
         if n <= 0:
             print(f"Error: replay speed must be greater than zero.")
             sys.exit(1)
         return n
 
+    def valid_loop_count(n):
+        n = int(n)
+        if n < 0:
+            print(f"Error: loop count must be zero or more.")
+            sys.exit(1)
+        return n
+
+    def valid_remap(remap):
+        index = None
+        if ":" in remap.split("=", 1)[0]:
+            index, remap = remap.split(":", 1)
+            index = int(index)
+        if "=" not in remap:
+            print(f"Error: channel remaps must look like [N:]FROM=TO.")
+            sys.exit(1)
+        old, new = remap.split("=", 1)
+        return index, old, new
+
     parser = argparse.ArgumentParser(prog="PROG")
-    parser.add_argument('--replay_speed', '-r', default=1, type=valid_replay_speed,
-                        help="replay speed of log, must be greater than zero (default: 1)")
+    parser.add_argument('--replay_speed', '--speed', '-r', default=1, type=valid_replay_speed,
+                        help="replay speed of log, must be greater than zero, "
+                        "or 'max' to replay as fast as possible (default: 1)")
+    parser.add_argument('--loop', '-l', default=1, type=valid_loop_count,
+                        help="number of times to replay the log, 0 to loop forever (default: 1)")
+    parser.add_argument('--live_timestamps', action='store_true',
+                        help="send messages with the current time instead of the logged time")
     parser.add_argument('--max_logs', '-m', default=10, type=int,
                         help='number of logs files to display (default: 10)')
-    parser.add_argument('log_file', nargs="?", default=None,
-                        help="relative path to a log file (default: selection from prompt)")
+    parser.add_argument('--start', '-s', default=None, type=float,
+                        help="seconds into the log to start replaying from (default: start of log)")
+    parser.add_argument('--end', '-e', default=None, type=float,
+                        help="seconds into the log to stop replaying at (default: end of log)")
+    parser.add_argument('--channels', '-c', action='append', default=None,
+                        help="only replay channels starting with this prefix, "
+                        "can be given more than once (default: all)")
+    parser.add_argument('--remap', action='append', default=[], type=valid_remap,
+                        help="rename channels starting with FROM to start with TO instead, "
+                        "as [N:]FROM=TO to only rename them in the Nth log file given (from 0), "
+                        "can be given more than once")
+    parser.add_argument('--query', '-q', default=None,
+                        help="only replay messages matching this filter expression over their "
+                        "payload, like 'msg_type == \"SENSOR_ANALOG\" and data.value > 3000'")
+    parser.add_argument('--no_control', action='store_true',
+                        help="don't listen for pause/resume/seek/speed commands on "
+                        "Replay/Control or publish the position on Replay/Status")
+    parser.add_argument('log_files', nargs="*", default=None,
+                        help="relative paths to log files, several logs are replayed merged "
+                        "in timestamp order (default: selection from prompt)")
     return parser.parse_args()
 
 
@@ -57,18 +103,53 @@ def get_replay_log(max_logs: int) -> Path | None:
     return log_files[selection]
 
 
+def get_log_summary(log_file: Path) -> LogSummary | None:
+    """
+    Load the summary of a log if it covers the whole log, so its index can be
+    used to seek.
+    """
+    summary = LogSummary.load(summary_path(log_file))
+    if summary is None or summary.size != os.path.getsize(log_file):
+        return None
+    return summary
+
+
 if __name__ == "__main__":
     args = parse_arguments()
     max_logs = args.max_logs
     replay_speed = args.replay_speed
-    log_file = args.log_file if args.log_file != None else get_replay_log(max_logs)
+    log_files = args.log_files or [get_replay_log(max_logs)]
 
-    if log_file == None:
+    if None in log_files:
         print("Error: unable to retrieve log file.")
         sys.exit(1)
 
-    print(f"replaying log: {log_file}")
-    print(f"replay speed: {replay_speed}x")
+    for index, old, new in args.remap:
+        if index is not None and not 0 <= index < len(log_files):
+            print(f"Error: can't remap {old}={new} in log {index}, "
+                  f"there are only {len(log_files)} logs (numbered from 0).")
+            sys.exit(1)
+
+    if args.query:
+        try:
+            compile_expression(args.query)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
 
-    with open(log_file, 'rb') as f:
-        replay_log.replay(f, replay_speed)
+    for log_file in log_files:
+        print(f"replaying log: {log_file}")
+    print(f"replay speed: {'max' if math.isinf(replay_speed) else f'{replay_speed}x'}")
+
+    # summaries are also used to seek when the replay is controlled over the bus
+    summaries = [get_log_summary(log_file) for log_file in log_files]
+    if args.start is not None and None in summaries:
+        print("no up to date log summary, fast-forwarding to start instead of seeking")
+    if not args.no_control:
+        print(f"listening for replay commands on {replay_log.CONTROL_CHANNEL}")
+
+    with contextlib.ExitStack() as stack:
+        log_buffers = [stack.enter_context(open(log_file, 'rb')) for log_file in log_files]
+        replay_log.replay(log_buffers, replay_speed, args.start, args.end, args.channels,
+                          summaries, args.loop, args.live_timestamps, args.remap,
+                          control=not args.no_control, query=args.query)
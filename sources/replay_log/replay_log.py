@@ -1,34 +1,468 @@
 """
 Replay Log Source
--  
+-
 Replays previous logs from the Global Log sink,
 or from a selected file, in real time.
 
 See python3 main.py --help for options.
 """
 
+import collections
+import heapq
 import io
+import math
 import time
 
 import msgpack
 
-from omnibus import Sender, Message
+from omnibus import Sender, Receiver, Message
+from omnibus.util import LogSummary, compile_expression
 
+SPIN_TIME = 0.002  # seconds before a message is due to stop sleeping and busy-wait instead
+BATCH_WINDOW = 0.001  # messages due within this many seconds of each other are sent together
+STATUS_INTERVAL = 0.2  # seconds between updates of the progress readout
+DEDUP_WINDOW = 1  # seconds to remember messages for when dropping duplicates across merged logs
+CONTROL_POLL_TIME = 0.05  # longest time in seconds to wait between checks for control commands
+# seconds a message can be logged behind a later one (like the delayed copy of the CAN stream),
+# so reading for a time window stops once the log is this far past its end
+LATE_TOLERANCE = 5
 
-def replay(log_buffer: io.BufferedReader, replay_speed: float | int):
+REPLAY_CHANNELS = "Replay/"
+CONTROL_CHANNEL = "Replay/Control"
+STATUS_CHANNEL = "Replay/Status"
+
+
+def read_log(log_buffer: io.BufferedReader, offset: int = 0, end_offset: int | None = None,
+             summary: LogSummary | None = None):
     """
-    Replays the contents of a log_buffer
+    Yield the messages of a log as (channel, timestamp, payload, size) tuples,
+    starting at byte offset and stopping once end_offset has been reached.
+
+    Besides Global Log files, this reads the log_*.dat backups written by the
+    NI source, which hold bare DAQ payloads rather than [channel, timestamp,
+    payload] messages.
+
+    Messages read past the part of the log covered by summary are added to it,
+    so a summary that starts out empty becomes an index of the log as it's read.
     """
+    log_buffer.seek(offset)
     unpacker = msgpack.Unpacker(file_like=log_buffer)
-    real_start = time.time()
-    log_start = None
-    sender = Sender()
-    print("Replaying...")
-    for channel, timestamp, payload in unpacker:
-        if log_start == None:
-            log_start = timestamp
-        while timestamp - log_start > (time.time() - real_start) * replay_speed:
-            time.sleep(0.1)
+    position = 0
+    for record in unpacker:
+        size = unpacker.tell() - position
+        if isinstance(record, dict):
+            message = "DAQ", record["timestamp"], record, size
+        else:
+            channel, timestamp, payload = record
+            message = channel, timestamp, payload, size
+        if summary is not None and offset + position == summary.size:
+            summary.add(*message)
+        position += size
+        yield message
+        if end_offset is not None and offset + position >= end_offset:
+            return
+
+
+def is_number(value) -> bool:
+    """
+    Check if a value received in a command is a finite number.
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def is_speed(value) -> bool:
+    """
+    Check if a value received in a command is a replay speed, a number above zero.
+    """
+    return is_number(value) and value > 0
+
+
+def wait_until(deadline: float):
+    """
+    Wait until time.perf_counter() reaches deadline. sleep() can overshoot by a
+    millisecond or more, so the last SPIN_TIME seconds are busy-waited.
+    """
+    while (remaining := deadline - time.perf_counter()) > 0:
+        if remaining > SPIN_TIME:
+            time.sleep(remaining - SPIN_TIME)
+
+
+def first_timestamp(log_buffer: io.BufferedReader) -> float | None:
+    """
+    Return the timestamp of the first message of a log, or None if it's empty.
+    """
+    first = next(read_log(log_buffer), None)
+    return None if first is None else first[1]
+
+
+def select_messages(log_buffer: io.BufferedReader, start_time: float | None = None,
+                    end_time: float | None = None, summary: LogSummary | None = None):
+    """
+    Return an iterator over the messages of a log with timestamps between
+    start_time and end_time, using the summary's index to skip the parts of
+    the log that are outside of that window. The summary is extended with
+    any part of the log it doesn't cover yet. Past the summary, the log is
+    read until a message is LATE_TOLERANCE seconds past end_time.
+    """
+    offset = 0
+    end_offset = None
+    if summary is not None:
+        if start_time is not None:
+            offset = summary.seek_offset(start_time)
+        if end_time is not None:
+            # past the end of the summary we don't know where the window ends
+            end_offset = summary.end_offset(end_time)
+            if end_offset >= summary.size:
+                end_offset = None
+    messages = read_log(log_buffer, offset, end_offset, summary)
+
+    if start_time is not None:
+        messages = (m for m in messages if m[1] >= start_time)
+    if end_time is not None:
+        messages = messages_until(messages, end_time)
+    return messages
+
+
+def messages_until(messages, end_time: float, tolerance: float = LATE_TOLERANCE):
+    """
+    Yield the messages with timestamps at or before end_time, stopping at the
+    first message more than tolerance seconds after it rather than reading the
+    rest of the log, since no message after that is expected to be back in
+    the window.
+    """
+    for message in messages:
+        if message[1] > end_time + tolerance:
+            return
+        if message[1] <= end_time:
+            yield message
+
+
+def remap_channels(messages, remap: list[tuple[str, str]]):
+    """
+    Replace the channel prefixes of messages according to a list of
+    (old prefix, new prefix) pairs. The first matching pair is used.
+    """
+    for channel, timestamp, payload, size in messages:
+        for old, new in remap:
+            if channel.startswith(old):
+                channel = new + channel[len(old):]
+                break
+        yield channel, timestamp, payload, size
+
+
+def drop_duplicates(messages, window: float = DEDUP_WINDOW):
+    """
+    Drop messages that have already been seen within the last window seconds,
+    such as the same bus traffic recorded by two loggers.
+
+    Messages are identified by their channel, timestamp and payload. Payloads
+    that carry their own timestamp (like DAQ data) are identified by channel
+    and payload alone, since the NI source's backup log records them before
+    they're sent and so with a slightly earlier timestamp than Global Log.
+    """
+    seen = set()
+    recent = collections.deque()  # (timestamp, key) in the order the keys were seen
+    for message in messages:
+        channel, timestamp, payload, _ = message
+        while recent and recent[0][0] < timestamp - window:
+            seen.discard(recent.popleft()[1])
+        if isinstance(payload, dict) and "timestamp" in payload:
+            key = (channel, msgpack.packb(payload))
+        else:
+            key = (channel, timestamp, msgpack.packb(payload))
+        if key in seen:
+            continue
+        seen.add(key)
+        recent.append((timestamp, key))
+        yield message
+
+
+def merge_messages(sources: list, dedup_window: float = DEDUP_WINDOW):
+    """
+    Merge the message iterators of several logs into one, in timestamp order,
+    dropping duplicates. Each log is read lazily so whole logs are never loaded.
+    """
+    if len(sources) == 1:
+        return sources[0]
+    merged = heapq.merge(*sources, key=lambda message: message[1])
+    return drop_duplicates(merged, dedup_window)
+
+
+class Replayer:
+    """
+    Sends replayed messages onto the bus, either paced by their timestamps
+    or as fast as possible, and keeps track of the throughput achieved.
+
+    With control enabled, the replay listens on CONTROL_CHANNEL for commands
+    and publishes its position on STATUS_CHANNEL. Commands are dictionaries:
+        {"command": "pause"}
+        {"command": "resume"}
+        {"command": "seek", "time": <seconds since the start of the log>}
+        {"command": "speed", "speed": <replay speed above zero, or "max">}
+    Anything else is printed and ignored.
+    """
+
+    def __init__(self, replay_speed: float, live_timestamps: bool = False, control: bool = False):
+        self.sender = Sender()
+        self.receiver = Receiver(CONTROL_CHANNEL) if control else None
+        self.replay_speed = replay_speed
+        self.live_timestamps = live_timestamps
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.first_send = None  # perf_counter() time of the first send
+        self.last_status = (time.perf_counter(), 0, 0)  # (time, messages, bytes) at the last readout
+
+        self.log_start = 0  # timestamp that positions are measured from
+        self.paused = False
+        self.seek_to = None  # timestamp requested by a seek command that hasn't been handled yet
+        # log time and perf_counter() time that the pacing is relative to
+        self.clock = (0, time.perf_counter())
+
+    def position(self) -> float:
+        """
+        Return the timestamp the replay is currently at.
+        """
+        replay_start, real_start = self.clock
+        if self.paused or math.isinf(self.replay_speed):
+            return replay_start
+        return replay_start + (time.perf_counter() - real_start) * self.replay_speed
+
+    def set_clock(self, timestamp: float):
+        """
+        Make the pacing continue from timestamp, now.
+        """
+        self.clock = (timestamp, time.perf_counter())
+
+    def handle_command(self, command: dict):
+        match command:
+            case {"command": "pause"}:
+                self.set_clock(self.position())
+                self.paused = True
+            case {"command": "resume"}:
+                self.paused = False
+                self.set_clock(self.clock[0])
+            case {"command": "seek", "time": seek_time} if is_number(seek_time):
+                self.seek_to = self.log_start + seek_time
+                self.set_clock(self.seek_to)
+            case {"command": "speed", "speed": speed} if speed == "max" or is_speed(speed):
+                position = self.position()
+                self.replay_speed = math.inf if speed == "max" else float(speed)
+                self.set_clock(position)
+            case _:
+                # anyone on the bus can send commands, so a bad one mustn't stop the replay
+                print(f"\nIgnoring unknown or invalid replay command {command}")
+                return
+        self.publish_status()
+
+    def poll_control(self, timeout: float = 0):
+        """
+        Handle any commands received within timeout seconds. Returns early once
+        a command is received.
+        """
+        if self.receiver is None:
+            return
+        message = self.receiver.recv_message(int(timeout * 1000))
+        while message is not None:
+            self.handle_command(message.payload)
+            message = self.receiver.recv_message(0)
+
+    def wait_for(self, timestamp: float) -> bool:
+        """
+        Wait until the message with the given timestamp is due, handling control
+        commands meanwhile. Returns False if a seek means it shouldn't be sent.
+        """
+        while True:
+            if self.receiver is not None:
+                self.poll_control()
+            if self.seek_to is not None:
+                return False
+            if self.paused:
+                self.poll_control(CONTROL_POLL_TIME)
+                continue
+            if math.isinf(self.replay_speed):
+                return True
+            replay_start, real_start = self.clock
+            remaining = real_start + (timestamp - replay_start) / self.replay_speed \
+                - time.perf_counter()
+            if remaining <= 0:
+                return True
+            if remaining <= SPIN_TIME:
+                continue  # busy-wait
+            if self.receiver is not None:
+                self.poll_control(min(remaining - SPIN_TIME, CONTROL_POLL_TIME))
+            else:
+                wait_until(time.perf_counter() + remaining - SPIN_TIME)
+
+    def send(self, channel: str, timestamp: float, payload, size: int):
+        if self.live_timestamps:
+            # shift the message (and the DAQ-style timestamp in its payload) to now
+            now = time.time()
+            if isinstance(payload, dict) and "timestamp" in payload:
+                payload["timestamp"] += now - timestamp
+            timestamp = now
         # send_message(...) instead of send(...) keeps old timestamp
-        sender.send_message(Message(channel, timestamp, payload))
-        print(f"\r{timestamp - log_start:.0f}               ", end='')
+        self.sender.send_message(Message(channel, timestamp, payload))
+        self.sent_messages += 1
+        self.sent_bytes += size
+
+    def play(self, replay_start: float, messages) -> float | None:
+        """
+        Send messages, pacing them relative to replay_start unless the replay
+        speed is infinite. Returns the timestamp to continue from if a seek
+        command interrupted the replay, and None once all messages are sent.
+        """
+        if self.first_send is None:
+            self.first_send = time.perf_counter()
+        self.seek_to = None
+        self.set_clock(replay_start)
+
+        batch = []
+        for message in messages:
+            timestamp = message[1]
+            if math.isinf(self.replay_speed):
+                if batch:  # left over from before the speed was changed
+                    if not self.send_batch(batch):
+                        return self.seek_to
+                    batch = []
+                # checking the clock and controls every message would slow us down
+                if self.sent_messages % 1000 == 0 and not self.wait_for(timestamp):
+                    return self.seek_to
+                self.send(*message)
+                self.clock = (timestamp, self.clock[1])
+                if self.sent_messages % 1000 == 0:
+                    self.print_status()
+                continue
+
+            # messages due within BATCH_WINDOW of the first message of the batch are sent with it
+            if batch and (timestamp - batch[0][1]) / self.replay_speed > BATCH_WINDOW:
+                if not self.send_batch(batch):
+                    return self.seek_to
+                batch = []
+            batch.append(message)
+        if batch and not self.send_batch(batch):
+            return self.seek_to
+        return None
+
+    def send_batch(self, batch: list) -> bool:
+        if not self.wait_for(batch[0][1]):
+            return False
+        for message in batch:
+            self.send(*message)
+        self.print_status()
+        return True
+
+    def print_status(self):
+        """
+        Print the replay position and the throughput since the last readout, and
+        publish the status if control is enabled. Printing is slow compared to
+        sending, so this only prints a few times a second.
+        """
+        now = time.perf_counter()
+        last_time, last_messages, last_bytes = self.last_status
+        if now - last_time < STATUS_INTERVAL:
+            return
+        elapsed = now - last_time
+        message_rate = (self.sent_messages - last_messages) / elapsed
+        byte_rate = (self.sent_bytes - last_bytes) / elapsed
+        self.last_status = (now, self.sent_messages, self.sent_bytes)
+        print(f"\r{self.position() - self.log_start:.0f} s  {message_rate:.0f} msgs/sec  "
+              f"{byte_rate / (1024 * 1024):.2f} MB/sec          ", end='')
+        self.publish_status()
+
+    def publish_status(self):
+        if self.receiver is None:
+            return
+        self.sender.send_message(Message(STATUS_CHANNEL, time.time(), {
+            "position": self.position() - self.log_start,
+            "log_start": self.log_start,
+            "paused": self.paused,
+            "speed": "max" if math.isinf(self.replay_speed) else self.replay_speed,
+        }))
+
+    def print_report(self):
+        """
+        Print the average throughput of the whole replay.
+        """
+        elapsed = time.perf_counter() - (self.first_send or time.perf_counter())
+        print(f"\nSent {self.sent_messages} messages ({self.sent_bytes / (1024 * 1024):.2f} MB) "
+              f"in {elapsed:.2f} s", end='')
+        if elapsed > 0:
+            print(f": {self.sent_messages / elapsed:.0f} msgs/sec, "
+                  f"{self.sent_bytes / elapsed / (1024 * 1024):.2f} MB/sec", end='')
+        print()
+
+
+def replay(log_buffers: io.BufferedReader | list[io.BufferedReader], replay_speed: float | int,
+           start: float | None = None, end: float | None = None,
+           channels: list[str] | None = None, summaries: list[LogSummary | None] | None = None,
+           loops: int = 1, live_timestamps: bool = False,
+           remap: list[tuple[int | None, str, str]] | None = None,
+           dedup_window: float = DEDUP_WINDOW, control: bool = False, query: str | None = None):
+    """
+    Replays the contents of one or more log buffers
+
+    Several logs are merged into one replay in timestamp order, dropping
+    messages that appear in more than one of them (see drop_duplicates).
+    remap is a list of (log index, old prefix, new prefix) used to rename
+    channels, where a log index of None applies to every log.
+
+    start and end are seconds since the first message of the logs and limit the
+    replay to that window. channels limits the replay to channels starting with
+    one of the given prefixes (after remapping), and query to messages matching
+    a filter expression (see omnibus.util.compile_expression). If summaries of
+    the logs are given, their indexes are used to jump straight to start. Otherwise the
+    messages before start are skipped over without waiting, and an offset
+    table is built while replaying so seeking back doesn't need to reread the
+    logs from the start.
+
+    Each message is sent when it's due according to its timestamp. Messages due
+    within BATCH_WINDOW of each other are sent together in one burst. An
+    infinite replay_speed sends messages as fast as possible instead.
+
+    The logs are replayed loops times, or forever if loops is 0. With
+    live_timestamps, messages are sent with the current time rather than the
+    time they were logged at. With control, the replay can be paused, sought
+    and sped up over the bus (see Replayer).
+    """
+    if not isinstance(log_buffers, list):
+        log_buffers = [log_buffers]
+    summaries = summaries or [None] * len(log_buffers)
+    # logs without a summary get an offset table that's filled in as they're read
+    summaries = [summary or LogSummary() for summary in summaries]
+
+    first_timestamps = [t for t in map(first_timestamp, log_buffers) if t is not None]
+    if not first_timestamps:
+        return
+    log_start = min(first_timestamps)
+    start_time = None if start is None else log_start + start
+    end_time = None if end is None else log_start + end
+
+    predicate = compile_expression(query) if query else None
+    replayer = Replayer(replay_speed, live_timestamps, control)
+    replayer.log_start = log_start
+    print("Replaying...")
+    loop = 0
+    position = start_time
+    while loops == 0 or loop < loops:
+        sources = []
+        for i, (log_buffer, summary) in enumerate(zip(log_buffers, summaries)):
+            messages = select_messages(log_buffer, position, end_time, summary)
+            log_remap = [(old, new) for index, old, new in remap or [] if index in (None, i)]
+            if log_remap:
+                messages = remap_channels(messages, log_remap)
+            sources.append(messages)
+        messages = merge_messages(sources, dedup_window)
+        # never replay old replay commands and statuses, we'd end up controlling ourselves
+        messages = (m for m in messages if not m[0].startswith(REPLAY_CHANNELS))
+        if channels:
+            prefixes = tuple(channels)
+            messages = (m for m in messages if m[0].startswith(prefixes))
+        if predicate is not None:
+            messages = (m for m in messages if predicate(m[0], m[1], m[2]))
+
+        # the replay is paced relative to the start of the replayed window
+        position = replayer.play(log_start if position is None else position, messages)
+        if position is None:
+            position = start_time
+            loop += 1
+    replayer.print_report()
@@ -1,4 +1,5 @@
 import io
+import math
 import time
 import string
 from typing import Generator
@@ -8,6 +9,7 @@ import msgpack
 import pytest
 
 from omnibus import Message
+from omnibus.util import LogSummary, log_summary
 import replay_log
 
 
@@ -47,6 +49,51 @@ class MockSender:
         self.mock_file.write(packed_bytes)
 
 
+class TimingMockSender(MockSender):
+    """
+    Records when each message was sent as well as the message.
+    """
+    send_times = []
+
+    def send_message(self, msg: Message | None):
+        self.send_times.append((time.perf_counter(), msg.timestamp))
+        super().send_message(msg)
+
+
+class FakeClock:
+    """
+    Stands in for time.perf_counter() and time.sleep(), so pacing can be tested
+    without depending on how busy the machine running the tests is. Sleeping
+    moves the clock forward, and every reading takes a microsecond.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def perf_counter(self) -> float:
+        self.now += 1e-6
+        return self.now
+
+    def sleep(self, duration: float):
+        self.now += max(duration, 0)
+
+
+class MockReceiver:
+    """
+    Mocks omnibus.Receiver, receiving the scripted payloads one per call.
+    """
+    # commands has class scope to simplify monkeypatching
+    commands = []
+
+    def __init__(self, *channels):
+        pass
+
+    def recv_message(self, timeout=None):
+        if not self.commands:
+            return None
+        return Message(replay_log.CONTROL_CHANNEL, time.time(), self.commands.pop(0))
+
+
 class TestReplayLog:
     @pytest.fixture
     def mock_sender(self, monkeypatch):
@@ -84,3 +131,168 @@ class TestReplayLog:
         """
         replay_log.replay(mock_input, replay_speed)
         assert mock_sender.getvalue() == mock_input.getvalue()
+
+    @pytest.fixture
+    def windowed_input(self):
+        """
+        Yield a log with a message every 0.01 s on alternating channels.
+        """
+        mocked_input = io.BytesIO()
+        for i in range(100):
+            channel = "DAQ" if i % 2 == 0 else "CAN/Parsley"
+            mocked_input.write(msgpack.packb([channel, 1000 + i * 0.01, i]))
+        mocked_input.seek(0)
+        yield mocked_input
+        mocked_input.close()
+
+    def get_sent(self, mock_sender):
+        mock_sender.seek(0)
+        return list(msgpack.Unpacker(mock_sender))
+
+    @pytest.mark.parametrize("indexed", [False, True])
+    def test_replay_window(self, mock_sender, windowed_input, monkeypatch, indexed):
+        """
+        Test that only messages between start and end are replayed, with or without an index.
+        """
+        summary = None
+        if indexed:
+            monkeypatch.setattr(log_summary, 'INDEX_BLOCK_SIZE', 64)
+            summary = LogSummary()
+            summary.scan(windowed_input)
+            assert len(summary.index) > 5
+
+        replay_log.replay(windowed_input, 100, start=0.5, end=0.7, summaries=[summary])
+        assert [m[2] for m in self.get_sent(mock_sender)] == list(range(50, 71))
+
+    def test_window_end_stops_reading(self):
+        """
+        Test that reading stops once the log is past the end of the window, keeping
+        messages that were logged late but belong in it.
+        """
+        read = []
+
+        def messages():
+            for timestamp in [1, 2, 3, 2.5, 4, 3.5, 8, 3.9, 20, 3]:
+                read.append(timestamp)
+                yield "CAN/Parsley", timestamp, None, 1
+
+        selected = replay_log.messages_until(messages(), 4, tolerance=5)
+        assert [m[1] for m in selected] == [1, 2, 3, 2.5, 4, 3.5, 3.9]
+        assert read[-1] == 20
+
+    def test_replay_channels(self, mock_sender, windowed_input):
+        """
+        Test that only channels matching one of the given prefixes are replayed.
+        """
+        replay_log.replay(windowed_input, 100, end=0.2, channels=["CAN"])
+        sent = self.get_sent(mock_sender)
+        assert [m[2] for m in sent] == list(range(1, 21, 2))
+        assert all(m[0] == "CAN/Parsley" for m in sent)
+
+    def test_replay_query(self, mock_sender, windowed_input):
+        """
+        Test that only messages matching the query are replayed.
+        """
+        replay_log.replay(windowed_input, 100, end=0.2, query='channel == "DAQ" and payload >= 10')
+        assert [m[2] for m in self.get_sent(mock_sender)] == list(range(10, 21, 2))
+
+    @pytest.mark.parametrize("replay_speed", [1, 2])
+    def test_replay_timing(self, mock_sender, windowed_input, monkeypatch, replay_speed):
+        """
+        Test that messages are never sent early, and are sent close to when they're due.
+        """
+        monkeypatch.setattr(replay_log, 'Sender', TimingMockSender)
+        clock = FakeClock()
+        monkeypatch.setattr(time, 'perf_counter', clock.perf_counter)
+        monkeypatch.setattr(time, 'sleep', clock.sleep)
+        TimingMockSender.send_times = []
+        replay_log.replay(windowed_input, replay_speed, end=0.3)
+
+        sent_times = TimingMockSender.send_times
+        real_start, log_start = sent_times[0]
+        lateness = []
+        for real, timestamp in sent_times:
+            due = (timestamp - log_start) / replay_speed
+            lateness.append(real - real_start - due)
+        assert min(lateness) > -replay_log.BATCH_WINDOW
+        assert max(lateness) < 0.001
+        assert [t for _, t in sent_times] == sorted(t for _, t in sent_times)
+
+    def test_replay_max_speed_loops(self, mock_sender, mock_input):
+        """
+        Test that max speed replays everything, once per loop, without waiting.
+        """
+        runtime = get_runtime(replay_log.replay, mock_input, math.inf, loops=3)
+        assert mock_sender.getvalue() == mock_input.getvalue() * 3
+        assert runtime < 0.2
+
+    def test_replay_live_timestamps(self, mock_sender, windowed_input):
+        """
+        Test that live timestamps replace the logged ones.
+        """
+        before = time.time()
+        replay_log.replay(windowed_input, math.inf, live_timestamps=True)
+        sent = self.get_sent(mock_sender)
+        assert [m[2] for m in sent] == list(range(100))
+        assert all(before <= m[1] <= time.time() for m in sent)
+
+    def test_replay_merged(self, mock_sender):
+        """
+        Test that several logs are merged in timestamp order without duplicates.
+        """
+        tower, ground, ni_backup = io.BytesIO(), io.BytesIO(), io.BytesIO()
+        for i in range(20):
+            daq = {"timestamp": 1000 + i * 0.01, "data": {"fake": [i]}}
+            rlcs = ["RLCS", 1000.002 + i * 0.01, {"state": 1}]
+            # both loggers record the whole bus, the NI source backs up its own data
+            for log in (tower, ground):
+                log.write(msgpack.packb(["DAQ", daq["timestamp"] + 0.001, daq]))
+                log.write(msgpack.packb(rlcs))
+            ni_backup.write(msgpack.packb(daq))
+        ground.write(msgpack.packb(["CAN/Parsley", 1000.5, "ground only"]))
+
+        replay_log.replay([tower, ground, ni_backup], math.inf,
+                          remap=[(1, "CAN/Parsley", "CAN/Ground")])
+        sent = self.get_sent(mock_sender)
+        assert [m[1] for m in sent] == sorted(m[1] for m in sent)
+        assert [m[0] for m in sent] == ["DAQ", "RLCS"] * 20 + ["CAN/Ground"]
+        assert [m[2]["data"]["fake"] for m in sent if m[0] == "DAQ"] == [[i] for i in range(20)]
+        # repeated payloads with different timestamps are not duplicates
+        assert len([m for m in sent if m[0] == "RLCS"]) == 20
+
+    def test_replay_control(self, mock_sender, windowed_input, monkeypatch):
+        """
+        Test that a seek command received over the bus jumps the replay, and
+        that the replay reports its position.
+        """
+        monkeypatch.setattr(replay_log, 'Receiver', MockReceiver)
+        MockReceiver.commands = [{"command": "seek", "time": 0.9}]
+        replay_log.replay(windowed_input, math.inf, control=True)
+
+        sent = self.get_sent(mock_sender)
+        assert [m[2] for m in sent if m[0] != replay_log.STATUS_CHANNEL] == list(range(90, 100))
+        status = [m[2] for m in sent if m[0] == replay_log.STATUS_CHANNEL]
+        assert status[0]["position"] == pytest.approx(0.9)
+        assert status[0]["paused"] is False
+
+    @pytest.mark.parametrize("command", [
+        {"command": "speed", "speed": 0},
+        {"command": "speed", "speed": -2},
+        {"command": "speed", "speed": "fast"},
+        {"command": "speed", "speed": math.nan},
+        {"command": "seek", "time": "start"},
+        {"command": "seek", "time": None},
+        {"command": "rewind"},
+        "pause",
+    ])
+    def test_replay_control_invalid(self, mock_sender, windowed_input, monkeypatch, command):
+        """
+        Test that invalid commands are ignored instead of stopping the replay.
+        """
+        monkeypatch.setattr(replay_log, 'Receiver', MockReceiver)
+        MockReceiver.commands = [command]
+        replay_log.replay(windowed_input, math.inf, control=True)
+
+        sent = self.get_sent(mock_sender)
+        assert [m[2] for m in sent if m[0] != replay_log.STATUS_CHANNEL] == list(range(100))
+        assert MockReceiver.commands == []
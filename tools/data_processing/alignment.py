@@ -0,0 +1,90 @@
+# Put DAQ and CAN data on a common timebase, by resampling onto a fixed rate grid and joining the latest CAN state onto each DAQ row
+from typing import Dict, Iterable, Iterator, Union
+
+import numpy as np
+
+from column_data import ColumnData, take_rows
+
+AGGREGATIONS = ["last", "mean", "min", "max"]
+
+
+def sorted_by_time(data: ColumnData) -> ColumnData:
+    """Return the data sorted by timestamp, keeping the order of rows with the same timestamp. Data that's already in order is returned as is."""
+
+    if not np.any(np.diff(data.time) < 0):
+        return data
+    return data.select(np.argsort(data.time, kind="stable"))
+
+
+def asof_join(left: ColumnData, right: ColumnData) -> ColumnData:
+    """For every row of left, add the columns of the latest row of right at or before it. Sorting right by time ahead of time (see sorted_by_time) saves doing it for every block joined to it."""
+
+    right = sorted_by_time(right)  # searchsorted needs the times in order
+    rows = np.searchsorted(right.time, left.time, side="right") - 1
+    return ColumnData(left.time, left.cols + right.cols,
+                      left.columns + [take_rows(column, rows) for column in right.columns])
+
+
+def resample(data: ColumnData, rate: float, how: Union[str, Dict[str, str]] = "last") -> ColumnData:
+    """Resample the data onto a grid of rate rows per second, aggregating the rows that fall in each bin. Each output row is timestamped with the start of its bin, and covers the 1 / rate seconds after it. Bins without any rows are left out.
+
+    how is one of AGGREGATIONS, or a dictionary from column name to aggregation with "last" for columns not in it. Non-numeric columns always take the last value, the latest one in time."""
+
+    data = sorted_by_time(data)
+    return resample_bins(data, np.floor(data.time * rate).astype(np.int64), rate, how)
+
+
+def resample_bins(data: ColumnData, bins: np.ndarray, rate: float, how: Union[str, Dict[str, str]]) -> ColumnData:
+    """Aggregate the rows of data sorted by time into the grid bins they've been put in, like resample does"""
+
+    grid, bin_of_row = np.unique(bins, return_inverse=True)
+    n_bins = len(grid)
+
+    last_rows = np.full(n_bins, -1, dtype=np.int64)
+    np.maximum.at(last_rows, bin_of_row, np.arange(len(data)))
+
+    columns = []
+    for col, column in zip(data.cols, data.columns):
+        aggregation = how if isinstance(how, str) else how.get(col, "last")
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {aggregation}, expected one of {AGGREGATIONS}")
+        if aggregation == "last" or column.dtype == object:
+            columns.append(column[last_rows])
+        elif aggregation == "mean":
+            present = ~np.isnan(column)
+            sums = np.bincount(bin_of_row, weights=np.where(present, column, 0), minlength=n_bins)
+            counts = np.bincount(bin_of_row, weights=present, minlength=n_bins)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                columns.append(sums / counts)  # NaN for bins with no readings
+        else:
+            # fmin and fmax ignore NaN, so bins with no readings stay NaN
+            out = np.full(n_bins, np.nan)
+            (np.fmin if aggregation == "min" else np.fmax).at(out, bin_of_row, column)
+            columns.append(out)
+
+    return ColumnData(grid / rate, data.cols, columns)
+
+
+def resample_blocks(blocks: Iterable[ColumnData], rate: float, how: Union[str, Dict[str, str]] = "last") -> Iterator[ColumnData]:
+    """Resample a stream of data blocks onto a grid like resample does. The rows of the last bin of each block are held back until the next block, since that bin might continue in it.
+
+    The blocks are expected to be in time order, but rows within a block don't have to be. Rows that come in after their bin has already been written (like overlapping DAQ samples of consecutive messages) are counted in the bin that's held back instead, so the grid stays in order and no readings are lost."""
+
+    carry = None
+    open_bin = None  # the bin held back, every earlier bin has been written
+    for block in blocks:
+        if carry is not None:
+            block = ColumnData.concatenate([carry, block], block.cols)
+        if len(block) == 0:
+            continue
+        block = sorted_by_time(block)
+        bins = np.floor(block.time * rate).astype(np.int64)
+        if open_bin is not None:
+            bins = np.maximum(bins, open_bin)
+        in_last_bin = bins == bins[-1]
+        carry, carry_bins = block.select(in_last_bin), bins[in_last_bin]
+        open_bin = bins[-1]
+        if not np.all(in_last_bin):
+            yield resample_bins(block.select(~in_last_bin), bins[~in_last_bin], rate, how)
+    if carry is not None and len(carry):
+        yield resample_bins(carry, carry_bins, rate, how)
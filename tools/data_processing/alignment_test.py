@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from alignment import asof_join, resample, resample_blocks, sorted_by_time
+from column_data import ColumnData
+
+
+def data(times, **columns) -> ColumnData:
+    return ColumnData(np.array(times, dtype=np.float64), list(columns),
+                      [np.array(values, dtype=object if any(isinstance(v, str) for v in values) else np.float64)
+                       for values in columns.values()])
+
+
+class TestSortedByTime:
+    def test_sorted(self):
+        sorted_data = data([0, 1, 1, 2], a=[0, 1, 2, 3])
+        assert sorted_by_time(sorted_data) is sorted_data
+
+    def test_out_of_order(self):
+        result = sorted_by_time(data([2, 0, 1, 0], a=[0, 1, 2, 3]))
+        np.testing.assert_array_equal(result.time, [0, 0, 1, 2])
+        np.testing.assert_array_equal(result["a"], [1, 3, 2, 0])  # ties keep their order
+
+
+class TestAsofJoin:
+    def test_join(self):
+        left = data([0.5, 1.0, 2.5, 3.0], x=[1, 2, 3, 4])
+        right = data([1.0, 2.0], valve=["open", "closed"])
+        result = asof_join(left, right)
+
+        assert result.cols == ["x", "valve"]
+        assert result["valve"].tolist() == [None, "open", "closed", "closed"]
+
+    def test_right_out_of_order(self):
+        left = data([1.5, 2.5], x=[1, 2])
+        right = data([2.0, 1.0], state=[20, 10])
+        np.testing.assert_array_equal(asof_join(left, right)["state"], [10, 20])
+
+    def test_left_out_of_order(self):
+        left = data([2.5, 0.5, 1.5], x=[1, 2, 3])
+        right = data([1.0, 2.0], state=[10, 20])
+        np.testing.assert_array_equal(asof_join(left, right)["state"], [20, np.nan, 10])
+
+    def test_empty(self):
+        assert len(asof_join(data([], x=[]), data([1.0], state=[1]))) == 0
+        result = asof_join(data([1.0], x=[1]), data([], state=[]))
+        assert np.isnan(result["state"]).all()
+
+
+class TestResample:
+    def test_aggregations(self):
+        source = data([0.0, 0.05, 0.1, 0.35], x=[1, 3, 5, 7])
+
+        np.testing.assert_allclose(resample(source, 10).time, [0, 0.1, 0.3])
+        np.testing.assert_array_equal(resample(source, 10, "last")["x"], [3, 5, 7])
+        np.testing.assert_array_equal(resample(source, 10, "mean")["x"], [2, 5, 7])
+        np.testing.assert_array_equal(resample(source, 10, "min")["x"], [1, 5, 7])
+        np.testing.assert_array_equal(resample(source, 10, "max")["x"], [3, 5, 7])
+        with pytest.raises(ValueError):
+            resample(source, 10, "sum")
+
+    def test_missing_values(self):
+        source = data([0.0, 0.05, 0.1], x=[np.nan, 2, np.nan])
+        np.testing.assert_array_equal(resample(source, 10, "mean")["x"], [2, np.nan])
+        np.testing.assert_array_equal(resample(source, 10, "max")["x"], [2, np.nan])
+
+    def test_out_of_order(self):
+        # the last value of a bin is the latest one in time, not the last row
+        source = data([0.05, 0.0, 0.15, 0.1], x=[1, 2, 3, 4])
+        result = resample(source, 10, "last")
+        np.testing.assert_allclose(result.time, [0, 0.1])
+        np.testing.assert_array_equal(result["x"], [1, 3])
+
+    def test_empty(self):
+        assert len(resample(data([], x=[]), 10)) == 0
+
+
+class TestResampleBlocks:
+    def test_matches_resample(self):
+        times = np.arange(0, 10, 0.013)
+        source = ColumnData(times, ["x"], [np.sin(times)])
+        blocks = [source.select(slice(start, start + 97)) for start in range(0, len(source), 97)]
+
+        for how in ["last", "mean", "min", "max"]:
+            whole = resample(source, 3, how)
+            joined = ColumnData.concatenate(list(resample_blocks(blocks, 3, how)), ["x"])
+            np.testing.assert_allclose(joined.time, whole.time)
+            np.testing.assert_allclose(joined["x"], whole["x"])
+
+    def test_empty_blocks(self):
+        blocks = [data([], x=[]), data([0.0, 0.5], x=[1, 2]), data([], x=[]), data([0.7, 1.2], x=[3, 4]), data([], x=[])]
+        result = ColumnData.concatenate(list(resample_blocks(blocks, 1, "mean")), ["x"])
+
+        np.testing.assert_array_equal(result.time, [0, 1])
+        np.testing.assert_array_equal(result["x"], [2, 4])
+        assert list(resample_blocks([data([], x=[])], 1)) == []
+        assert list(resample_blocks([], 1)) == []
+
+    def test_out_of_order_blocks(self):
+        # the second block has a row from a bin that's already been written, and rows out of order
+        blocks = [data([0.1, 0.9, 1.2], x=[1, 2, 3]), data([2.5, 0.95, 1.5], x=[4, 5, 6])]
+        result = ColumnData.concatenate(list(resample_blocks(blocks, 1, "mean")), ["x"])
+
+        np.testing.assert_array_equal(result.time, [0, 1, 2])
+        assert not np.any(np.diff(result.time) <= 0)
+        # the late row is counted in the bin that was still open
+        np.testing.assert_array_equal(result["x"], [1.5, (3 + 5 + 6) / 3, 4])
@@ -0,0 +1,47 @@
+# Export many logs without any prompts, with a pool of processes each exporting one log at a time
+import contextlib
+import io
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+
+from interactions import data_export
+
+
+def export_log(file_path: str, mode: str, settings: dict) -> Tuple[bool, str]:
+    """Export one log with the given data_export settings, returning whether it worked and everything it printed, so the output of logs exported at the same time doesn't get mixed together"""
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            export_hash = data_export(file_path, mode, **settings)
+            print(f"Finished export {export_hash}")
+            succeeded = True
+        except Exception:
+            traceback.print_exc(file=output)
+            succeeded = False
+    return succeeded, output.getvalue()
+
+
+def batch_export(file_paths: List[str], mode="a", settings=None, workers=1) -> List[str]:
+    """Export every log with the same settings, exporting up to workers logs at once. The settings are keyword arguments for data_export and have to include the columns and time range, since there's nobody to ask. Returns the logs that failed to export."""
+
+    settings = settings or {}
+    if settings.get("columns") is None or settings.get("time_range") is None:
+        raise ValueError("Batch exports need the columns and time range to be given")
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(export_log, file_path, mode, settings): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            succeeded, output = future.result()
+            print(f"==> {file_path} {'done' if succeeded else 'FAILED'}")
+            print(output)
+            if not succeeded:
+                failed.append(file_path)
+
+    print(f"Exported {len(file_paths) - len(failed)} of {len(file_paths)} logs")
+    for file_path in failed:
+        print(f"Failed: {file_path}")
+    return failed
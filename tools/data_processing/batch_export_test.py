@@ -0,0 +1,110 @@
+import argparse
+import csv
+import glob
+import os
+
+import pytest
+
+from batch_export import batch_export
+from conftest import log_messages, write_log
+from interactions import match_columns
+from main import addProcessingArguments, processingSettings
+
+
+def settings_for(*argv, non_interactive=False):
+    parser = argparse.ArgumentParser()
+    addProcessingArguments(parser)
+    return processingSettings(parser.parse_args(argv), non_interactive)
+
+
+class TestProcessingSettings:
+    def test_defaults(self):
+        mode, settings = settings_for()
+        assert mode == "a"
+        assert settings["msg_packed_filtering"] == "ahead_stream"
+        assert settings["export_format"] == "csv"
+        assert settings["daq_compression"] and settings["use_cache"] and not settings["merge"]
+        # nothing given, so the columns and time range are asked for
+        assert settings["columns"] is None and settings["time_range"] is None
+
+    def test_non_interactive(self):
+        _, settings = settings_for(non_interactive=True)
+        assert settings["columns"] == ["*"]
+        assert settings["time_range"] == (0, float("inf"))
+
+    def test_options(self):
+        mode, settings = settings_for("-d", "-C", "DAQ:a", "-C", "b", "--start", "1.5", "-u", "-r", "1000",
+                                      "-b", "-f", "npz", "--no_cache")
+        assert mode == "d"
+        assert settings["columns"] == ["DAQ:a", "b"]
+        assert settings["time_range"] == (1.5, float("inf"))  # giving any of them skips the prompts
+        assert not settings["daq_compression"] and settings["daq_sample_rate"] == 1000
+        assert settings["msg_packed_filtering"] == "behind_stream"
+        assert settings["export_format"] == "npz"
+        assert not settings["use_cache"]
+
+        mode, settings = settings_for("-m", "-g", "10", "--agg", "max", "-t", "--stop", "5")
+        assert mode == "a"
+        assert settings["merge"] and settings["grid_rate"] == 10 and settings["grid_aggregation"] == "max"
+        assert settings["msg_packed_filtering"] == "board_time"
+        assert settings["columns"] == ["*"] and settings["time_range"] == (0, 5)
+
+    @pytest.mark.parametrize("argv", [["-b", "-t"], ["-d", "-m"], ["-c", "-m"], ["-g", "10"]])
+    def test_invalid_combinations(self, argv):
+        with pytest.raises(SystemExit):
+            settings_for(*argv)
+
+
+class TestMatchColumns:
+    COLUMNS = {("DAQ", "a"): 1, ("DAQ", "b"): 2, ("CAN", "vent_valve_req_status"): 3, ("CAN", "ox_tank_pressure"): 4}
+
+    def test_globs(self):
+        assert match_columns(self.COLUMNS, ["*"]) == [1, 2, 3, 4]
+        assert match_columns(self.COLUMNS, ["a", "*pressure"]) == [1, 4]
+        assert match_columns(self.COLUMNS, ["vent_*", "?"]) == [1, 2, 3]
+        assert match_columns(self.COLUMNS, ["A"]) == []  # names are case sensitive
+
+    def test_sources(self):
+        assert match_columns(self.COLUMNS, ["DAQ:*"]) == [1, 2]
+        assert match_columns(self.COLUMNS, ["can:*"]) == [3, 4]
+        assert match_columns(self.COLUMNS, ["CAN:a"]) == []
+        # the same column matched twice is only used once
+        assert match_columns(self.COLUMNS, ["a", "daq:a", "DAQ:?"]) == [1, 2]
+
+    def test_no_match(self, capsys):
+        assert match_columns(self.COLUMNS, ["nothing*", "b"]) == [2]
+        assert "no columns match nothing*" in capsys.readouterr().out
+
+
+class TestBatchExport:
+    def test_needs_columns_and_time_range(self):
+        with pytest.raises(ValueError):
+            batch_export([], settings={"columns": ["*"]})
+
+    def test_export(self, tmp_path, capsys):
+        log_paths = [str(tmp_path / f"log{i}.log") for i in range(2)]
+        for log_path in log_paths:
+            write_log(log_path, log_messages(0, 20))
+        missing = str(tmp_path / "missing.log")
+        _, settings = settings_for("-C", "DAQ:a", "-C", "CAN:*", non_interactive=True)
+
+        failed = batch_export(log_paths + [missing], "a", settings, workers=2)
+
+        # a log that can't be exported doesn't stop the others
+        assert failed == [missing]
+        out = capsys.readouterr().out
+        assert f"==> {missing} FAILED" in out and "FileNotFoundError" in out
+        assert "Exported 2 of 3 logs" in out
+        assert f"Failed: {missing}" in out
+        for log_path in log_paths:
+            stem = log_path[:-len(".log")]
+            assert f"==> {log_path} done" in out
+            [daq_path] = glob.glob(f"{stem}_export_*_daq.csv")
+            [can_path] = glob.glob(f"{stem}_export_*_can.csv")
+            assert len(glob.glob(f"{stem}_export_*_manifest.txt")) == 1
+            with open(daq_path) as infile:
+                rows = list(csv.reader(infile))
+            assert rows[0] == ["time", "a"] and len(rows) == 21
+            with open(can_path) as infile:
+                assert next(csv.reader(infile)) == ["time", "ox_tank_pressure", "vent_valve_req_status", "vent_valve_cur_status"]
+        assert not os.path.exists(missing)
@@ -0,0 +1,41 @@
+# Build (or rebuild) the summary sidecar of log files in one streaming pass, for logs recorded before globallog wrote summaries
+
+import argparse
+
+from omnibus.util import LogSummary, summary_path
+
+
+def print_summary(summary: LogSummary) -> None:
+    """Print the per-channel statistics of a summary"""
+
+    span = summary.end - summary.start if summary.count else 0
+    print(f"{summary.count} messages, {summary.size / (1024 * 1024):.2f} MB, {span:.1f} s")
+    for channel, stats in sorted(summary.channels.items()):
+        print(f"  {channel}: {stats['count']} messages, {stats['bytes']} bytes, "
+              f"{stats['first']:.3f} to {stats['last']:.3f}")
+    print(f"  {len(summary.daq_fields)} DAQ fields, {len(summary.can_signatures)} CAN signatures")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the summary sidecar (<log>.summary) for one or more log files")
+    parser.add_argument("files", nargs="+", help="The log files to summarize")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Rebuild from scratch instead of continuing an existing summary")
+    args = parser.parse_args()
+
+    for file in args.files:
+        if args.force:
+            summary = LogSummary()
+            with open(file, "rb") as infile:
+                summary.scan(infile)
+            summary.save(summary_path(file))
+        else:
+            summary = LogSummary.for_log(file)
+
+        print(f"Summary of {file} written to {summary_path(file)}")
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,11 @@
 # Run with -test to run tests
 import argparse
 
+from omnibus.util.log_summary import can_signature
+
+# the keys that make up a message's (board_id, msg_type, sensor_id, actuator) signature
+SIGNATURE_KEYS = {"board_id", "msg_type", "data.sensor_id", "data.actuator"}
+
 
 class CanProcessingField:
     """A class to represent a field in the CAN data that we can export as a CSV column. Has a matching pattern to try and see if a message payload matches the field (for CAN fields logged in the .log file by a parsley instance), and extracts the value from the payload if it does. These should be though of as an abstraction to explain what a message represents ex: the pneumatic pressure can be found at "msg_type": "SENSOR_ANALOG", "data.sensor_id": "SENSOR_PRESSURE_PNEUMATICS" and we want to extract "data.value" from it."""
@@ -20,6 +25,13 @@ class CanProcessingField:
         self.matching_pattern = matching_pattern
         self.reading_signature = reading_signature
 
+        # split the dotted keys once up front rather than on every message
+        self.matching_paths = [(tuple(key.split(".")), value)
+                               for key, value in matching_pattern.items()]
+        self.reading_path = tuple(reading_signature.split("."))
+        # whether the pattern only looks at the message signature, so matching can be decided once per signature
+        self.signature_only = all(key in SIGNATURE_KEYS for key in matching_pattern)
+
     def __repr__(self):
         return f"<ProcessingField {self.csv_name} (matching: {self.matching_pattern}, reading: {self.reading_signature})>"
 
@@ -29,15 +41,13 @@ class CanProcessingField:
     def match(self, candidate):
         """Check if the candidate message payload matches the matching pattern"""
 
-        for key, value in self.matching_pattern.items():
-            running_key = key
+        for path, value in self.matching_paths:
             checking = candidate
-            while running_key.find(".") != -1:
-                nested_key, running_key = running_key.split(".", 1)
-                if nested_key not in checking:
+            for key in path:
+                if not isinstance(checking, dict) or key not in checking:
                     return False
-                checking = checking[nested_key]
-            if running_key not in checking or checking[running_key] != value:
+                checking = checking[key]
+            if checking != value:
                 return False
         return True
 
@@ -48,17 +58,57 @@ class CanProcessingField:
             raise ValueError(
                 f"Can't read from a candidate that doesn't match the matching pattern {self.matching_pattern} for the data {candidate}")
 
-        running_key = self.reading_signature
+        return self.get_value(candidate)
+
+    def get_value(self, candidate):
+        """Read the value from a candidate message payload that's already known to match, or None if it's missing"""
+
         checking = candidate
-        while running_key.find(".") != -1:
-            nested_key, running_key = running_key.split(".", 1)
-            if nested_key not in checking:
+        for key in self.reading_path:
+            if not isinstance(checking, dict) or key not in checking:
                 return None
-            checking = checking[nested_key]
-        if running_key not in checking:
-            return None
+            checking = checking[key]
+        return checking
+
+
+def signature_payload(signature: tuple) -> dict:
+    """Build the smallest payload that has the given (board_id, msg_type, sensor_id, actuator) signature, for matching against the field definitions"""
+
+    board_id, msg_type, sensor_id, actuator = signature
+    payload = {"data": {}}
+    if board_id is not None:
+        payload["board_id"] = board_id
+    if msg_type is not None:
+        payload["msg_type"] = msg_type
+    if sensor_id is not None:
+        payload["data"]["sensor_id"] = sensor_id
+    if actuator is not None:
+        payload["data"]["actuator"] = actuator
+    return payload
 
-        return checking[running_key]
+
+class CanFieldIndex:
+    """An index from message signatures to the fields that match them, so a message can be resolved to its fields with one dictionary lookup instead of matching it against every field. Fields whose patterns look past the signature are still matched against each message."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        # signature -> [(field, whether the field still has to be matched against the message)]
+        self.candidates = {}
+
+    def candidates_for(self, signature: tuple) -> list:
+        candidates = self.candidates.get(signature)
+        if candidates is None:
+            payload = signature_payload(signature)
+            candidates = self.candidates[signature] = [
+                (field, not field.signature_only) for field in self.fields
+                if not field.signature_only or field.match(payload)]
+        return candidates
+
+    def fields_for(self, payload: dict) -> list:
+        """Return the fields that match the message payload, in the order they're defined in"""
+
+        return [field for field, check in self.candidates_for(can_signature(payload))
+                if not check or field.match(payload)]
 
 
 # Fields can be discovered by using the field_peeking.py script
@@ -161,6 +211,8 @@ for field in auto_fields:
         CAN_FIELDS.append(CanProcessingField(
             f"{field['base_name']}_{subfield.split('.')[-1]}", field["signature"], subfield))
 
+CAN_FIELD_INDEX = CanFieldIndex(CAN_FIELDS)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run tests for field_definitions.py")
     parser.add_argument("--test", action="store_true", help="Run tests")
@@ -224,12 +276,14 @@ if __name__ == "__main__":
     assert cmatch_cread.read(correct_candidate) == 100
     assert cmatch_iread.read(correct_candidate) == None
     assert cmatch_ixread.read(correct_candidate) == None
-    assert imatch_cread.read(correct_candidate) == None
-    assert imatch_iread.read(correct_candidate) == None
-    assert imatch_ixread.read(correct_candidate) == None
-    assert ixmatch_cread.read(correct_candidate) == None
-    assert ixmatch_iread.read(correct_candidate) == None
-    assert ixmatch_ixread.read(correct_candidate) == None
+    # reading from a field that doesn't match is an error
+    for field in [imatch_cread, imatch_iread, imatch_ixread, ixmatch_cread, ixmatch_iread, ixmatch_ixread]:
+        try:
+            field.read(correct_candidate)
+        except ValueError:
+            pass
+        else:
+            assert False, f"{field} read from a candidate it doesn't match"
     print("Incorrect input matching")
     assert not cmatch_cread.match(false_candidate)
     assert not imatch_cread.match(false_candidate)
@@ -239,4 +293,21 @@ if __name__ == "__main__":
     print("Missing data input matching")
     assert not cmatch_cread.match(missing_data_candidate)
 
+    print("Testing the field index")
+    index = CanFieldIndex([cmatch_cread, imatch_cread, ixmatch_cread, cmatch_iread])
+    assert index.fields_for(correct_candidate) == [cmatch_cread, cmatch_iread]
+    assert index.fields_for(false_candidate) == []
+    assert index.fields_for(missing_data_candidate) == []
+    mangoes_candidate = {"msg_type": "SENSOR_ANALOG", "mangoes": {"pears": "SENSOR_PRESSURE_OX"}}
+    assert index.fields_for(mangoes_candidate) == [ixmatch_cread]
+    print("Index matches the same fields as matching every field")
+    for candidate in [correct_candidate, missing_value_candidate, false_candidate, missing_data_candidate,
+                      {"board_id": "CHARGING", "msg_type": "SENSOR_ANALOG",
+                       "data": {"sensor_id": "SENSOR_BATT_CURR", "value": 5}},
+                      {"board_id": "ACTUATOR_INJ", "msg_type": "ACTUATOR_STATUS",
+                       "data": {"actuator": "ACTUATOR_INJECTOR_VALVE", "req_state": "ACTUATOR_ON"}},
+                      {"board_id": "GPS", "msg_type": "GPS_LATITUDE", "data": {"degs": 43}}]:
+        assert CAN_FIELD_INDEX.fields_for(candidate) == [
+            field for field in CAN_FIELDS if field.match(candidate)]
+
     print("All tests passed!")
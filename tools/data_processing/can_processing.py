@@ -1,9 +1,10 @@
 # Take in a log file object and yield lines of can data
-import msgpack
-from typing import List, Union, IO
+from typing import List, IO
 
-from can_field_definitions import CAN_FIELDS
+from can_field_definitions import CAN_FIELD_INDEX, signature_payload
 from msgpack_sorter_unpacker import msgpackFilterUnpacker
+from helpers import get_log_summary
+from column_data import ColumnData, ColumnBuilder
 
 
 def get_can_cols(infile: IO) -> List[str]:
@@ -11,53 +12,60 @@ def get_can_cols(infile: IO) -> List[str]:
 
     cols = []  # the colums in the order they're encountered
     cols_set = set()
-    # we don't need to use the filtered source, as we're just looking for the message types
-    for full_data in msgpack.Unpacker(infile):
-        channel, timestamp, payload = full_data  # extract the three parts of the message packed data
-        if channel.startswith("CAN/Parsley"):  # CAN messages come over parsely
-            # try and match the message to a field given the field's matching pattern definition
-            for field in CAN_FIELDS:
-                if field.match(payload) and field.csv_name not in cols_set:
-                    cols_set.add(field.csv_name)
-                    cols.append(field.csv_name)
-                continue
+    # the fields only match on the message signature, so we can match against the signatures in
+    # the log summary (in the order they were first seen) instead of reading every message
+    for signature in get_log_summary(infile).can_signatures:
+        payload = signature_payload(signature)
+        # try and match the message to a field given the field's matching pattern definition
+        for field in CAN_FIELD_INDEX.fields_for(payload):
+            if field.csv_name not in cols_set:
+                cols_set.add(field.csv_name)
+                cols.append(field.csv_name)
 
-    infile.seek(0)
     return cols
 
 
-def get_can_lines(infile: IO, cols=[], msg_packed_filtering="behind_stream") -> List[List[Union[int, str]]]:
-    """Get all the data from the CAN messages in the file, and return it as a list of lists, where each list is a line of the csv"""
+class CanExtractor:
+    """Builds the CAN data for the given columns one message at a time, so the log can be read in a single streaming pass shared with the DAQ extractor. If no columns are given, every column with a field definition is extracted in the order they're encountered."""
 
-    cols_set = set(cols)
-    # a dictionary to store the up to date values of the columns we're tracking, so we can output them when we get a new line
-    current_info = {col: None for col in cols}
-    output_csv_lines = []
-    # we use the filtered source to ensure the timestamps are in order for the output data (see msgpack_sorter_unpacker.py for more info on this method and it's FIXME)
-    for full_data in msgpackFilterUnpacker(infile, msg_packed_filtering):
-        channel, timestamp, payload = full_data
-        if channel.startswith("CAN/Parsley"):
-            # we check if the payload matches any of the fields we're tracking, and if it does, we update the current_info dictionary
-            matched = False
-            # WARNING: we need to loop through all the fields, becuase columns can have the same signatures and matching patterns, but we're taking differnt data out of them so we need to check multiple times
-            for field in CAN_FIELDS:
-                if field.match(payload) and field.csv_name in cols_set:
-                    current_info[field.csv_name] = field.read(payload)
+    def __init__(self, cols=None):
+        # the builder keeps the up to date values of the columns we're tracking, so we can output them when we get a new line
+        self.builder = ColumnBuilder(cols)
+
+    def feed(self, timestamp: float, payload: dict) -> None:
+        """Add the CAN message payload that was logged at timestamp"""
+
+        # we check if the payload matches any of the fields we're tracking, and if it does, we update the current line
+        matched = False
+        # WARNING: several fields can match, becuase columns can have the same signatures and matching patterns, but we're taking differnt data out of them so we need to read all of them
+        for field in CAN_FIELD_INDEX.fields_for(payload):
+            if self.builder.wants(field.csv_name):
+                # no need for an updated line if we didnt update any of the values we're tracking, we don't want to output a line with no new up to date info
+                if not matched:
+                    self.builder.add_row(timestamp)
                     matched = True
+                self.builder.set(field.csv_name, field.get_value(payload))
 
-            # no need for an updated line if we didnt update any of the values we're tracking, we don't want to output a line with no new up to date info
-            if not matched:
-                continue
+    def finish(self, cols=None) -> ColumnData:
+        """Return the data for the given columns, or all of the extracted columns"""
 
-            # if we've matched, we should output the current info and write a new line
-            out_line = [timestamp]
-            for col in cols:
-                out_line.append(current_info[col])
+        # only keep the lines where one of the columns was updated, like if just those columns had been extracted
+        return self.builder.finish(cols, keep_all_rows=False)
 
-            output_csv_lines.append(out_line)
 
+def get_can_lines(infile: IO, cols=[], msg_packed_filtering="behind_stream") -> ColumnData:
+    """Get all the data from the CAN messages in the file, and return it as columns of data, where each row is a line of the csv"""
+
+    extractor = CanExtractor(cols)
+    # we use the filtered source to ensure the timestamps are in order for the output data (see msgpack_sorter_unpacker.py for more info on this method and it's FIXME)
+    for channel, timestamp, payload in msgpackFilterUnpacker(infile, msg_packed_filtering):
+        if channel.startswith("CAN/Parsley"):
+            extractor.feed(timestamp, payload)
+
+    if msg_packed_filtering == "board_time":
+        extractor.builder.sort_rows()  # board times from a delayed source come out of order
     infile.seek(0)
-    return output_csv_lines
+    return extractor.finish()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+# Columnar storage for extracted data, with one NumPy array per column instead of a list per line
+from typing import List, Optional, Any
+
+import numpy as np
+
+
+def column_array(values: List[Any]) -> np.ndarray:
+    """Turn a list of values into a column array. Numeric columns become float64 with NaN for missing values, anything else (like CAN actuator states) is kept as an object array with None for missing values."""
+
+    try:
+        array = np.array(values)
+    except ValueError:  # values that are lists of different lengths
+        array = None
+    if array is not None and array.ndim == 1 and array.dtype.kind in "iuf":
+        return array.astype(np.float64)  # all numbers, the common case, so skip checking each value
+    if all(value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)) for value in values):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    # filled in one value at a time so values that are lists stay whole
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
+
+
+def take_rows(column: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Pick rows out of a column, where a row of -1 gives a missing value"""
+
+    if column.dtype == object:
+        padded = np.empty(len(column) + 1, dtype=object)
+    else:
+        padded = np.full(len(column) + 1, np.nan)
+    padded[:-1] = column
+    return padded[rows]  # -1 picks the missing value at the end
+
+
+def concatenate_columns(columns: List[np.ndarray]) -> np.ndarray:
+    """Join parts of a column, keeping None as the missing value if any part isn't numeric"""
+
+    if any(column.dtype == object for column in columns):
+        parts = []
+        for column in columns:
+            if column.dtype != object:
+                missing = np.isnan(column)
+                column = column.astype(object)
+                column[missing] = None
+            parts.append(column)
+        columns = parts
+    return np.concatenate(columns) if columns else np.empty(0)
+
+
+class ColumnData:
+    """The data of an export: a time column and one array per named column, all the same length. Each row holds the most up to date value of every column at that time, with missing values (NaN or None) before a column's first reading."""
+
+    def __init__(self, time: np.ndarray, cols: List[str], columns: List[np.ndarray]):
+        self.time = time
+        self.cols = cols
+        self.columns = columns
+
+    @classmethod
+    def empty(cls, cols: Optional[List[str]] = None) -> "ColumnData":
+        cols = cols or []
+        return cls(np.empty(0), list(cols), [np.empty(0) for _ in cols])
+
+    @classmethod
+    def concatenate(cls, blocks: List["ColumnData"], cols: List[str]) -> "ColumnData":
+        """Join blocks of data with the given columns into one, one after the other"""
+
+        if not blocks:
+            return cls.empty(cols)
+        return cls(np.concatenate([block.time for block in blocks]), list(cols),
+                   [np.concatenate([block.columns[i] for block in blocks]) for i in range(len(cols))])
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __getitem__(self, col: str) -> np.ndarray:
+        return self.columns[self.cols.index(col)]
+
+    def select(self, rows) -> "ColumnData":
+        """Return the rows picked by a boolean mask, slice or index array"""
+
+        return ColumnData(self.time[rows], self.cols, [column[rows] for column in self.columns])
+
+    def decreasing_times(self) -> np.ndarray:
+        """Return the indexes of the rows whose timestamp is greater than the one after"""
+
+        return np.flatnonzero(np.diff(self.time) < 0)
+
+    def update_hash(self, hasher) -> None:
+        """Feed the contents of the data to a hashlib hash object"""
+
+        hasher.update(self.time.tobytes())
+        for col, column in zip(self.cols, self.columns):
+            hasher.update(col.encode())
+            if column.dtype == object:
+                hasher.update(repr(column.tolist()).encode())
+            else:
+                hasher.update(column.tobytes())
+
+
+class ColumnBuilder:
+    """Builds ColumnData one row at a time. Rather than copying every column into every row, only the updates to each column are recorded, and the columns are forward filled with NumPy when the data is finished. If no columns are given, columns are added in the order they're first updated."""
+
+    def __init__(self, cols: Optional[List[str]] = None):
+        self.discover = cols is None
+        self.cols = [] if cols is None else list(cols)
+        self.col_indexes = {col: i for i, col in enumerate(self.cols)}
+        self.times = []
+        # for every column, the row numbers it was updated at and the values it was updated to
+        self.update_rows = [[] for _ in self.cols]
+        self.update_values = [[] for _ in self.cols]
+
+    def wants(self, col: str) -> bool:
+        return self.discover or col in self.col_indexes
+
+    def add_row(self, timestamp: float) -> None:
+        """Start a new row, which holds the latest value of every column unless updated"""
+
+        self.times.append(timestamp)
+
+    def set(self, col: str, value: Any) -> None:
+        """Update a column in the current row"""
+
+        i = self.col_indexes.get(col)
+        if i is None:
+            if not self.discover:
+                return
+            i = self.col_indexes[col] = len(self.cols)
+            self.cols.append(col)
+            self.update_rows.append([])
+            self.update_values.append([])
+        self.update_rows[i].append(len(self.times) - 1)
+        self.update_values[i].append(value)
+
+    def finish(self, cols: Optional[List[str]] = None, keep_all_rows=True) -> ColumnData:
+        """Build the data for the given columns (or all of them). Unless keep_all_rows is set, rows where none of the given columns were updated are left out."""
+
+        cols = self.cols if cols is None else cols
+        times = np.array(self.times, dtype=np.float64)
+        updates = []
+        for col in cols:
+            i = self.col_indexes.get(col)
+            if i is None:  # a column that never had a reading
+                updates.append((np.empty(0, dtype=np.int64), np.empty(0)))
+            else:
+                updates.append((np.asarray(self.update_rows[i], dtype=np.int64), column_array(self.update_values[i])))
+
+        if not keep_all_rows:
+            kept = np.unique(np.concatenate([rows for rows, _ in updates] + [np.empty(0, dtype=np.int64)]))
+            times = times[kept]
+            updates = [(np.searchsorted(kept, rows), values) for rows, values in updates]
+
+        columns = []
+        for rows, values in updates:
+            # for every row, the index of the latest update at or before it, or -1 (the missing value) if there's none yet
+            latest = np.full(len(times), -1, dtype=np.int64)
+            latest[rows] = np.arange(len(rows))
+            np.maximum.accumulate(latest, out=latest)
+            columns.append(take_rows(values, latest))
+        return ColumnData(times, list(cols), columns)
+
+    def select_rows(self, keep: np.ndarray) -> None:
+        """Drop the rows (and their updates) that aren't picked by the boolean mask keep"""
+
+        new_rows = np.cumsum(keep) - 1
+        self.times = np.asarray(self.times, dtype=np.float64)[keep]
+        for i, (rows, values) in enumerate(zip(self.update_rows, self.update_values)):
+            rows = np.asarray(rows, dtype=np.int64)
+            kept = keep[rows]
+            self.update_rows[i] = new_rows[rows[kept]]
+            self.update_values[i] = column_array(values)[kept]
+
+    def sort_rows(self) -> None:
+        """Put the rows in order of time, keeping the order of rows with the same time, for rows that were added out of order"""
+
+        times = np.asarray(self.times, dtype=np.float64)
+        if not np.any(np.diff(times) < 0):
+            return
+        order = np.argsort(times, kind="stable")
+        new_rows = np.empty(len(order), dtype=np.int64)
+        new_rows[order] = np.arange(len(order))
+        self.times = times[order]
+        for i, (rows, values) in enumerate(zip(self.update_rows, self.update_values)):
+            rows = new_rows[np.asarray(rows, dtype=np.int64)]
+            # the updates of each column have to stay in row order for the forward filling in finish
+            update_order = np.argsort(rows, kind="stable")
+            self.update_rows[i] = rows[update_order]
+            self.update_values[i] = column_array(values)[update_order]
+
+    @classmethod
+    def concatenate(cls, builders: List["ColumnBuilder"]) -> "ColumnBuilder":
+        """Join the rows of several builders one after the other, with columns in the order they first appear"""
+
+        joined = cls()
+        times = []
+        rows_offset = 0
+        for builder in builders:
+            times.append(np.asarray(builder.times, dtype=np.float64))
+            for col, rows, values in zip(builder.cols, builder.update_rows, builder.update_values):
+                if len(rows) == 0:
+                    continue  # like a column that was never updated, which wouldn't have been added yet
+                i = joined.col_indexes.get(col)
+                if i is None:
+                    i = joined.col_indexes[col] = len(joined.cols)
+                    joined.cols.append(col)
+                    joined.update_rows.append([])
+                    joined.update_values.append([])
+                joined.update_rows[i].append(np.asarray(rows, dtype=np.int64) + rows_offset)
+                joined.update_values[i].append(column_array(values))
+            rows_offset += len(builder.times)
+
+        joined.times = np.concatenate(times) if times else np.empty(0)
+        joined.update_rows = [np.concatenate(rows) for rows in joined.update_rows]
+        joined.update_values = [concatenate_columns(values) for values in joined.update_values]
+        return joined
+
+    def to_dict(self) -> dict:
+        """Pack the builder into msgpack friendly types, with numeric data as raw bytes"""
+
+        values = [column_array(col_values) for col_values in self.update_values]
+        return {
+            "cols": self.cols,
+            "times": np.asarray(self.times, dtype=np.float64).tobytes(),
+            "rows": [np.asarray(rows, dtype=np.int64).tobytes() for rows in self.update_rows],
+            "values": [col_values.tolist() if col_values.dtype == object else col_values.tobytes() for col_values in values],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ColumnBuilder":
+        builder = cls(data["cols"])
+        builder.discover = True
+        builder.times = np.frombuffer(data["times"], dtype=np.float64)
+        builder.update_rows = [np.frombuffer(rows, dtype=np.int64) for rows in data["rows"]]
+        builder.update_values = [np.frombuffer(col_values, dtype=np.float64) if isinstance(col_values, bytes) else col_values
+                                 for col_values in data["values"]]
+        return builder
@@ -0,0 +1,114 @@
+import numpy as np
+
+from column_data import ColumnBuilder, ColumnData, column_array
+
+
+def build(rows, cols=None) -> ColumnBuilder:
+    """Build rows of (timestamp, {col: value}) updates"""
+
+    builder = ColumnBuilder(cols)
+    for timestamp, updates in rows:
+        builder.add_row(timestamp)
+        for col, value in updates.items():
+            builder.set(col, value)
+    return builder
+
+
+ROWS = [
+    (0.0, {"a": 1}),
+    (1.0, {"b": "open"}),
+    (2.0, {"a": 3}),
+    (3.0, {}),
+]
+
+
+class TestColumnArray:
+    def test_numeric(self):
+        column = column_array([1, None, 2.5])
+        assert column.dtype == np.float64
+        np.testing.assert_array_equal(column, [1, np.nan, 2.5])
+
+    def test_not_numeric(self):
+        column = column_array(["open", None, [1, 2]])
+        assert column.dtype == object
+        assert column.tolist() == ["open", None, [1, 2]]
+
+
+class TestColumnBuilder:
+    def test_finish_forward_fills(self):
+        data = build(ROWS).finish()
+
+        assert data.cols == ["a", "b"]
+        np.testing.assert_array_equal(data.time, [0, 1, 2, 3])
+        np.testing.assert_array_equal(data["a"], [1, 1, 3, 3])
+        assert data["b"].tolist() == [None, "open", "open", "open"]
+
+    def test_finish_columns(self):
+        data = build(ROWS).finish(["b", "missing"], keep_all_rows=False)
+
+        assert data.cols == ["b", "missing"]
+        np.testing.assert_array_equal(data.time, [1])
+        assert data["b"].tolist() == ["open"]
+        assert np.isnan(data["missing"]).all()
+
+    def test_fixed_columns(self):
+        data = build(ROWS, cols=["a"]).finish()
+
+        assert data.cols == ["a"]
+        np.testing.assert_array_equal(data["a"], [1, 1, 3, 3])
+
+    def test_select_rows(self):
+        builder = build(ROWS)
+        builder.select_rows(np.array([False, True, True, True]))
+        data = builder.finish()
+
+        np.testing.assert_array_equal(data.time, [1, 2, 3])
+        # the update of a in the dropped first row is gone with it
+        np.testing.assert_array_equal(data["a"], [np.nan, 3, 3])
+        assert data["b"].tolist() == ["open", "open", "open"]
+
+    def test_sort_rows(self):
+        builder = build([(2.0, {"a": 1}), (0.0, {"a": 2}), (1.0, {"b": 5}), (1.0, {"a": 4})])
+        builder.sort_rows()
+        data = builder.finish()
+
+        np.testing.assert_array_equal(data.time, [0, 1, 1, 2])
+        np.testing.assert_array_equal(data["a"], [2, 2, 4, 1])
+        np.testing.assert_array_equal(data["b"], [np.nan, 5, 5, 5])
+
+    def test_concatenate(self):
+        first = build([(0.0, {"a": 1}), (1.0, {"b": "open"})])
+        second = build([(2.0, {"c": 7}), (3.0, {"a": 2, "b": "closed"})])
+        data = ColumnBuilder.concatenate([first, second]).finish()
+
+        assert data.cols == ["a", "b", "c"]
+        np.testing.assert_array_equal(data.time, [0, 1, 2, 3])
+        np.testing.assert_array_equal(data["a"], [1, 1, 1, 2])
+        assert data["b"].tolist() == [None, "open", "open", "closed"]
+        np.testing.assert_array_equal(data["c"], [np.nan, np.nan, 7, 7])
+
+    def test_concatenate_matches_single_builder(self):
+        rows = [(i * 0.1, {f"col{i % 3}": i}) for i in range(30)]
+        joined = ColumnBuilder.concatenate([build(rows[:10]), build(rows[10:25]), build(rows[25:])]).finish()
+        whole = build(rows).finish()
+
+        assert joined.cols == whole.cols
+        np.testing.assert_array_equal(joined.time, whole.time)
+        for col in whole.cols:
+            np.testing.assert_array_equal(joined[col], whole[col])
+
+
+class TestColumnData:
+    def test_select_and_concatenate(self):
+        data = build(ROWS).finish()
+        blocks = [data.select(slice(0, 1)), data.select(slice(1, None))]
+        joined = ColumnData.concatenate(blocks, data.cols)
+
+        np.testing.assert_array_equal(joined.time, data.time)
+        np.testing.assert_array_equal(joined["a"], data["a"])
+        assert joined["b"].tolist() == data["b"].tolist()
+        assert len(ColumnData.concatenate([], ["a"])) == 0
+
+    def test_decreasing_times(self):
+        data = ColumnData(np.array([0.0, 2.0, 1.0, 3.0, 2.5]), [], [])
+        np.testing.assert_array_equal(data.decreasing_times(), [1, 3])
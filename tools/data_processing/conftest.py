@@ -0,0 +1,76 @@
+# The data processing tool is run as a script from its own directory, so its modules import each other by name
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import msgpack  # noqa: E402
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+import omnibus.util.log_summary  # noqa: E402
+
+
+def log_messages(start: int, count: int) -> list:
+    """Messages for a test log: a DAQ message every 0.1 s, each followed by a CAN sensor reading, and from the fifth on an actuator status logged 0.45 s late, like the second, delayed stream of CAN messages"""
+
+    messages = []
+    for i in range(start, start + count):
+        t = i / 10
+        messages.append(["DAQ", t, {"timestamp": t, "data": {"a": [i, i + 1], "b": [i * 0.5]}}])
+        messages.append(["CAN/Parsley/0", t + 0.01, {"board_id": "RLCS", "msg_type": "SENSOR_ANALOG",
+                                                     "data": {"sensor_id": "SENSOR_PRESSURE_OX", "value": i}}])
+        if i >= 5:
+            messages.append(["CAN/Parsley/1", t - 0.45, {"board_id": "RLCS", "msg_type": "ACTUATOR_STATUS",
+                                                         "data": {"actuator": "ACTUATOR_VENT_VALVE",
+                                                                  "req_state": f"S{i - 5}", "cur_state": "UNK"}}])
+    return messages
+
+
+def write_log(path, messages, mode="wb") -> None:
+    """Write the messages to a log file, or append them with mode ab"""
+
+    with open(path, mode) as outfile:
+        for message in messages:
+            outfile.write(msgpack.packb(message))
+
+
+def make_log(messages) -> io.BytesIO:
+    """An in-memory log of the messages"""
+
+    log = io.BytesIO()
+    for message in messages:
+        log.write(msgpack.packb(message))
+    log.seek(0)
+    return log
+
+
+def assert_same_data(first, second) -> None:
+    """Check that two ColumnData have the same columns, times and values"""
+
+    assert first.cols == second.cols
+    np.testing.assert_array_equal(first.time, second.time)
+    for col in first.cols:
+        np.testing.assert_array_equal(first[col], second[col])
+
+
+@pytest.fixture
+def log_path(tmp_path) -> str:
+    """A log of 300 rounds of log_messages"""
+
+    path = str(tmp_path / "test.log")
+    write_log(path, log_messages(0, 300))
+    return path
+
+
+@pytest.fixture
+def small_chunks(monkeypatch) -> None:
+    """Split logs into small chunks and index blocks, so the small test logs are still split up"""
+
+    import dump_whole_log
+    import parallel_extraction
+
+    monkeypatch.setattr(parallel_extraction, "MIN_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(dump_whole_log, "DUMP_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(omnibus.util.log_summary, "INDEX_BLOCK_SIZE", 512)
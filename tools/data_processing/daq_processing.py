@@ -1,8 +1,13 @@
 # Take in a log file path and yeild lines of daq data, with the option to be uncompressed or not
-from typing import List, Union, IO
+from typing import List, Optional, Union, IO, Iterator
 import msgpack
+import numpy as np
 
-from msgpack_sorter_unpacker import msgpackFilterUnpacker
+from helpers import get_log_summary
+from column_data import ColumnData, ColumnBuilder, column_array
+
+INFER_RATE_MESSAGES = 100  # number of DAQ messages to look at when inferring the sample rate
+SAMPLE_BLOCK_ROWS = 100_000  # about how many samples are yielded at once by get_daq_samples
 
 
 def average_list(data: List[Union[int, float]]) -> Union[int, float]:
@@ -27,47 +32,153 @@ aggregation_functions = {
 def get_daq_cols(infile: IO) -> List[str]:
     """Get the columns that are present in the DAQ data in the file and returns them in the order they're encountered"""
 
-    cols_set = set()
-    cols = []
-    for full_data in msgpack.Unpacker(infile):
-        channel, timestamp, payload = full_data
+    # the log summary already knows every DAQ field, so we don't need to read the log
+    return list(get_log_summary(infile).daq_fields)
+
+
+class DaqExtractor:
+    """Builds the DAQ data for the given columns one message at a time, so the log can be read in a single streaming pass shared with the CAN extractor. If no columns are given, every column is extracted in the order they're encountered."""
+
+    def __init__(self, cols=None, aggregate_function_name="average"):
+        self.builder = ColumnBuilder(cols)
+        self.aggregate_function = aggregation_functions[aggregate_function_name]
+
+    def feed(self, timestamp: float, payload: dict) -> None:
+        """Add the DAQ message payload that was logged at timestamp"""
+
+        self.builder.add_row(timestamp)
+        data = payload["data"]
+        for key in data:
+            if self.builder.wants(key):
+                self.builder.set(key, self.aggregate_function(data[key]))
+
+    def finish(self, cols=None) -> ColumnData:
+        """Return the data for the given columns, or all of the extracted columns"""
+
+        # every DAQ message makes a line, even if it has none of the columns
+        return self.builder.finish(cols)
+
+
+def message_size(data: dict) -> int:
+    """The number of samples in a DAQ message, which is the most samples any of its columns has"""
+
+    return max(len(col_values) for col_values in data.values())
+
+
+def first_daq_timestamp(infile: IO) -> Optional[float]:
+    """Get the timestamp of the first DAQ message in the file, which is the time the aggregated DAQ data starts at, or None if there are no DAQ messages"""
+
+    timestamp = None
+    for channel, message_timestamp, _ in msgpack.Unpacker(infile):
         if channel.startswith("DAQ"):
-            data = payload["data"]
-            for key in data:
-                if key not in cols_set:
-                    cols_set.add(key)
-                    cols.append(key)
+            timestamp = message_timestamp
+            break
+    infile.seek(0)
+    return timestamp
+
+
+def infer_sample_rate(infile: IO, messages=INFER_RATE_MESSAGES) -> float:
+    """Estimate the DAQ sample rate in samples per second from the number of samples in the first few DAQ messages of the file and the time between them"""
+
+    first_timestamp = None
+    samples = 0
+    seen = 0
+    for channel, timestamp, payload in msgpack.Unpacker(infile):
+        if not channel.startswith("DAQ") or not payload["data"]:
+            continue
+        if first_timestamp is None:
+            # the first message's samples were read before its timestamp, so they don't count towards the time span
+            first_timestamp = timestamp
+        else:
+            samples += message_size(payload["data"])
+            last_timestamp = timestamp
+        seen += 1
+        if seen >= messages:
+            break
 
     infile.seek(0)
-    return cols
+    if samples == 0 or last_timestamp <= first_timestamp:
+        raise ValueError("Not enough DAQ data to infer the sample rate, pass it explicitly instead")
+    return samples / (last_timestamp - first_timestamp)
+
+
+def get_daq_samples(infile: IO, cols: List[str], sample_rate: float, start_time=None, stop_time=None) -> Iterator[ColumnData]:
+    """Yield every DAQ sample of the given columns in the file (rather than one aggregated line per message) as blocks of about SAMPLE_BLOCK_ROWS rows, so the samples never all have to be in memory at once. Only samples timestamped between start_time and stop_time are included.
+
+    The NI source timestamps each message when its bulk read finishes, so each sample's timestamp is reconstructed by counting back from the message timestamp at the sample rate."""
+
+    # seek past the part of the log that's all before start_time, every sample is from before its message's timestamp
+    offset = 0
+    if start_time is not None:
+        offset = get_log_summary(infile).seek_offset(start_time)
+    infile.seek(offset)
+
+    message_times = []
+    message_sizes = []
+    values = [[] for _ in cols]
+    pending = 0
+    for channel, timestamp, payload in msgpack.Unpacker(infile):
+        if not channel.startswith("DAQ"):
+            continue
+        data = payload["data"]
+        if not data:
+            continue
+        size = message_size(data)
+        # skip messages with every sample out of the time range
+        if start_time is not None and timestamp < start_time:
+            continue
+        if stop_time is not None and timestamp - (size - 1) / sample_rate > stop_time:
+            continue
+
+        message_times.append(timestamp)
+        message_sizes.append(size)
+        for col, col_values in zip(cols, values):
+            col_data = data.get(col, ())
+            # a column with fewer samples than the message is lined up with its end, where the last sample of every column was read
+            col_values.extend([None] * (size - len(col_data)))
+            col_values.extend(col_data)
+        pending += size
+        if pending >= SAMPLE_BLOCK_ROWS:
+            yield sample_block(message_times, message_sizes, cols, values, sample_rate, start_time, stop_time)
+            message_times, message_sizes, values, pending = [], [], [[] for _ in cols], 0
+
+    if pending:
+        yield sample_block(message_times, message_sizes, cols, values, sample_rate, start_time, stop_time)
+    infile.seek(0)
+
+
+def sample_block(message_times: List[float], message_sizes: List[int], cols: List[str], values: List[list], sample_rate: float, start_time=None, stop_time=None) -> ColumnData:
+    """Build a block of samples from the messages they came from, giving each sample a timestamp counted back from its message's timestamp"""
+
+    sizes = np.array(message_sizes, dtype=np.int64)
+    ends = np.cumsum(sizes)
+    # how many samples each sample is before the last sample of its message
+    samples_before_end = np.repeat(ends, sizes) - 1 - np.arange(ends[-1])
+    time = np.repeat(np.array(message_times, dtype=np.float64), sizes) - samples_before_end / sample_rate
+
+    block = ColumnData(time, list(cols), [column_array(col_values) for col_values in values])
+    if start_time is not None or stop_time is not None:
+        start_time = -np.inf if start_time is None else start_time
+        stop_time = np.inf if stop_time is None else stop_time
+        block = block.select((time >= start_time) & (time <= stop_time))
+    return block
+
 
+def get_daq_lines(infile: IO, cols=[], compressed=True, aggregate_function_name="average", sample_rate=None) -> ColumnData:
+    """Get all the data from the DAQ messages in the file, and return it as columns of data, where each row is a line of the csv. Uncompressed data has a row for every sample, at the given sample rate (or the inferred one if not given)."""
 
-def get_daq_lines(infile: IO, cols=[], compressed=True, aggregate_function_name="average") -> List[List[Union[int, str]]]:
-    """Get all the data from the DAQ messages in the file, and return it as a list of lists, where each list is a line of the csv"""
+    if not compressed:
+        if sample_rate is None:
+            sample_rate = infer_sample_rate(infile)
+        return ColumnData.concatenate(list(get_daq_samples(infile, cols, sample_rate)), cols)
 
-    lines = []
-    cols_set = set(cols)
-    current_info = {col: None for col in cols}
-    aggregate_function = aggregation_functions[aggregate_function_name]
-    for full_data in msgpack.Unpacker(infile):
-        channel, timestamp, payload = full_data
+    extractor = DaqExtractor(cols, aggregate_function_name)
+    for channel, timestamp, payload in msgpack.Unpacker(infile):
         if channel.startswith("DAQ"):
-            data = payload["data"]
-            for key in data:
-                if key in cols_set:
-                    if compressed:
-                        current_info[key] = aggregate_function(data[key])
-                    else:
-                        current_info[key] = data[key]
-
-            # Depending on the compression, we either need to append just one line, or agregated entries
-            if compressed:
-                lines.append([timestamp] + [current_info[col] for col in cols])
-            else:
-                raise NotImplementedError("Uncompressed DAQ data is not yet supported")
+            extractor.feed(timestamp, payload)
 
     infile.seek(0)
-    return lines
+    return extractor.finish()
 
 
 if __name__ == "__main__":
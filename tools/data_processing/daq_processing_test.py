@@ -0,0 +1,42 @@
+import numpy as np
+
+from conftest import make_log
+from daq_processing import first_daq_timestamp, get_daq_samples, infer_sample_rate
+
+
+class TestDaqSamples:
+    def test_samples(self):
+        log = make_log([["DAQ", 1.0, {"timestamp": 1.0, "data": {"a": [1, 2], "b": [3, 4]}}],
+                        ["RLCS", 1.5, {"state": 1}],
+                        ["DAQ", 2.0, {"timestamp": 2.0, "data": {"a": [5, 6], "b": [7, 8]}}]])
+        data = next(get_daq_samples(log, ["a", "b"], 10))
+
+        np.testing.assert_allclose(data.time, [0.9, 1.0, 1.9, 2.0])
+        np.testing.assert_array_equal(data["a"], [1, 2, 5, 6])
+        np.testing.assert_array_equal(data["b"], [3, 4, 7, 8])
+
+    def test_columns_with_fewer_samples(self):
+        # b has fewer samples than a in the first message, and none in the second
+        log = make_log([["DAQ", 1.0, {"timestamp": 1.0, "data": {"a": [1, 2, 3], "b": [4]}}],
+                        ["DAQ", 2.0, {"timestamp": 2.0, "data": {"a": [5, 6]}}]])
+        data = next(get_daq_samples(log, ["a", "b"], 10))
+
+        np.testing.assert_allclose(data.time, [0.8, 0.9, 1.0, 1.9, 2.0])
+        np.testing.assert_array_equal(data["a"], [1, 2, 3, 5, 6])
+        np.testing.assert_array_equal(data["b"], [np.nan, np.nan, 4, np.nan, np.nan])
+
+    def test_time_range(self):
+        log = make_log([["DAQ", float(t), {"timestamp": float(t), "data": {"a": [t * 10, t * 10 + 1]}}]
+                        for t in range(1, 5)])
+        data = next(get_daq_samples(log, ["a"], 2, start_time=2, stop_time=3.5))
+
+        np.testing.assert_allclose(data.time, [2, 2.5, 3, 3.5])
+        np.testing.assert_array_equal(data["a"], [21, 30, 31, 40])
+
+    def test_first_timestamp_and_rate(self):
+        log = make_log([["CAN/Parsley/0", 0.5, {}]] +
+                       [["DAQ", 1.0 + t, {"timestamp": 1.0 + t, "data": {"a": [0] * 100}}] for t in range(5)])
+
+        assert first_daq_timestamp(log) == 1.0
+        assert infer_sample_rate(log) == 100
+        assert first_daq_timestamp(make_log([["RLCS", 1.0, {}]])) is None
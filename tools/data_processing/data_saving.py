@@ -1,24 +1,267 @@
 import csv
 import os
 import datetime
+import json
 
-from typing import List, Any
+from typing import Dict, List, Iterable, Union
 
+import numpy as np
 
-def save_data_to_csv(file_path: str, data: List[Any], cols: List[str]):
-    """Save the export data in our given format to a csv file, and return the size of the file"""
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    # parquet exports are only offered when pyarrow is installed
+    pyarrow = None
+
+from column_data import ColumnData
+
+
+# the file formats data can be exported to, which are also the extensions of the exported files
+EXPORT_FORMATS = ["csv", "npz", "raw"] + (["parquet"] if pyarrow is not None else [])
+RAW_FORMAT_VERSION = 1
+WHOLE_NUMBER_LIMIT = 2 ** 53  # floats at or above this aren't all whole numbers we can tell apart, and 2 ** 63 would overflow int64
+CSV_CHUNK_ROWS = 100_000  # rows formatted at once when writing a csv, to bound the memory used by the text
+CATEGORIES_SUFFIX = ":categories"  # added to a column's name for the array of its categories in a .npz export
+
+
+def check_column_names(cols: List[str], export_format: str) -> None:
+    """Reject columns whose names are taken by the other arrays of a binary export: time holds the timestamps, and in a .npz the categories of a column are stored under its name plus CATEGORIES_SUFFIX. A csv has no such names, just a header row."""
+
+    if export_format == "csv":
+        return
+    for col in cols:
+        if col == "time" or (export_format == "npz" and col.endswith(CATEGORIES_SUFFIX)):
+            raise ValueError(f"Can't export a column named {col} to {export_format}, the name is reserved. Export it to csv instead")
+
+
+def whole_number_cells(column: np.ndarray) -> np.ndarray:
+    """Find the cells of a numeric column holding whole numbers. Only numbers small enough to be exact as floats count, so they can be written through int64 without overflowing."""
+
+    return (column == np.trunc(column)) & (np.abs(column) < WHOLE_NUMBER_LIMIT)
+
+
+def is_whole_numbers(column: np.ndarray) -> bool:
+    """Check if a numeric column only holds whole numbers (like raw sensor readings), which are written without a trailing .0"""
+
+    return column.dtype != object and bool(np.all(np.isnan(column) | whole_number_cells(column)))
+
+
+def format_column(column: np.ndarray, whole_numbers: bool) -> List[str]:
+    """Format a column of data as csv cells, with empty cells for missing values. In a column of whole numbers, any cell that turns out not to be one (in a later block of a streamed export) keeps its decimals rather than being cut off."""
+
+    if column.dtype == object:
+        return ["" if value is None else value for value in column.tolist()]
+    text = column.astype(str)
+    if whole_numbers:
+        whole = whole_number_cells(column)
+        text = text.astype(object)  # the whole numbers' text can be longer than the floats'
+        text[whole] = column[whole].astype(np.int64).astype(str)
+    text[np.isnan(column)] = ""
+    return text.tolist()
+
+
+def save_data_to_csv(file_path: str, data: Union[ColumnData, Iterable[ColumnData]], cols: List[str]):
+    """Save the export data in our given format to a csv file, and return the size of the file. The data can also be given as an iterable of blocks, which are written as they come so they never all need to be in memory."""
+
+    if isinstance(data, ColumnData):
+        # split up the data so the text is built a chunk of rows at a time with NumPy rather than one value at a time
+        whole_numbers = [is_whole_numbers(column) for column in data.columns]
+        blocks = (data.select(slice(start, start + CSV_CHUNK_ROWS))
+                  for start in range(0, len(data), CSV_CHUNK_ROWS))
+    else:
+        whole_numbers = None  # decided by the first block, since we can't see the whole column
+        blocks = data
 
     formatted_can_size = "N/A"
     with open(file_path, "w") as outfile:
         writer = csv.writer(outfile)
         writer.writerow(["time"] + cols)
-        for line in data:
-            writer.writerow(line)
+        for block in blocks:
+            if whole_numbers is None:
+                whole_numbers = [is_whole_numbers(column) for column in block.columns]
+            writer.writerows(zip(block.time.astype(str).tolist(),
+                                 *[format_column(column, whole) for column, whole in zip(block.columns, whole_numbers)]))
         export_size = os.path.getsize(file_path)
         formatted_can_size = "{:.2f} MB".format(export_size / (1024 * 1024))
     return formatted_can_size
 
 
+def formatted_file_size(*file_paths: str) -> str:
+    """The total size of the files, formatted for the manifest"""
+
+    return "{:.2f} MB".format(sum(os.path.getsize(file_path) for file_path in file_paths) / (1024 * 1024))
+
+
+def export_blocks(data: Union[ColumnData, Iterable[ColumnData]]) -> Iterable[ColumnData]:
+    """Treat a single ColumnData like a stream with one block, for the formats that write the data as it comes"""
+
+    return [data] if isinstance(data, ColumnData) else data
+
+
+def encode_object_column(column: np.ndarray, categories: Dict[str, int]) -> np.ndarray:
+    """Turn a column that isn't numeric (like actuator states) into int32 codes for the binary formats, with -1 for missing values. Each distinct value is added to categories under its JSON text, numbered in the order they're first seen."""
+
+    codes = np.empty(len(column), dtype=np.int32)
+    for i, value in enumerate(column.tolist()):
+        if value is None:
+            codes[i] = -1
+        else:
+            codes[i] = categories.setdefault(json.dumps(value), len(categories))
+    return codes
+
+
+def decode_object_column(codes: np.ndarray, categories: List[str]) -> np.ndarray:
+    """Turn the int32 codes of a binary export back into the original values, undoing encode_object_column"""
+
+    values = np.empty(len(categories) + 1, dtype=object)  # filled in one value at a time so values that are lists stay whole
+    for i, category in enumerate(categories):
+        values[i] = json.loads(category)
+    return values[codes]  # -1 picks the None at the end
+
+
+def save_data_to_npz(file_path: str, data: Union[ColumnData, Iterable[ColumnData]], cols: List[str]):
+    """Save the export data to an uncompressed .npz archive with one array per column plus time, and return the size of the file. Columns that aren't numeric are stored as int32 codes, with their values' JSON text in a "<col>:categories" array (so time and names ending in :categories are reserved, see check_column_names) (see load_export). Streamed data is collected first, since a .npz is written all at once."""
+
+    check_column_names(cols, "npz")
+    if not isinstance(data, ColumnData):
+        data = ColumnData.concatenate(list(data), cols)
+    arrays = {"time": data.time}
+    for col, column in zip(cols, data.columns):
+        if column.dtype == object:
+            categories = {}
+            arrays[col] = encode_object_column(column, categories)
+            arrays[f"{col}{CATEGORIES_SUFFIX}"] = np.array(list(categories), dtype=str)
+        else:
+            arrays[col] = column
+    np.savez(file_path, **arrays)
+    return formatted_file_size(file_path)
+
+
+def save_data_to_raw(file_path: str, data: Union[ColumnData, Iterable[ColumnData]], cols: List[str]):
+    """Save the export data as raw little endian records, one per row with the time and every column, and return the size of the files. The record layout, row count and the categories of columns that aren't numeric (stored like in save_data_to_npz) are written to a JSON header next to it (<file>.json), so the file can be memory mapped with np.memmap without reading it (see load_export). Blocks are written as they come."""
+
+    check_column_names(cols, "raw")
+    dtype = None
+    categories = {col: {} for col in cols}
+    rows = 0
+    with open(file_path, "wb") as outfile:
+        for block in export_blocks(data):
+            if dtype is None:
+                # the layout is fixed by the first block, every block of an export has the same column types
+                dtype = np.dtype([("time", "<f8")] + [(col, "<i4" if column.dtype == object else "<f8")
+                                                      for col, column in zip(cols, block.columns)])
+            records = np.empty(len(block), dtype=dtype)
+            records["time"] = block.time
+            for col, column in zip(cols, block.columns):
+                if dtype[col] == np.int32:
+                    records[col] = encode_object_column(column, categories[col])
+                elif column.dtype == object:
+                    raise ValueError(f"Column {col} changed from numeric to non numeric partway through the export")
+                else:
+                    records[col] = column
+            outfile.write(records.tobytes())
+            rows += len(block)
+
+    if dtype is None:
+        dtype = np.dtype([("time", "<f8")] + [(col, "<f8") for col in cols])
+    header = {
+        "format": "raw",
+        "version": RAW_FORMAT_VERSION,
+        "rows": rows,
+        "fields": [[name, dtype[name].str] for name in dtype.names],
+        "categories": {col: list(col_categories) for col, col_categories in categories.items() if dtype[col] == np.int32},
+    }
+    with open(f"{file_path}.json", "w") as header_file:
+        json.dump(header, header_file, indent=2)
+    return formatted_file_size(file_path, f"{file_path}.json")
+
+
+def save_data_to_parquet(file_path: str, data: Union[ColumnData, Iterable[ColumnData]], cols: List[str]):
+    """Save the export data to a parquet file, one row group per block, and return the size of the file. Columns that aren't numeric are written as their values' JSON text. Only available when pyarrow is installed."""
+
+    if pyarrow is None:
+        raise ValueError("Parquet exports need pyarrow to be installed")
+    check_column_names(cols, "parquet")
+
+    schema = pyarrow.schema([("time", pyarrow.float64())] + [(col, pyarrow.float64()) for col in cols])
+    writer = None
+    try:
+        for block in export_blocks(data):
+            arrays = [pyarrow.array(block.time)]
+            for column in block.columns:
+                if column.dtype == object:
+                    arrays.append(pyarrow.array([None if value is None else json.dumps(value) for value in column.tolist()],
+                                                type=pyarrow.string()))
+                else:
+                    arrays.append(pyarrow.array(column, from_pandas=True))  # NaN becomes null
+            table = pyarrow.Table.from_arrays(arrays, names=["time"] + cols)
+            if writer is None:
+                # the schema is fixed by the first block, every block of an export has the same column types
+                schema = table.schema
+                writer = pyarrow.parquet.ParquetWriter(file_path, schema)
+            writer.write_table(table)
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(file_path, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    return formatted_file_size(file_path)
+
+
+EXPORT_WRITERS = {
+    "csv": save_data_to_csv,
+    "npz": save_data_to_npz,
+    "raw": save_data_to_raw,
+    "parquet": save_data_to_parquet,
+}
+
+
+def save_data(file_path: str, data: Union[ColumnData, Iterable[ColumnData]], cols: List[str], export_format="csv"):
+    """Save the export data in the given format (one of EXPORT_FORMATS), and return the size of the files written"""
+
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}, expected one of {EXPORT_FORMATS}")
+    return EXPORT_WRITERS[export_format](file_path, data, cols)
+
+
+def rename_export(old_path: str, new_path: str) -> None:
+    """Move an export to a new name, along with the header of a raw export"""
+
+    os.replace(old_path, new_path)
+    if os.path.exists(f"{old_path}.json"):
+        os.replace(f"{old_path}.json", f"{new_path}.json")
+
+
+def load_export(file_path: str) -> ColumnData:
+    """Load a .npz or raw export back as ColumnData, for analysis. Raw exports are memory mapped, so only the parts of the file that are used get read. Columns that aren't numeric are decoded back into object arrays."""
+
+    if file_path.endswith(".npz"):
+        with np.load(file_path) as archive:
+            arrays = {name: archive[name] for name in archive.files}
+        cols = [name for name in arrays if name != "time" and not name.endswith(CATEGORIES_SUFFIX)]
+        columns = [decode_object_column(arrays[col], arrays[f"{col}{CATEGORIES_SUFFIX}"].tolist()) if f"{col}{CATEGORIES_SUFFIX}" in arrays
+                   else arrays[col] for col in cols]
+        return ColumnData(arrays["time"], cols, columns)
+
+    if file_path.endswith(".raw"):
+        with open(f"{file_path}.json") as header_file:
+            header = json.load(header_file)
+        if header.get("format") != "raw" or header.get("version") != RAW_FORMAT_VERSION:
+            raise ValueError(f"{file_path} isn't a raw export this version can read")
+        dtype = np.dtype([(name, field_type) for name, field_type in header["fields"]])
+        if header["rows"] == 0:
+            records = np.empty(0, dtype=dtype)  # an empty file can't be memory mapped
+        else:
+            records = np.memmap(file_path, dtype=dtype, mode="r", shape=(header["rows"],))
+        cols = list(dtype.names[1:])
+        columns = [decode_object_column(records[col], header["categories"][col]) if col in header["categories"]
+                   else records[col] for col in cols]
+        return ColumnData(records["time"], cols, columns)
+
+    raise ValueError(f"Can't load {file_path}, only .npz and .raw exports can be loaded")
+
+
 def save_manifest(manifest_args: dict):
     """Prepare and save a manifest file for the export, with the given arguments."""
 
@@ -27,6 +270,11 @@ def save_manifest(manifest_args: dict):
 
     manifest_empty_filler = "NONE"
 
+    if manifest_args.get("msg_packed_filtering") == "board_time":
+        can_timing_note = "CAN entries were timed with each board's own clock, keeping every entry."
+    else:
+        can_timing_note = f"CAN entries were filterd for stricly {manifest_args.get('msg_packed_filtering', manifest_empty_filler)} timestamps, so may not be complete."
+
     # The string literal must be un-indented to save properly
     manifest_text = f"""Data exported from {manifest_args.get("file_path", manifest_empty_filler)} with mode {manifest_args.get("mode", manifest_empty_filler)} and time range {manifest_args.get("start", manifest_empty_filler)} to {manifest_args.get("stop", manifest_empty_filler)}, exported at {datetime.datetime.now()} with the export hash {manifest_args.get("export_hash", manifest_empty_filler)}.
 Exported columns:
@@ -35,10 +283,16 @@ CAN: {manifest_args.get("can_cols", manifest_empty_filler)}
 Exported files:
 DAQ: {manifest_args.get("daq_export_path", manifest_empty_filler)} ({manifest_args.get("formatted_daq_size", manifest_empty_filler)})
 CAN: {manifest_args.get("can_export_path", manifest_empty_filler)} ({manifest_args.get("formatted_can_size", manifest_empty_filler)})
+Merged: {manifest_args.get("merged_export_path", manifest_empty_filler)} ({manifest_args.get("formatted_merged_size", manifest_empty_filler)})
 DAQ export settings:
 Compression: {manifest_args.get("daq_compression", manifest_empty_filler)}
+Sample rate: {manifest_args.get("daq_sample_rate", manifest_empty_filler)}
 Aggregation function: {manifest_args.get("daq_aggregate_function", manifest_empty_filler)}
-CAN entries were filterd for stricly {manifest_args.get("msg_packed_filtering", manifest_empty_filler)} timestamps, so may not be complete.
+Format: {manifest_args.get("export_format", manifest_empty_filler)}
+Merge settings:
+Grid rate: {manifest_args.get("grid_rate", manifest_empty_filler)}
+Grid aggregation: {manifest_args.get("grid_aggregation", manifest_empty_filler)}
+{can_timing_note}
     """
 
     manifest_path = f"{manifest_args.get('file_path', 'NONE').replace('.log','')}_export_{manifest_args.get('export_hash', 'NONE')}_manifest.txt"
@@ -0,0 +1,87 @@
+import csv
+
+import numpy as np
+import pytest
+
+from column_data import ColumnData
+from data_saving import check_column_names, format_column, is_whole_numbers, load_export, save_data, save_data_to_csv
+
+
+class TestCsv:
+    def test_whole_numbers(self):
+        assert is_whole_numbers(np.array([1.0, np.nan, -3.0]))
+        assert not is_whole_numbers(np.array([1.0, 1.5]))
+        # too big to go through int64, or to be sure they're whole
+        assert not is_whole_numbers(np.array([2.0 ** 63]))
+        assert not is_whole_numbers(np.array([2.0 ** 53]))
+        assert not is_whole_numbers(np.array([np.inf]))
+        assert not is_whole_numbers(np.array(["open"], dtype=object))
+
+    def test_format_column(self):
+        assert format_column(np.array([1.0, np.nan, -3.0]), True) == ["1", "", "-3"]
+        assert format_column(np.array([1.5, np.nan]), False) == ["1.5", ""]
+        assert format_column(np.array([2.0 ** 63]), is_whole_numbers(np.array([2.0 ** 63]))) == ["9.223372036854776e+18"]
+        assert format_column(np.array(["open", None], dtype=object), False) == ["open", ""]
+
+    def test_save_csv(self, tmp_path):
+        data = ColumnData(np.array([0.0, 0.5]), ["a", "b"],
+                          [np.array([np.nan, 2.0]), np.array(["open", None], dtype=object)])
+        save_data_to_csv(str(tmp_path / "export.csv"), data, ["a", "b"])
+
+        with open(tmp_path / "export.csv") as infile:
+            assert list(csv.reader(infile)) == [["time", "a", "b"], ["0.0", "", "open"], ["0.5", "2", ""]]
+
+    def test_save_csv_blocks(self, tmp_path):
+        # the format of each column is decided by the first block, and later blocks never lose their decimals
+        blocks = [ColumnData(np.array([0.0, 0.5]), ["a"], [np.array([1.0, 2.0])]),
+                  ColumnData(np.array([1.0, 1.5]), ["a"], [np.array([2.5, 3.0])])]
+        save_data_to_csv(str(tmp_path / "export.csv"), iter(blocks), ["a"])
+
+        with open(tmp_path / "export.csv") as infile:
+            assert [row[1] for row in csv.reader(infile)] == ["a", "1", "2", "2.5", "3"]
+
+
+def export_data() -> ColumnData:
+    return ColumnData(np.array([0.0, 0.5, 1.0]), ["a", "state"],
+                      [np.array([1.5, np.nan, 3.0]), np.array(["OPEN", None, [1, "x"]], dtype=object)])
+
+
+@pytest.mark.parametrize("export_format", ["npz", "raw"])
+class TestBinaryExports:
+    def test_round_trip(self, tmp_path, export_format):
+        data = export_data()
+        file_path = str(tmp_path / f"export.{export_format}")
+        save_data(file_path, data, data.cols, export_format)
+        loaded = load_export(file_path)
+
+        assert loaded.cols == data.cols
+        np.testing.assert_array_equal(loaded.time, data.time)
+        np.testing.assert_array_equal(loaded["a"], data["a"])
+        assert loaded["state"].tolist() == ["OPEN", None, [1, "x"]]
+
+    def test_round_trip_blocks(self, tmp_path, export_format):
+        data = export_data()
+        file_path = str(tmp_path / f"export.{export_format}")
+        save_data(file_path, iter([data.select(slice(0, 2)), data.select(slice(2, 3))]), data.cols, export_format)
+
+        assert load_export(file_path)["state"].tolist() == ["OPEN", None, [1, "x"]]
+
+    def test_empty(self, tmp_path, export_format):
+        file_path = str(tmp_path / f"export.{export_format}")
+        save_data(file_path, iter([]), ["a"], export_format)
+        loaded = load_export(file_path)
+
+        assert loaded.cols == ["a"]
+        assert len(loaded) == 0
+
+    def test_reserved_names(self, tmp_path, export_format):
+        data = ColumnData(np.array([0.0]), ["time"], [np.array([1.0])])
+        with pytest.raises(ValueError):
+            save_data(str(tmp_path / f"export.{export_format}"), data, data.cols, export_format)
+        check_column_names(["time"], "csv")
+
+
+def test_reserved_npz_names():
+    with pytest.raises(ValueError):
+        check_column_names(["a:categories"], "npz")
+    check_column_names(["a:categories"], "raw")
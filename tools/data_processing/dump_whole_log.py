@@ -1,24 +1,105 @@
-# A quick script for Artem that dumps every message into a text
-
-import msgpack
+# Dump every message of a log (or the ones on some channels or between some times) as JSON lines, to a file or piped into other tools
+# Each line is a [channel, timestamp, payload] list, the same as the messages in the log, so it can be read back with any JSON parser
 import argparse
+import collections
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, List, Tuple
+
+from omnibus.util import LogQuery, encode_line
+
+from parallel_extraction import CHUNKS_PER_WORKER, chunk_offsets
+
+DUMP_CHUNK_SIZE = 16 * 1024 * 1024  # bytes of log per chunk, so a chunk's dumped lines fit in memory comfortably
+WRITE_BATCH = 1024  # lines joined into each write when dumping without workers
+
+
+def dump_range(file_path: str, filters: tuple, start: int, end: int) -> bytes:
+    """Dump the messages passing the filters that start between byte offsets start and end of the log to JSON lines. The filters are the arguments of LogQuery rather than the query itself, since its compiled expression can't be sent to other processes."""
+
+    query = LogQuery(*filters)
+    return b"".join(map(encode_line, query.run_range(file_path, start, end)))
+
+
+def dump_ranges(file_path: str, query: LogQuery, workers: int) -> List[Tuple[int, int]]:
+    """Split the parts of the log that can hold messages passing the query into chunks for the workers, as (start, end) byte offsets in log order"""
+
+    size = os.path.getsize(file_path)
+    offsets = chunk_offsets(file_path, max(workers * CHUNKS_PER_WORKER, size // DUMP_CHUNK_SIZE))
+    ranges = []
+    # cut the chunks down to the parts of the log the query's time and channel limits leave, both start and end on message boundaries
+    for range_start, range_end in query.byte_ranges(file_path):
+        for chunk_start, chunk_end in zip(offsets[:-1], offsets[1:]):
+            start, end = max(chunk_start, range_start), min(chunk_end, range_end)
+            if start < end:
+                ranges.append((start, end))
+    return ranges
+
+
+def dump_log(file_path: str, outfile: IO[bytes], query: LogQuery, workers=1) -> int:
+    """Write the messages of the log passing the query to outfile as JSON lines in log order, and return how many bytes were written. With more than one worker the log is dumped in chunks on that many processes, with only a few chunks ahead of the one being written kept in memory."""
+
+    written = 0
+    if workers <= 1:
+        lines = []
+        for message in query.run(file_path):
+            lines.append(encode_line(message))
+            if len(lines) >= WRITE_BATCH:
+                written += outfile.write(b"".join(lines))
+                lines = []
+        return written + outfile.write(b"".join(lines))
+
+    filters = (query.expression, query.channel, query.start, query.stop)
+    ranges = iter(dump_ranges(file_path, query, workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for start, end in ranges:
+            pending.append(executor.submit(dump_range, file_path, filters, start, end))
+            if len(pending) >= workers * 2:
+                written += outfile.write(pending.popleft().result())
+        while pending:
+            written += outfile.write(pending.popleft().result())
+    return written
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Read a messagepacked file and output all the unique messages to a text file")
+        description="Read a messagepacked file and output every message as a line of JSON, [channel, timestamp, payload]")
     parser.add_argument("file", type=str, help="The file to read")
+    parser.add_argument("-o", "--output", type=str,
+                        help="The file to write to, or - for stdout (default: all_messages_<log>.jsonl next to the log)")
+    parser.add_argument("-c", "--channel", type=str, default="", help="Only dump channels starting with this prefix")
+    parser.add_argument("--start", type=float, help="Only dump messages logged at or after this timestamp")
+    parser.add_argument("--stop", type=float, help="Only dump messages logged at or before this timestamp")
+    parser.add_argument("-q", "--query", type=str,
+                        help="Only dump messages matching this expression over their payload, like 'data.value > 3000' (see tools/logquery)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Dump the log in chunks on this many processes (default: 1)")
     args = parser.parse_args()
 
-    with open(args.file, "rb") as infile:            
-        dir, infile_name = os.path.split(args.file)
-        outfile_name = 'all_messages_' + (infile_name.split('.log'))[0] + '.txt'
-        outfile_path = os.path.join(dir, outfile_name)
-        with open(outfile_path, "w") as outfile:
-            for full_data in msgpack.Unpacker(infile):
-                outfile.write(str(full_data) + "\n")
+    try:
+        query = LogQuery(args.query, args.channel, args.start, args.stop)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
 
+    if args.output == "-":
+        try:
+            dump_log(args.file, sys.stdout.buffer, query, args.jobs)
+            sys.stdout.flush()
+        except BrokenPipeError:  # piped into something like head that stopped reading
+            sys.stderr.close()
+        return
+
+    if args.output:
+        outfile_path = args.output
+    else:
+        dir, infile_name = os.path.split(args.file)
+        outfile_path = os.path.join(dir, 'all_messages_' + (infile_name.split('.log'))[0] + '.jsonl')
+    with open(outfile_path, "wb") as outfile:
+        written = dump_log(args.file, outfile, query, args.jobs)
+    print(f"Dumped {written / (1024 * 1024):.2f} MB of messages to {outfile_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import io
+import json
+
+import pytest
+
+from dump_whole_log import dump_log
+from omnibus.util import LogQuery, LogSummary
+
+
+def dumped(log_path, query, workers) -> bytes:
+    outfile = io.BytesIO()
+    written = dump_log(log_path, outfile, query, workers)
+    assert written == len(outfile.getvalue())
+    return outfile.getvalue()
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_parallel_matches_serial(log_path, small_chunks, indexed):
+    if indexed:
+        LogSummary.for_log(log_path)
+    serial = dumped(log_path, LogQuery(), 1)
+    assert serial.count(b"\n") == 895
+    assert dumped(log_path, LogQuery(), 3) == serial
+
+    query = LogQuery("data.value >= 100 and msg_type == \"SENSOR_ANALOG\"", channel="CAN", start=5, stop=40)
+    serial = dumped(log_path, query, 1)
+    times = [json.loads(line)[1] for line in serial.splitlines()]
+    assert times == sorted(times) and times[0] == pytest.approx(10.01)
+    assert dumped(log_path, query, 3) == serial
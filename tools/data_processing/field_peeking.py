@@ -1,75 +1,224 @@
+# Profile what's in a log: every kind of message on a channel, how many there are, when they start and stop, and at what rate they come in
 import argparse
 import msgpack
 import csv
+import os
 
 from argparse import Namespace
-from typing import Callable, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
-messages = {}
+from omnibus.util import LogSummary, summary_path
 
+from parallel_extraction import CHUNKS_PER_WORKER, chunk_offsets
 
-def process_CAN_message(channel: str, payload: dict) -> None:
-    """Extract the regonizable fields from the CAN message and add it to the messages dictionary"""
+# the statistics kept for each kind of message, in a list per key to keep updating them cheap
+COUNT, FIRST, LAST, SECONDS, FIRST_SECOND, LAST_SECOND, MAX_SECOND_COUNT, SAMPLE = range(8)
+# seconds a message can be logged behind a later one (like the delayed copy of the CAN stream), so the counts of
+# the latest seconds are kept until no more messages are expected for them
+RATE_WINDOW = 10
 
-    field_signature = {}
-    # fill in the field signature for all the matches that we have in the format {"msg_type": "ACTUATOR_STATUS", "data.actuator": "ACTUATOR_VENT_VALVE"}
-    if "board_id" in payload:
-        field_signature["board_id"] = payload["board_id"]
-    if "msg_type" in payload:
-        field_signature["msg_type"] = payload["msg_type"]
-    if "data" in payload:
-        if "sensor_id" in payload["data"]:
-            field_signature["data.sensor_id"] = payload["data"]["sensor_id"]
-        if "actuator" in payload["data"]:
-            field_signature["data.actuator"] = payload["data"]["actuator"]
-
-    sig_text = str(field_signature)
-    messages[(channel, payload.get("board_id", ""), payload.get("msg_type", ""), payload.get(
-        "data", {}).get("sensor_id", ""), payload.get("data", {}).get("actuator", ""), sig_text)] = payload
 
+def can_key(channel: str, payload: dict) -> tuple:
+    """The kind of a CAN message: its channel and the parts of its signature, with None for the parts it doesn't have"""
 
-def process_DAQ_message(channel: str, payload: dict) -> None:
-    """Get the names of the fields in the DAQ messages"""
+    data = payload.get("data")
+    if not isinstance(data, dict):
+        data = {}
+    return (channel, payload.get("board_id"), payload.get("msg_type"), data.get("sensor_id"), data.get("actuator"))
 
-    for field in payload["data"]:
-        messages[(channel, field)] = payload["data"][(field)][0]
 
+def can_signature_text(key: tuple) -> str:
+    """The signature of a kind of CAN message, formatted to paste into can_field_definitions.py. Only built once per kind of message when writing the results, rather than for every message."""
 
-def process_file(args: Namespace, process_func: Callable[[str, Any], None], headers: list[str]) -> None:
-    """Process the file with the given function and headers, and write the results to a csv file. The args are used to get the log file, and the type of channel being processed."""
+    field_signature = {}
+    # in the format {"msg_type": "ACTUATOR_STATUS", "data.actuator": "ACTUATOR_VENT_VALVE"}
+    for name, value in zip(["board_id", "msg_type", "data.sensor_id", "data.actuator"], key[1:]):
+        if value is not None:
+            field_signature[name] = value
+    return str(field_signature)
+
+
+class MessageProfile:
+    """Running statistics for every kind of message in a log, updated one message at a time so only the statistics are kept in memory. Rates are counted in whole seconds of log time, so the max rate is the most messages of a kind in one second.
+
+    Messages aren't always in time order, so the messages of each second are counted separately until the log is RATE_WINDOW seconds past it, after which only the most in any second is kept. The counts of the first seconds are kept too, since they can continue in an earlier part of the log profiled separately (see merge)."""
+
+    def __init__(self):
+        self.stats = {}
+
+    def add(self, key: tuple, timestamp: float, sample) -> None:
+        second = int(timestamp)
+        stats = self.stats.get(key)
+        if stats is None:
+            self.stats[key] = [1, timestamp, timestamp, {second: 1}, second, second, 0, sample]
+            return
+
+        stats[COUNT] += 1
+        if timestamp < stats[FIRST]:
+            stats[FIRST] = timestamp
+        elif timestamp > stats[LAST]:
+            stats[LAST] = timestamp
+        seconds = stats[SECONDS]
+        seconds[second] = seconds.get(second, 0) + 1
+        if second > stats[LAST_SECOND]:
+            stats[LAST_SECOND] = second
+            if len(seconds) > 3 * RATE_WINDOW:
+                close_seconds(stats)
+
+    def add_message(self, channel: str, timestamp: float, payload) -> None:
+        """Add a message of any channel, split into kinds by CAN signature or DAQ field"""
+
+        if channel.startswith("CAN") and isinstance(payload, dict):
+            self.add(can_key(channel, payload), timestamp, payload)
+        elif channel.startswith("DAQ") and isinstance(payload, dict) and isinstance(payload.get("data"), dict):
+            for field, samples in payload["data"].items():
+                self.add((channel, field), timestamp, samples[0] if samples else None)
+        else:
+            self.add((channel,), timestamp, payload)
+
+    def merge(self, other: "MessageProfile") -> None:
+        """Add the statistics of the next part of the log, profiled separately"""
+
+        for key, theirs in other.stats.items():
+            ours = self.stats.get(key)
+            if ours is None:
+                self.stats[key] = theirs[:SECONDS] + [dict(theirs[SECONDS])] + theirs[SECONDS + 1:]
+                continue
+            ours[COUNT] += theirs[COUNT]
+            ours[FIRST] = min(ours[FIRST], theirs[FIRST])
+            ours[LAST] = max(ours[LAST], theirs[LAST])
+            # a second split between the two parts of the log counts the messages from both
+            seconds = ours[SECONDS]
+            for second, count in theirs[SECONDS].items():
+                seconds[second] = seconds.get(second, 0) + count
+            ours[FIRST_SECOND] = min(ours[FIRST_SECOND], theirs[FIRST_SECOND])
+            ours[LAST_SECOND] = max(ours[LAST_SECOND], theirs[LAST_SECOND])
+            ours[MAX_SECOND_COUNT] = max(ours[MAX_SECOND_COUNT], theirs[MAX_SECOND_COUNT])
+            close_seconds(ours)
+
+    def rows(self):
+        """Yield the key and [count, first, last, mean rate, max rate, sample] of every kind of message, ordered by key"""
+
+        for key in sorted(self.stats, key=lambda key: tuple("" if part is None else str(part) for part in key)):
+            stats = self.stats[key]
+            duration = stats[LAST] - stats[FIRST]
+            mean_rate = round((stats[COUNT] - 1) / duration, 3) if duration > 0 else ""
+            max_rate = max(stats[MAX_SECOND_COUNT], max(stats[SECONDS].values(), default=0))
+            yield key, [stats[COUNT], stats[FIRST], stats[LAST], mean_rate, max_rate, stats[SAMPLE]]
+
+
+def close_seconds(stats: list) -> None:
+    """Fold the counts of the seconds no more messages are expected in into the max rate, except for the first seconds"""
+
+    seconds = stats[SECONDS]
+    oldest_open = stats[LAST_SECOND] - RATE_WINDOW
+    newest_first = stats[FIRST_SECOND] + RATE_WINDOW
+    for second in [second for second in seconds if newest_first < second < oldest_open]:
+        stats[MAX_SECOND_COUNT] = max(stats[MAX_SECOND_COUNT], seconds.pop(second))
+
+
+def profile_chunk(file_path: str, channel: str, start=0, end: Optional[int] = None) -> MessageProfile:
+    """Profile the messages on the channel that start between byte offsets start and end of the log"""
+
+    profile = MessageProfile()
+    with open(file_path, "rb") as infile:
+        infile.seek(start)
+        unpacker = msgpack.Unpacker(infile)
+        for channel_name, timestamp, payload in unpacker:
+            if channel_name.startswith(channel):  # check the message is in the channel we want
+                profile.add_message(channel_name, timestamp, payload)
+            if end is not None and start + unpacker.tell() >= end:
+                break
+    return profile
+
+
+def profile_file(file_path: str, channel="", workers=1) -> MessageProfile:
+    """Profile the messages on the channel in the log, split into chunks over several processes if more than one worker is given (see parallel_extraction.py)"""
+
+    if workers <= 1:
+        return profile_chunk(file_path, channel)
+
+    offsets = chunk_offsets(file_path, workers * CHUNKS_PER_WORKER)
+    chunks = len(offsets) - 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = executor.map(profile_chunk, [file_path] * chunks, [channel] * chunks, offsets[:-1], offsets[1:])
+        profile = MessageProfile()
+        for part in parts:
+            profile.merge(part)
+    return profile
+
+
+def process_file(args: Namespace) -> None:
+    """Profile the log for the channel given in the args, and write the results to a csv file"""
+
+    profile = profile_file(args.file, args.channel, args.jobs)
 
-    with open(args.file, "rb") as infile:
-        for full_data in msgpack.Unpacker(infile):
-            channel, timestamp, payload = full_data
-            if channel.startswith(args.channel):  # check the message is in the channel we want
-                process_func(channel, payload)
+    if args.channel.startswith("CAN"):
+        headers = ["channel", "board_id", "msg_type", "sensor_id", "actuator", "signature"]
+    elif args.channel.startswith("DAQ"):
+        headers = ["channel", "field"]
+    else:
+        headers = ["channel", "kind"]
+    headers += ["count", "first", "last", "mean_rate", "max_rate", "sample"]
 
-    output_path = f"{args.file.split('.log')[0]}_unique_messages_{args.channel}.csv"
+    output_path = f"{args.file.split('.log')[0]}_unique_messages_{args.channel.replace('/', '_') or 'all'}.csv"
 
     with open(output_path, "w") as outfile:  # the filename is formated this way with the original filename at the start to ensure that if the file comes from a different directory, the output file will be in the same directory
         writer = csv.writer(outfile)
         writer.writerow(headers)
-        for key, value in messages.items():
-            row = [k for k in key] + [value]
-            writer.writerow(row)
-
+        for key, stats in profile.rows():
+            if args.channel.startswith("CAN"):
+                row = list(key) + [can_signature_text(key)] if len(key) == 5 else [key[0], "", "", "", "", ""]
+            elif args.channel.startswith("DAQ"):
+                row = list(key) if len(key) == 2 else [key[0], ""]
+            else:
+                row = [key[0], "/".join("" if part is None else str(part) for part in key[1:])]
+            writer.writerow(["" if value is None else value for value in row] + stats)
+
+    print(f"Found {len(profile.stats)} kinds of messages in {sum(stats[COUNT] for stats in profile.stats.values())} messages")
     print(f"Unique messages written to {output_path}")
 
 
+def print_summary(args: Namespace) -> None:
+    """Print what's in the log from its summary sidecar, without reading the log"""
+
+    summary = LogSummary.load(summary_path(args.file))
+    if summary is None or summary.size != os.path.getsize(args.file):
+        summary = LogSummary.for_log(args.file)  # missing or out of date, so bring it up to date first
+
+    print(f"{summary.count} messages from {summary.start} to {summary.end}")
+    print("channel, count, first, last, mean_rate, MB")
+    for channel, stats in sorted(summary.channels.items()):
+        if not channel.startswith(args.channel):
+            continue
+        duration = stats["last"] - stats["first"]
+        mean_rate = f"{(stats['count'] - 1) / duration:.3f}" if duration > 0 else ""
+        print(f"{channel}, {stats['count']}, {stats['first']}, {stats['last']}, {mean_rate}, {stats['bytes'] / (1024 * 1024):.2f}")
+    if args.channel == "" or args.channel.startswith("DAQ"):
+        print(f"DAQ fields: {list(summary.daq_fields)}")
+    if args.channel == "" or args.channel.startswith("CAN"):
+        print("CAN signatures:")
+        for signature in summary.can_signatures:
+            print(can_signature_text((None,) + tuple(signature)))
+
+
 def main():
     parser = argparse.ArgumentParser(
-        description="Read a messagepacked file and output all the unique messages to a text file")
+        description="Read a messagepacked file and output every kind of message on a channel, with counts, times and rates, to a csv file")
     parser.add_argument("file", type=str, help="The file to read")
-    parser.add_argument("channel", type=str, help="The channel to read")
+    parser.add_argument("channel", type=str, nargs="?", default="",
+                        help="The channel to read, like CAN or DAQ (default: every channel)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Read the log in chunks on this many processes (default: 1)")
+    parser.add_argument("-s", "--summary", action="store_true",
+                        help="Only print the counts per channel and the fields in the log from its summary, without reading the log")
     args = parser.parse_args()
 
-    if args.channel.startswith("CAN"):
-        process_file(args, process_CAN_message, [
-                     "channel", "board_id", "msg_type", "sensor_id", "actuator", "signature", "sample"])
-    elif args.channel.startswith("DAQ"):
-        process_file(args, process_DAQ_message, ["channel", "field", "sample"])
+    if args.summary:
+        print_summary(args)
     else:
-        print("We don't support that channel yet, use dump_whole_log.py to dump the whole log file and figure out what's in it. ")
+        process_file(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+import csv
+import random
+from argparse import Namespace
+
+import field_peeking
+from field_peeking import MessageProfile, RATE_WINDOW, SECONDS, print_summary, process_file, profile_file
+
+
+def profile_of(messages) -> MessageProfile:
+    profile = MessageProfile()
+    for timestamp in messages:
+        profile.add(("CAN/Parsley",), timestamp, None)
+    return profile
+
+
+class TestMessageProfile:
+    def test_rates(self):
+        rows = list(profile_of([10 + i * 0.01 for i in range(300)]).rows())
+        [(key, [count, first, last, mean_rate, max_rate, sample])] = rows
+        assert (key, count, first, sample) == (("CAN/Parsley",), 300, 10, None)
+        assert mean_rate == 100 and max_rate == 100
+
+    def test_out_of_order(self):
+        # a delayed copy logged 3 s late, interleaved with the messages on time
+        timestamps = []
+        for i in range(200):
+            timestamps += [100 + i * 0.01, 97 + i * 0.01]
+        [(_, stats)] = profile_of(timestamps).rows()
+        assert stats[4] == 100
+
+    def test_long_log(self):
+        # a second with a burst in the middle of a long log, after which its count isn't kept
+        timestamps = [i * 0.05 for i in range(20 * 1000)] + [500.5] * 30
+        timestamps.sort()
+        profile = profile_of(timestamps)
+        [(_, stats)] = profile.rows()
+        assert stats[4] == 50
+        assert len(profile.stats[("CAN/Parsley",)][SECONDS]) <= 3 * RATE_WINDOW + 1
+
+    def test_merge(self):
+        random.seed(1)
+        timestamps = sorted(random.uniform(0, 100) for _ in range(5000))
+        timestamps += [t - 2 for t in timestamps[::3]]  # late copies
+        whole = list(profile_of(timestamps).rows())
+
+        for cuts in [[2500], [10, 1000, 1005, 4000], [6000]]:
+            merged = MessageProfile()
+            for start, end in zip([0] + cuts, cuts + [len(timestamps)]):
+                merged.merge(profile_of(timestamps[start:end]))
+            assert list(merged.rows()) == whole
+
+
+def test_profile_in_parallel(log_path, small_chunks):
+    serial = list(profile_file(log_path, "", 1).rows())
+    assert list(profile_file(log_path, "", 2).rows()) == serial
+    rates = {key: stats[4] for key, stats in serial}
+    assert rates[("DAQ", "a")] == 10
+    assert rates[("CAN/Parsley/1", "RLCS", "ACTUATOR_STATUS", None, "ACTUATOR_VENT_VALVE")] == 10
+
+
+def test_process_file(log_path):
+    process_file(Namespace(file=log_path, channel="CAN", jobs=1))
+
+    with open(log_path.replace(".log", "_unique_messages_CAN.csv")) as infile:
+        rows = list(csv.DictReader(infile))
+    assert [row["channel"] for row in rows] == ["CAN/Parsley/0", "CAN/Parsley/1"]
+    assert rows[0]["signature"] == "{'board_id': 'RLCS', 'msg_type': 'SENSOR_ANALOG', 'data.sensor_id': 'SENSOR_PRESSURE_OX'}"
+    assert rows[1]["count"] == "295" and rows[1]["max_rate"] == "10"
+
+
+def test_print_summary(log_path, capsys, monkeypatch):
+    print_summary(Namespace(file=log_path, channel=""))
+    out = capsys.readouterr().out
+    assert out.startswith("895 messages from 0.0 to ")
+    assert "DAQ, 300, 0.0, 29.9, 10.000" in out
+    assert "DAQ fields: ['a', 'b']" in out
+    assert "{'board_id': 'RLCS', 'msg_type': 'ACTUATOR_STATUS', 'data.actuator': 'ACTUATOR_VENT_VALVE'}" in out
+
+    # the second time it comes from the sidecar, without reading the log
+    monkeypatch.setattr(field_peeking.LogSummary, "for_log", None)
+    print_summary(Namespace(file=log_path, channel="CAN"))
+    out = capsys.readouterr().out
+    assert "CAN/Parsley/0, 300," in out and "DAQ" not in out
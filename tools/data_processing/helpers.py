@@ -1,28 +1,44 @@
-from typing import List, Any, Union
+import os
+from typing import IO
 
+from omnibus.util import LogSummary
 
-def offset_timestamps(data1: List[List[Union[int, Any]]], data2: List[List[Union[int, Any]]]):
+from column_data import ColumnData
+
+
+def offset_timestamps(data1: ColumnData, data2: ColumnData):
     """Offset the timestamps of the two data sources so that they start at 0, and return the time offset that was applied to both data sources."""
 
     # we need logic to handle the case where one of the data sources is empty, becuase a recording might only have CAN data
     if len(data1) > 0 and len(data2) > 0:
-        time_offset = min(data1[0][0], data2[0][0])
+        time_offset = min(data1.time[0], data2.time[0])
     elif len(data1) > 0:
-        time_offset = data1[0][0]
+        time_offset = data1.time[0]
     elif len(data2) > 0:
-        time_offset = data2[0][0]
+        time_offset = data2.time[0]
     else:
         raise ValueError("Both data sources are empty, can't offset timestamps.")
 
-    for i in range(len(data1)):
-        data1[i][0] -= time_offset
-    for i in range(len(data2)):
-        data2[i][0] -= time_offset
+    data1.time -= time_offset
+    data2.time -= time_offset
 
     return time_offset
 
 
-def filter_timestamps(data: List[List[Union[int, Any]]], start: int, stop: int) -> List[List[Union[int, Any]]]:
+def filter_timestamps(data: ColumnData, start: float, stop: float) -> ColumnData:
     """Filter the data to only include the timestamps between start and stop"""
 
-    return [d for d in data if d[0] >= start and d[0] <= stop]
+    return data.select((data.time >= start) & (data.time <= stop))
+
+
+def get_log_summary(infile: IO) -> LogSummary:
+    """Get the summary of the log open as infile, using (and updating, where the log's directory can be written to) its summary sidecar when the log is a file on disk"""
+
+    if isinstance(getattr(infile, "name", None), str) and os.path.isfile(infile.name):
+        return LogSummary.for_log(infile.name)
+
+    # in-memory logs have nowhere to keep a sidecar, so they're summarized from scratch
+    summary = LogSummary()
+    summary.scan(infile)
+    infile.seek(0)
+    return summary
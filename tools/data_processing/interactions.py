@@ -3,17 +3,44 @@ import csv
 import os
 import datetime
 import hashlib
+import fnmatch
+from typing import List
 
-from can_processing import get_can_lines, get_can_cols
-from daq_processing import get_daq_lines, get_daq_cols
-from data_saving import save_data_to_csv, save_manifest
+import numpy as np
+
+from can_processing import CanExtractor, get_can_cols
+from daq_processing import DaqExtractor, first_daq_timestamp, get_daq_cols, get_daq_samples, infer_sample_rate
+from log_extraction import extract_lines
+from log_cache import cached_extraction, load_extraction
+from parallel_extraction import parallel_extraction
+from data_saving import EXPORT_FORMATS, check_column_names, rename_export, save_data, save_manifest
 from helpers import offset_timestamps, filter_timestamps
+from column_data import ColumnData
+from alignment import asof_join, resample_blocks, sorted_by_time
+from preview_plotting import plot_decimated
 
 # HELPER FUNCTION
 
 
-def ingest_data(file_path: str, mode="a", daq_compression=True, daq_aggregate_function="average", msg_packed_filtering="behind_stream"):
-    """Takes in a file path and asks the users prompts before returning the data for the columns they selected"""
+def match_columns(column_mapping: dict, patterns: List[str]) -> List[int]:
+    """Get the numbers of the columns matching any of the patterns, which are column names or globs like "vent_*", optionally limited to one source like "DAQ:Fake*" or "can:*valve*" """
+
+    indexes = []
+    for pattern in patterns:
+        source = None
+        if ":" in pattern and pattern.split(":", 1)[0].upper() in ("DAQ", "CAN"):
+            source, pattern = pattern.split(":", 1)
+            source = source.upper()
+        matched = [number for (col_source, col), number in column_mapping.items()
+                   if (source is None or source == col_source) and fnmatch.fnmatchcase(col, pattern)]
+        if not matched:
+            print(f"Warning: no columns match {pattern}")
+        indexes += matched
+    return sorted(set(indexes))
+
+
+def ingest_data(file_path: str, mode="a", daq_compression=True, daq_aggregate_function="average", msg_packed_filtering="behind_stream", use_cache=True, workers=1, columns=None):
+    """Takes in a file path and asks the users prompts before returning the data for the columns they selected. If a list of column names or patterns is given, those columns are used without asking."""
 
     print("Parsing file...")
 
@@ -38,15 +65,22 @@ def ingest_data(file_path: str, mode="a", daq_compression=True, daq_aggregate_fu
             column_mapping[("CAN", col)] = column_counter
             column_counter += 1
 
-    print("The following columns are available:")
-    for col in column_mapping:
-        print(f"{column_mapping[col]}: {col}")
+    if columns is not None:
+        # the columns were chosen ahead of time by name or glob pattern, so we don't need to ask
+        indexes = match_columns(column_mapping, columns)
+        selection = None
+    else:
+        print("The following columns are available:")
+        for col in column_mapping:
+            print(f"{column_mapping[col]}: {col}")
 
-    selection = input(
-        "Enter the numbers or ranges with a - between (ex 3-5 for 3,4,5) for the columns you want to extract, seperated by commas, or leave empty for all: ")
+        selection = input(
+            "Enter the numbers or ranges with a - between (ex 3-5 for 3,4,5) for the columns you want to extract, seperated by commas, or leave empty for all: ")
 
     # parse the selection into a list of indexes in the cols list
-    if selection == "":
+    if selection is None:
+        pass
+    elif selection == "":
         indexes = [i for i in range(1, len(column_mapping)+1)]
     else:
         selection = selection.replace(" ", "")
@@ -73,47 +107,85 @@ def ingest_data(file_path: str, mode="a", daq_compression=True, daq_aggregate_fu
     for col in selected_can_cols:
         print(f"CAN: {col}")
 
-    print("Here's a copyable list of the numbers of the columns you selected:")
-    print(",".join([str(i) for i in indexes]))
-
-    # get the data for the selected columns
-    with open(file_path, "rb") as infile:
-        if mode == "a" or mode == "d":
-            daq_data = get_daq_lines(infile, selected_daq_cols,
+    if columns is None:
+        print("Here's a copyable list of the numbers of the columns you selected:")
+        print(",".join([str(i) for i in indexes]))
+
+    # uncompressed DAQ samples are streamed from the log when they're exported, so the DAQ data only needs aggregating for compressed exports
+    stream_daq = mode != "c" and not daq_compression
+    cached = load_extraction(file_path, daq_aggregate_function, msg_packed_filtering) if stream_daq and use_cache else None
+
+    # get the data for the selected columns, from the log's cache if it has one, or by reading the file once for both sources
+    if cached is not None:
+        daq_extractor, can_extractor = cached
+    elif stream_daq:
+        can_extractor = CanExtractor(selected_can_cols)
+        if mode != "d":
+            with open(file_path, "rb") as infile:
+                extract_lines(infile, None, can_extractor, msg_packed_filtering)
+    elif use_cache:
+        daq_extractor, can_extractor = cached_extraction(
+            file_path, daq_aggregate_function, msg_packed_filtering, workers=workers)
+    elif workers > 1 and msg_packed_filtering != "board_time":
+        daq_extractor, can_extractor = parallel_extraction(
+            file_path, daq_aggregate_function, msg_packed_filtering, workers)
+    else:
+        daq_extractor = DaqExtractor(selected_daq_cols,
                                      aggregate_function_name=daq_aggregate_function)
-            # map all None values to 0
-            for column_counter in range(len(daq_data)):
-                for j in range(len(daq_data[column_counter])):
-                    if daq_data[column_counter][j] is None:
-                        daq_data[column_counter][j] = 0
-        else:
-            daq_data = []
-        if mode == "a" or mode == "c":
-            can_data = get_can_lines(infile, selected_can_cols,
-                                     msg_packed_filtering=msg_packed_filtering)
-            for column_counter in range(len(can_data)):
-                for j in range(len(can_data[column_counter])):
-                    if can_data[column_counter][j] is None:
-                        can_data[column_counter][j] = 0
-        else:
-            can_data = []
+        can_extractor = CanExtractor(selected_can_cols)
+        with open(file_path, "rb") as infile:
+            extract_lines(infile, daq_extractor if mode != "c" else None,
+                          can_extractor if mode != "d" else None, msg_packed_filtering)
+
+    # missing values are kept as NaN (or None for non-numeric columns), and exported as empty cells
+    can_data = can_extractor.finish(selected_can_cols) if mode != "d" else ColumnData.empty()
+    if stream_daq:
+        # the samples are offset from where the aggregated DAQ data would start, the first DAQ message, to line up with previews
+        with open(file_path, "rb") as infile:
+            first_daq = first_daq_timestamp(infile)
+        daq_data = ColumnData(np.array([] if first_daq is None else [first_daq]), [], [])
+    else:
+        daq_data = daq_extractor.finish(selected_daq_cols) if mode != "c" else ColumnData.empty()
 
     # offset the timestamps of the data sources so that they start at 0
-    offset_timestamps(daq_data, can_data)
+    time_offset = offset_timestamps(daq_data, can_data)
+    if stream_daq:
+        daq_data = ColumnData.empty(selected_daq_cols)  # the samples themselves are read when they're exported
 
     # sanity check that timestamps are increasing for can
-    for time_index in range(len(can_data) - 1):
-        # compare the timestamps columns (redundant int cast to silence linter)
-        if int(can_data[time_index][0]) > int(can_data[time_index+1][0]):
-            print(
-                f"Warning: CAN timestamp {can_data[time_index][0]} is greater than {can_data[time_index+1][0]}")
+    for time_index in can_data.decreasing_times():
+        print(
+            f"Warning: CAN timestamp {can_data.time[time_index]} is greater than {can_data.time[time_index+1]}")
+
+    return selected_daq_cols, selected_can_cols, daq_data, can_data, time_offset
+
+
+def stream_daq_samples(file_path: str, cols, sample_rate: float, time_offset: float, start: float, stop: float):
+    """Stream blocks of every DAQ sample between start and stop from the file, with their timestamps offset by the same offset ingest_data applied"""
+
+    with open(file_path, "rb") as infile:
+        for block in get_daq_samples(infile, cols, sample_rate, time_offset + start, time_offset + stop):
+            block.time -= time_offset
+            yield block
+
+
+def hashed_blocks(blocks, hasher):
+    """Pass blocks of data through, feeding each to the hash object as it goes by"""
+
+    for block in blocks:
+        block.update_hash(hasher)
+        yield block
 
-    return selected_daq_cols, selected_can_cols, daq_data, can_data
+
+def export_path(file_path: str, export_hash: str, kind: str, export_format: str) -> str:
+    """The path of one of the files of an export, where kind is daq, can or merged"""
+
+    return f"{file_path.replace('.log','')}_export_{export_hash}_{kind}.{export_format}"
 
 # THE MAIN DATA PROCESSING DRIVING FUNCTIONS
 
 
-def data_preview(file_path: str, mode="a", msg_packed_filtering="behind_stream"):
+def data_preview(file_path: str, mode="a", msg_packed_filtering="behind_stream", use_cache=True, workers=1, columns=None):
     """A mode for previewing data with user input and plotting"""
 
     print(f"Previewing {file_path} in mode {mode}")
@@ -121,13 +193,13 @@ def data_preview(file_path: str, mode="a", msg_packed_filtering="behind_stream")
     if mode != "a" and mode != "d" and mode != "c":
         raise ValueError(f"Invalid mode {mode} passed to data_preview")
 
-    daq_cols, can_cols, daq_data, can_data = ingest_data(
-        file_path, mode, msg_packed_filtering=msg_packed_filtering)
+    daq_cols, can_cols, daq_data, can_data, _ = ingest_data(
+        file_path, mode, msg_packed_filtering=msg_packed_filtering, use_cache=use_cache, workers=workers, columns=columns)
 
     print("Pan the plot to find the time range you want to export")
 
-    # plot the data for the selected columns
-    plt.figure()
+    # plot the data for the selected columns, decimated so huge logs stay quick to pan and zoom
+    _, ax = plt.subplots()
 
     if mode == "a":
         plt.title("DAQ and CAN data")
@@ -139,70 +211,126 @@ def data_preview(file_path: str, mode="a", msg_packed_filtering="behind_stream")
     if mode == "a" or mode == "d":
         for i in range(len(daq_cols)):
             # plot the time column against the column for each selected colum
-            plt.plot([d[0] for d in daq_data], [d[i+1] for d in daq_data], label=daq_cols[i])
+            plot_decimated(ax, daq_data.time, daq_data.columns[i], label=daq_cols[i])
 
     if mode == "a" or mode == "c":
         for i in range(len(can_cols)):
-            plt.plot([d[0] for d in can_data], [d[i+1] for d in can_data], label=can_cols[i])
+            plot_decimated(ax, can_data.time, can_data.columns[i], label=can_cols[i])
 
     plt.xlabel("Time (s)")
     plt.legend()
     plt.show()
 
 
-def data_export(file_path: str, mode="a", daq_compression=True, daq_aggregate_function="average", msg_packed_filtering="behind_stream"):
-    """A mode for exporting data to csv files with user input, csv filtering, and manifest creation"""
+def data_export(file_path: str, mode="a", daq_compression=True, daq_aggregate_function="average", msg_packed_filtering="behind_stream", daq_sample_rate=None, merge=False, grid_rate=None, grid_aggregation="mean", use_cache=True, workers=1, columns=None, time_range=None, export_format="csv"):
+    """A mode for exporting data to csv files (or another of EXPORT_FORMATS) with user input, csv filtering, and manifest creation. Uncompressed exports write every DAQ sample rather than one aggregated line per message, at the given sample rate or the one inferred from the log.
+
+    Merged exports write a single csv where every DAQ row has the CAN state as of its timestamp. With a grid rate, the DAQ rows are first resampled onto a grid of that many rows per second with the given aggregation (see alignment.py).
+
+    Passing the columns (see match_columns) and the (start, stop) time range skips the prompts for them, so exports can be scripted."""
 
     print(f"Exporting {file_path} in mode {mode}")
     # Modes: a for all, d for daq, c for can
     if mode != "a" and mode != "d" and mode != "c":
         raise ValueError(f"Invalid mode {mode} passed to data_export")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}, expected one of {EXPORT_FORMATS}")
+    if merge and mode != "a":
+        raise ValueError("Merging the DAQ and CAN data needs both of them, use mode a")
 
     # get the user to select colums and fetch the data
-    daq_cols, can_cols, daq_data, can_data = ingest_data(
-        file_path, mode, daq_compression, daq_aggregate_function, msg_packed_filtering=msg_packed_filtering)
+    daq_cols, can_cols, daq_data, can_data, time_offset = ingest_data(
+        file_path, mode, daq_compression, daq_aggregate_function, msg_packed_filtering=msg_packed_filtering, use_cache=use_cache, workers=workers, columns=columns)
+    # check the names before asking for the time range, rather than failing partway through writing the files
+    check_column_names(daq_cols + can_cols, export_format)
 
     # get the time range to export
-    print("Select the time range to export, or leave empty for the start or end of the data respectively")
-    start = input("Start time (s): ")
-    if start == "":
-        start = 0
-        print("Defaulting to start of data")
+    if time_range is not None:
+        start, stop = time_range
     else:
-        start = float(start)
+        print("Select the time range to export, or leave empty for the start or end of the data respectively")
+        start = input("Start time (s): ")
+        if start == "":
+            start = 0
+            print("Defaulting to start of data")
+        else:
+            start = float(start)
 
-    stop = input("Stop time (s): ")
-    if stop == "":
-        stop = float("inf")
-        print("Defaulting to end of data")
-    else:
-        stop = float(stop)
+        stop = input("Stop time (s): ")
+        if stop == "":
+            stop = float("inf")
+            print("Defaulting to end of data")
+        else:
+            stop = float(stop)
 
     # filter the data to only include the timestamps between start and stop
     daq_data = filter_timestamps(daq_data, start, stop)
-    can_data = filter_timestamps(can_data, start, stop)
+    if not merge:
+        can_data = filter_timestamps(can_data, start, stop)
+    else:
+        # keep the CAN data from before start too, it's the state at the start of the merged data
+        can_data = filter_timestamps(can_data, -np.inf, stop)
+
+    # uncompressed DAQ samples are streamed straight from the log to the export, there can be far too many to hold in memory
+    stream_daq = mode != "c" and not daq_compression
 
     # print warnings if the data is empty
-    if len(daq_data) == 0 and len(can_data) == 0:
+    if len(daq_data) == 0 and len(can_data) == 0 and not stream_daq:
         print("Warning: No data to export for the selected time range")
 
-    # Create an export hash to identify the export
-    export_hash = hashlib.md5(
-        f"{file_path}{mode}{start}{stop}{daq_compression}{daq_aggregate_function}{daq_cols}{can_cols}{daq_data}{can_data}".encode()).hexdigest()
-    export_hash = export_hash[:6]
+    if stream_daq and daq_sample_rate is None:
+        with open(file_path, "rb") as infile:
+            daq_sample_rate = infer_sample_rate(infile)
+        print(f"Inferred a DAQ sample rate of {daq_sample_rate:.1f} Hz")
+
+    if stream_daq:
+        daq_blocks = stream_daq_samples(file_path, daq_cols, daq_sample_rate, time_offset, start, stop)
+    else:
+        daq_blocks = [daq_data]
+
+    # Create an export hash to identify the export, from the settings and the data written. Streamed samples are only seen as
+    # they're written, so the files are written under a temporary name and renamed once the hash is known
+    hasher = hashlib.md5(
+        f"{file_path}{mode}{start}{stop}{daq_compression}{daq_aggregate_function}{daq_cols}{can_cols}{merge}{grid_rate}{grid_aggregation}{export_format}".encode())
+    daq_blocks = hashed_blocks(daq_blocks, hasher)
 
     formatted_daq_size = "N/A"
     formatted_can_size = "N/A"
-    # write the data to a csv file for each data source
-    daq_export_path = f"{file_path.replace('.log','')}_export_{export_hash}_daq.csv"
-    can_export_path = f"{file_path.replace('.log','')}_export_{export_hash}_can.csv"
-    if mode == "a" or mode == "d":
-        formatted_daq_size = save_data_to_csv(daq_export_path, daq_data, daq_cols)
-        print(f"DAQ data exported to {daq_export_path} with size {formatted_daq_size}")
+    formatted_merged_size = "N/A"
+    # write the data to a file for each data source, or one file with both of them when merging
+    written = []
+    if merge:
+        if grid_rate is not None:
+            daq_blocks = resample_blocks(daq_blocks, grid_rate, grid_aggregation)
+        # every DAQ row gets the CAN state as of its timestamp
+        can_state = sorted_by_time(can_data)
+        merged_blocks = (asof_join(block, can_state) for block in daq_blocks)
+        formatted_merged_size = save_data(
+            export_path(file_path, "partial", "merged", export_format), merged_blocks, daq_cols + can_cols, export_format)
+        written.append("merged")
+    else:
+        if mode == "a" or mode == "d":
+            formatted_daq_size = save_data(
+                export_path(file_path, "partial", "daq", export_format), daq_blocks, daq_cols, export_format)
+            written.append("daq")
 
-    if mode == "a" or mode == "c":
-        formatted_can_size = save_data_to_csv(can_export_path, can_data, can_cols)
-        print(f"CAN data exported to {can_export_path} with size {formatted_can_size}")
+        if mode == "a" or mode == "c":
+            formatted_can_size = save_data(
+                export_path(file_path, "partial", "can", export_format), can_data, can_cols, export_format)
+            written.append("can")
+
+    can_data.update_hash(hasher)
+    export_hash = hasher.hexdigest()
+    export_hash = export_hash[:6]
+
+    daq_export_path = export_path(file_path, export_hash, "daq", export_format)
+    can_export_path = export_path(file_path, export_hash, "can", export_format)
+    merged_export_path = export_path(file_path, export_hash, "merged", export_format)
+    for kind, label, size in [("daq", "DAQ", formatted_daq_size), ("can", "CAN", formatted_can_size), ("merged", "Merged", formatted_merged_size)]:
+        if kind in written:
+            final_path = export_path(file_path, export_hash, kind, export_format)
+            rename_export(export_path(file_path, "partial", kind, export_format), final_path)
+            print(f"{label} data exported to {final_path} with size {size}")
 
     # save an export manifest for information on what was exported with which settings
     save_manifest({
@@ -213,11 +341,18 @@ def data_export(file_path: str, mode="a", daq_compression=True, daq_aggregate_fu
         "export_hash": export_hash,
         "daq_cols": daq_cols,
         "can_cols": can_cols,
-        "daq_export_path": daq_export_path,
-        "can_export_path": can_export_path,
+        "daq_export_path": daq_export_path if not merge and mode != "c" else None,
+        "can_export_path": can_export_path if not merge and mode != "d" else None,
+        "merged_export_path": merged_export_path if merge else None,
         "formatted_daq_size": formatted_daq_size,
         "formatted_can_size": formatted_can_size,
+        "formatted_merged_size": formatted_merged_size,
         "daq_compression": daq_compression,
         "daq_aggregate_function": daq_aggregate_function,
-        "msg_packed_filtering": msg_packed_filtering
+        "daq_sample_rate": daq_sample_rate,
+        "grid_rate": grid_rate,
+        "grid_aggregation": grid_aggregation if grid_rate is not None else None,
+        "msg_packed_filtering": msg_packed_filtering,
+        "export_format": export_format
     })
+    return export_hash
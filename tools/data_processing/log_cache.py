@@ -0,0 +1,112 @@
+# Cache the data extracted from a log next to it, so previewing and exporting the same log again doesn't need to parse it again
+import hashlib
+import os
+from typing import Optional, Tuple
+
+import msgpack
+
+from can_field_definitions import CAN_FIELDS
+from can_processing import CanExtractor
+from column_data import ColumnBuilder
+from daq_processing import DaqExtractor
+from log_extraction import extract_lines
+from parallel_extraction import parallel_extraction
+
+CACHE_SUFFIX = ".cache"  # appended to the log file name to get the cache's name
+CACHE_VERSION = 1
+FINGERPRINT_BYTES = 1024 * 1024  # bytes hashed from each end of the log to fingerprint its contents
+
+
+def cache_path(log_path: str) -> str:
+    """Return the path of the cache that belongs to a log file"""
+
+    return f"{log_path}{CACHE_SUFFIX}"
+
+
+def log_fingerprint(log_path: str) -> dict:
+    """Identify the contents of a log by its size, modification time and a hash of its start and end, which is enough to tell when a log has been changed or replaced without reading all of it"""
+
+    stat = os.stat(log_path)
+    hasher = hashlib.md5(str(stat.st_size).encode())
+    with open(log_path, "rb") as infile:
+        hasher.update(infile.read(FINGERPRINT_BYTES))
+        infile.seek(max(stat.st_size - FINGERPRINT_BYTES, 0))
+        hasher.update(infile.read(FINGERPRINT_BYTES))
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": hasher.hexdigest()}
+
+
+def extraction_key(aggregate_function_name: str, msg_packed_filtering: str) -> str:
+    """The settings the cached data was extracted with, including the CAN field definitions so editing them invalidates the cache"""
+
+    fields = repr([(field.csv_name, field.matching_pattern, field.reading_signature) for field in CAN_FIELDS])
+    return f"{aggregate_function_name}/{msg_packed_filtering}/{hashlib.md5(fields.encode()).hexdigest()}"
+
+
+def load_cache(log_path: str, fingerprint: dict) -> dict:
+    """Read the cache of a log, returning an empty cache if it's missing, unreadable or was made for a different version of the log"""
+
+    empty = {"version": CACHE_VERSION, "fingerprint": fingerprint, "extractions": {}}
+    try:
+        with open(cache_path(log_path), "rb") as cache_file:
+            cache = msgpack.unpackb(cache_file.read())
+    except (OSError, ValueError, msgpack.UnpackException):
+        return empty
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION or cache.get("fingerprint") != fingerprint:
+        return empty
+    return cache
+
+
+def save_cache(log_path: str, cache: dict) -> None:
+    """Write the cache of a log, replacing the old one atomically so an interrupted write never leaves a corrupt cache behind"""
+
+    tmp_path = f"{cache_path(log_path)}.tmp"
+    with open(tmp_path, "wb") as cache_file:
+        cache_file.write(msgpack.packb(cache))
+    os.replace(tmp_path, cache_path(log_path))
+
+
+def extractors_from_cache(extraction: dict, aggregate_function_name: str) -> Tuple[DaqExtractor, CanExtractor]:
+    """Turn a cached extraction back into extractors"""
+
+    daq_extractor = DaqExtractor(aggregate_function_name=aggregate_function_name)
+    can_extractor = CanExtractor()
+    daq_extractor.builder = ColumnBuilder.from_dict(extraction["daq"])
+    can_extractor.builder = ColumnBuilder.from_dict(extraction["can"])
+    return daq_extractor, can_extractor
+
+
+def load_extraction(log_path: str, aggregate_function_name="average", msg_packed_filtering="behind_stream") -> Optional[Tuple[DaqExtractor, CanExtractor]]:
+    """Return the extractors of the log from its cache if it's up to date, or None without parsing the log if it isn't"""
+
+    key = extraction_key(aggregate_function_name, msg_packed_filtering)
+    extraction = load_cache(log_path, log_fingerprint(log_path))["extractions"].get(key)
+    if extraction is None:
+        return None
+    print("Loading parsed data from cache...")
+    return extractors_from_cache(extraction, aggregate_function_name)
+
+
+def cached_extraction(log_path: str, aggregate_function_name="average", msg_packed_filtering="behind_stream", use_cache=True, workers=1) -> Tuple[DaqExtractor, CanExtractor]:
+    """Return extractors holding every DAQ and CAN column of the log, loaded from the log's cache when it's up to date. Otherwise the log is parsed (in parallel if more than one worker is given, except in board_time mode where each board's clock has to be followed from the start of the log) and the cache is updated. Use the extractors' finish(cols) to get the data of the columns you want."""
+
+    key = extraction_key(aggregate_function_name, msg_packed_filtering)
+    cache = load_cache(log_path, log_fingerprint(log_path)) if use_cache else None
+
+    if cache is not None and key in cache["extractions"]:
+        print("Loading parsed data from cache...")
+        return extractors_from_cache(cache["extractions"][key], aggregate_function_name)
+
+    if workers > 1 and msg_packed_filtering != "board_time":
+        daq_extractor, can_extractor = parallel_extraction(
+            log_path, aggregate_function_name, msg_packed_filtering, workers)
+    else:
+        daq_extractor = DaqExtractor(aggregate_function_name=aggregate_function_name)
+        can_extractor = CanExtractor()
+        with open(log_path, "rb") as infile:
+            extract_lines(infile, daq_extractor, can_extractor, msg_packed_filtering)
+
+    if cache is not None:
+        cache["extractions"][key] = {"daq": daq_extractor.builder.to_dict(),
+                                     "can": can_extractor.builder.to_dict()}
+        save_cache(log_path, cache)
+    return daq_extractor, can_extractor
@@ -0,0 +1,73 @@
+import msgpack
+import numpy as np
+
+import log_cache
+from column_data import ColumnBuilder
+from conftest import assert_same_data, log_messages, write_log
+from log_cache import cache_path, cached_extraction, load_extraction, log_fingerprint
+
+def test_builder_round_trip():
+    builder = ColumnBuilder()
+    for i in range(5):
+        builder.add_row(i / 2)
+        builder.set("number", i * 1.5)
+        if i % 2:
+            builder.set("state", f"S{i}")
+    restored = ColumnBuilder.from_dict(msgpack.unpackb(msgpack.packb(builder.to_dict())))
+
+    assert_same_data(restored.finish(), builder.finish())
+    assert_same_data(restored.finish(["state"], keep_all_rows=False), builder.finish(["state"], keep_all_rows=False))
+    # the restored builder can still be added to, like when it's concatenated with another chunk
+    assert_same_data(ColumnBuilder.concatenate([restored, builder]).finish(),
+                     ColumnBuilder.concatenate([builder, builder]).finish())
+
+
+def test_cache_is_used(tmp_path, monkeypatch):
+    log_path = str(tmp_path / "test.log")
+    write_log(log_path, log_messages(0, 10))
+
+    daq_extractor, can_extractor = cached_extraction(log_path)
+    assert (tmp_path / "test.log.cache").exists()
+
+    # the second time the log isn't parsed at all
+    monkeypatch.setattr(log_cache, "extract_lines", None)
+    cached_daq, cached_can = cached_extraction(log_path)
+    assert_same_data(cached_daq.finish(), daq_extractor.finish())
+    assert_same_data(cached_can.finish(), can_extractor.finish())
+    assert cached_can.finish()["vent_valve_req_status"][-1] == "S4"
+    assert load_extraction(log_path) is not None
+    assert load_extraction(log_path, "median") is None  # extracted with other settings
+
+
+def test_changed_log_rebuilds_cache(tmp_path):
+    log_path = str(tmp_path / "test.log")
+    write_log(log_path, log_messages(0, 10))
+    fingerprint = log_fingerprint(log_path)
+    cached_extraction(log_path)
+
+    write_log(log_path, log_messages(0, 5) + log_messages(20, 5))
+    assert log_fingerprint(log_path) != fingerprint
+    assert load_extraction(log_path) is None
+    daq_extractor, _ = cached_extraction(log_path)
+    np.testing.assert_allclose(daq_extractor.finish().time[5:], np.arange(20, 25) / 10)
+
+    write_log(log_path, log_messages(30, 2), mode="ab")  # a log that's still being written to
+    assert load_extraction(log_path) is None
+    daq_extractor, can_extractor = cached_extraction(log_path)
+    assert len(daq_extractor.finish()) == 12
+    assert can_extractor.finish()["vent_valve_req_status"][-1] == "S26"
+
+    # and the rebuilt cache is up to date again
+    assert_same_data(load_extraction(log_path)[0].finish(), daq_extractor.finish())
+
+
+def test_unreadable_cache(tmp_path):
+    log_path = str(tmp_path / "test.log")
+    write_log(log_path, log_messages(0, 3))
+    with open(cache_path(log_path), "wb") as cache_file:
+        cache_file.write(b"\xc1 not msgpack")
+
+    assert load_extraction(log_path) is None
+    daq_extractor, _ = cached_extraction(log_path)
+    assert len(daq_extractor.finish()) == 3
+    assert load_extraction(log_path) is not None
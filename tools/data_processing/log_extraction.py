@@ -0,0 +1,30 @@
+# Read a log once, handing each message to the DAQ and CAN extractors that want it
+from typing import IO, Optional
+
+import msgpack
+
+from can_processing import CanExtractor
+from daq_processing import DaqExtractor
+from msgpack_sorter_unpacker import BoardTimestamps, TimestampFilter
+
+
+def extract_lines(infile: IO, daq_extractor: Optional[DaqExtractor] = None, can_extractor: Optional[CanExtractor] = None, msg_packed_filtering="behind_stream") -> None:
+    """Stream every message of the file through the given extractors in a single pass, so the log is never loaded into memory at once. CAN messages are filtered for the msg_packed_filtering stream like get_can_lines does, DAQ messages aren't filtered. In board_time mode every CAN message is kept and timed by its board's clock instead, and the CAN rows are sorted by that time at the end."""
+
+    print(f"Processing msgpacked messages in mode {msg_packed_filtering}")
+
+    board_time = msg_packed_filtering == "board_time"
+    # the running max time is kept over every message, like msgpackFilterUnpacker does
+    keep_can = BoardTimestamps() if board_time else TimestampFilter(msg_packed_filtering)
+    for channel, timestamp, payload in msgpack.Unpacker(infile):
+        keep = board_time or keep_can(timestamp)
+        if channel.startswith("DAQ"):
+            if daq_extractor is not None:
+                daq_extractor.feed(timestamp, payload)
+        elif channel.startswith("CAN/Parsley"):
+            if can_extractor is not None and keep:
+                can_extractor.feed(keep_can(timestamp, payload) if board_time else timestamp, payload)
+
+    if board_time and can_extractor is not None:
+        can_extractor.builder.sort_rows()
+    infile.seek(0)
@@ -1,28 +1,120 @@
 # A coordinator for the can and daq processors, automatically taking in arguments and running opperations on parsed logs
 # For a single export, it's run a few times for differnt opperations, like preview (with optional ranges) and choosing times, and for exporting the differnt streams with the option to merge
+# Passing the columns or time range on the command line skips the prompts, and the batch subcommand exports many logs at once without any prompts
 import sys
 import argparse
 
 from interactions import data_preview, data_export
+from alignment import AGGREGATIONS
+from batch_export import batch_export
+from daq_processing import aggregation_functions
+from data_saving import EXPORT_FORMATS
 
 # ARGUMENT PARSING
 
 
+def addProcessingArguments(parser: argparse.ArgumentParser):
+    """Add the options shared by single log runs and batch exports"""
+
+    parser.add_argument("-a", "--all", help="Plot all data", action="store_true")
+    parser.add_argument("-d", "--daq", help="Plot only daq data", action="store_true")
+    parser.add_argument("-c", "--can", help="Plot only can data", action="store_true")
+
+    parser.add_argument(
+        "-C", "--columns", help="Columns to use instead of asking, by name or glob, optionally prefixed with DAQ: or CAN: (ex -C 'DAQ:Fake*' -C 'can:*valve*'), repeatable", action="append")
+    parser.add_argument("--start", help="Start time (s) of the export instead of asking", type=float)
+    parser.add_argument("--stop", help="Stop time (s) of the export instead of asking", type=float)
+    parser.add_argument(
+        "-f", "--format", help="The file format to export to (default: csv)", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument(
+        "--daq_agg", help="How the samples of each DAQ message are aggregated (default: average)", choices=list(aggregation_functions), default="average")
+
+    parser.add_argument(
+        "-u", "--uncompressed", help="Export every DAQ sample instead of averaging each message", action="store_true")
+    parser.add_argument(
+        "-r", "--rate", help="The DAQ sample rate in Hz for uncompressed exports, inferred from the log if not given", type=float)
+
+    parser.add_argument(
+        "-m", "--merge", help="Export DAQ and CAN data together in one csv, with the CAN state as of each DAQ row", action="store_true")
+    parser.add_argument(
+        "-g", "--grid", help="Resample the merged data onto a grid of this many rows per second", type=float)
+    parser.add_argument(
+        "--agg", help="How DAQ data is aggregated in each grid bin (default: mean)", choices=AGGREGATIONS, default="mean")
+
+    parser.add_argument(
+        "--no_cache", help="Parse the log again instead of using (and updating) its cache", action="store_true")
+
+    parser.add_argument(
+        "-b", "--behind", help="Take the behind stream for CAN exporting", action="store_true")
+    parser.add_argument(
+        "-t", "--board_time", help="Keep every CAN message and time it with its board's own clock, instead of taking the ahead or behind stream", action="store_true")
+
+
+def processingSettings(args: argparse.Namespace, non_interactive=False):
+    """Turn the shared options into the data mode and the keyword arguments for data_export. If any of the columns or time range are given (or non_interactive is set), the rest default to everything so nothing is asked."""
+
+    data_mode = "a"
+    if args.all:
+        data_mode = "a"
+    elif args.daq:
+        data_mode = "d"
+    elif args.can:
+        data_mode = "c"
+    else:
+        print("Defaulting to all data sources")
+
+    msg_packed_filtering_mode = "ahead_stream"
+    if args.behind and args.board_time:
+        print("Board time keeps both the ahead and behind streams, pass only one of -b and -t")
+        sys.exit(1)
+    elif args.behind:
+        msg_packed_filtering_mode = "behind_stream"
+    elif args.board_time:
+        msg_packed_filtering_mode = "board_time"
+
+    if args.merge and data_mode != "a":
+        print("Merging needs both the DAQ and CAN data, pass -a (or neither -d nor -c) with -m")
+        sys.exit(1)
+
+    if args.grid is not None and not args.merge:
+        print("A grid rate only applies to merged exports, pass -m as well")
+        sys.exit(1)
+
+    columns = args.columns
+    time_range = None
+    if non_interactive or args.columns is not None or args.start is not None or args.stop is not None:
+        columns = args.columns or ["*"]
+        time_range = (args.start if args.start is not None else 0,
+                      args.stop if args.stop is not None else float("inf"))
+
+    return data_mode, {
+        "daq_compression": not args.uncompressed,
+        "daq_aggregate_function": args.daq_agg,
+        "msg_packed_filtering": msg_packed_filtering_mode,
+        "daq_sample_rate": args.rate,
+        "merge": args.merge,
+        "grid_rate": args.grid,
+        "grid_aggregation": args.agg,
+        "use_cache": not args.no_cache,
+        "columns": columns,
+        "time_range": time_range,
+        "export_format": args.format,
+    }
+
+
 def parseArguments():
     """Take parameters from the command line and parse them for the differnt modes"""
 
-    parser = argparse.ArgumentParser(description="Run data processing on a log file")
+    parser = argparse.ArgumentParser(description="Run data processing on a log file",
+                                     epilog="Run with batch as the first argument to export many logs at once, see batch --help")
     parser.add_argument("file", help="The file to run on")
 
     parser.add_argument("-p", "--preview", help="Preview the data", action="store_true")
     parser.add_argument("-e", "--export", help="Export the data", action="store_true")
 
-    parser.add_argument("-a", "--all", help="Plot all data", action="store_true")
-    parser.add_argument("-d", "--daq", help="Plot only daq data", action="store_true")
-    parser.add_argument("-c", "--can", help="Plot only can data", action="store_true")
-
+    addProcessingArguments(parser)
     parser.add_argument(
-        "-b", "--behind", help="Take the behind stream for CAN exporting", action="store_true")
+        "-j", "--jobs", help="Parse the log in chunks on this many processes (default: 1)", type=int, default=1)
 
     if len(sys.argv) == 1:
         print("Make sure to pass a log file to run on, and other options")
@@ -40,30 +132,41 @@ def parseArguments():
     else:
         print("Defaulting to preview mode")
 
-    data_mode = "a"
-    if args.all:
-        data_mode = "a"
-    elif args.daq:
-        data_mode = "d"
-    elif args.can:
-        data_mode = "c"
-    else:
-        print("Defaulting to all data sources")
+    data_mode, settings = processingSettings(args)
+    settings["workers"] = args.jobs
 
-    msg_packed_filtering_mode = "ahead_stream"
-    if args.behind:
-        msg_packed_filtering_mode = "behind_stream"
+    return in_file_path, processing_mode, data_mode, settings
+
+
+def parseBatchArguments():
+    """Take parameters for a batch export from the command line, after the batch subcommand"""
 
-    return in_file_path, processing_mode, data_mode, msg_packed_filtering_mode
+    parser = argparse.ArgumentParser(prog=f"{sys.argv[0]} batch",
+                                     description="Export many log files with the same settings and no prompts, all columns and the whole log unless given")
+    parser.add_argument("files", help="The files to export", nargs="+")
+
+    addProcessingArguments(parser)
+    parser.add_argument(
+        "-j", "--jobs", help="Export this many logs at once, each on its own process (default: 1)", type=int, default=1)
+
+    args = parser.parse_args(sys.argv[2:])
+    data_mode, settings = processingSettings(args, non_interactive=True)
+    return args.files, data_mode, settings, args.jobs
 
 
 if __name__ == "__main__":
 
-    in_file_path, processing_mode, data_mode, msg_packed_filtering_mode = parseArguments()
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        in_file_paths, data_mode, settings, jobs = parseBatchArguments()
+        failed = batch_export(in_file_paths, data_mode, settings, workers=jobs)
+        sys.exit(1 if failed else 0)
+
+    in_file_path, processing_mode, data_mode, settings = parseArguments()
 
     if processing_mode == "p":
-        data_preview(in_file_path, data_mode, msg_packed_filtering=msg_packed_filtering_mode)
+        data_preview(in_file_path, data_mode, msg_packed_filtering=settings["msg_packed_filtering"],
+                     use_cache=settings["use_cache"], workers=settings["workers"], columns=settings["columns"])
     elif processing_mode == "e":
-        data_export(in_file_path, data_mode, msg_packed_filtering=msg_packed_filtering_mode)
+        data_export(in_file_path, data_mode, **settings)
     else:
         raise NotImplementedError
@@ -1,34 +1,69 @@
 import msgpack
+import numpy as np
 
-from typing import IO
+from typing import IO, Iterator
 
-# FIXME: this method is an intermediary hack, and instead each board's real time should be determined based off the message's wrapped timestamp, ignorning the msgpacked timestamp. See https://waterloorocketry.slack.com/archives/C07MX0QDS/p1706481412008559?thread_ts=1706479899.045329&cid=C07MX0QDS
+from omnibus.util import BoardTimeline
 
+# The ahead and behind stream filters are an intermediary hack that drops one of the sources of CAN messages. The board_time mode instead keeps every message and times it from its board's own wrapped timestamp, ignoring the msgpacked timestamp, see https://waterloorocketry.slack.com/archives/C07MX0QDS/p1706481412008559?thread_ts=1706479899.045329&cid=C07MX0QDS
+FILTER_MODES = ["ahead_stream", "behind_stream", "board_time"]
 
-def msgpackFilterUnpacker(infile: IO, mode="behind_stream"):
-    """A function to unpack msgpack data, and then filter it to ensure timestamps are only increasing. Used to filter a second delayed source of messages in the same file."""
 
-    # unpack all messages
-    all_messages = []
-    for data in msgpack.Unpacker(infile):
-        all_messages.append(data)
+class TimestampFilter:
+    """A running filter that keeps track of the highest timestamp seen so far, to only keep messages from the ahead or behind stream of a file with a second delayed source of messages. Called with each message's timestamp in order, and returns whether to keep the message."""
+
+    def __init__(self, mode="behind_stream"):
+        if mode not in ("ahead_stream", "behind_stream"):
+            raise ValueError(f"Unknown msgpack filter mode {mode}")
+        self.mode = mode
+        self.curr_max_time = 0
+
+    def __call__(self, timestamp: float) -> bool:
+        # a message at or above the running max time is part of the ahead stream, anything lower is part of the behind stream
+        if timestamp >= self.curr_max_time:
+            self.curr_max_time = timestamp
+            return self.mode == "ahead_stream"
+        return self.mode == "behind_stream"
+
+
+class BoardTimestamps:
+    """Times CAN messages from their board's own clock rather than the time they were logged at, which puts messages from a second delayed source back where they belong instead of dropping them. Called with each CAN message's msgpacked timestamp and payload in order, and returns the message's time on the log's clock (see BoardTimeline.align)."""
+
+    def __init__(self):
+        self.timeline = BoardTimeline()
+
+    def __call__(self, timestamp: float, payload: dict) -> float:
+        data = payload.get("data")
+        board_time = data.get("time") if isinstance(data, dict) else None
+        if not isinstance(board_time, (int, float)):
+            return timestamp  # nothing to go off, so keep the msgpacked timestamp
+        return self.timeline.align((payload.get("board_id"), payload.get("msg_type")), board_time, timestamp)
+
+
+def stream_mask(timestamps: np.ndarray, running_max: np.ndarray, mode="behind_stream") -> np.ndarray:
+    """The vectorized version of TimestampFilter, for when the running max time before each message is already known: returns which of the messages to keep"""
+
+    if mode == "ahead_stream":
+        return timestamps >= running_max
+    elif mode == "behind_stream":
+        return timestamps < running_max
+    raise ValueError(f"Unknown msgpack filter mode {mode}")
+
+
+def msgpackFilterUnpacker(infile: IO, mode="behind_stream") -> Iterator[list]:
+    """A function to unpack msgpack data, and then filter it to ensure timestamps are only increasing. Used to filter a second delayed source of messages in the same file. Messages are streamed from the file rather than loaded all at once. In board_time mode every message is kept, with CAN messages timestamped by BoardTimestamps, so they may not be in order."""
 
     print(f"Processing msgpacked messages in mode {mode}")
 
-    # discard all messages if the current time is lower than running current time, by not adding them to the filtered and output list
-    filtered_messages = []
-    curr_max_time = 0
-    for i in range(len(all_messages) - 1):
-        if mode == "ahead_stream":
-            if all_messages[i][1] >= curr_max_time:
-                filtered_messages.append(all_messages[i])
-                curr_max_time = all_messages[i][1]
-        elif mode == "behind_stream":   # find all the messages that are higher than the current running time, and then actually discard the ones ahead and only keep the ones behind
-            if all_messages[i][1] >= curr_max_time:
-                curr_max_time = all_messages[i][1]
-            else:
-                filtered_messages.append(all_messages[i])
-        else:
-            raise ValueError(f"Unknown msgpack filter mode {mode}")
+    if mode == "board_time":
+        board_timestamps = BoardTimestamps()
+        for channel, timestamp, payload in msgpack.Unpacker(infile):
+            if channel.startswith("CAN/Parsley"):
+                timestamp = board_timestamps(timestamp, payload)
+            yield [channel, timestamp, payload]
+        return
 
-    return filtered_messages
+    keep = TimestampFilter(mode)
+    for data in msgpack.Unpacker(infile):
+        if keep(data[1]):
+            yield data
@@ -0,0 +1,138 @@
+# Extract the data of a log in chunks spread over several processes, for large logs on machines with many cores
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import msgpack
+import numpy as np
+
+from omnibus.util import LogSummary, summary_path
+
+from can_processing import CanExtractor
+from column_data import ColumnBuilder
+from daq_processing import DaqExtractor
+from msgpack_sorter_unpacker import stream_mask
+
+CHUNKS_PER_WORKER = 4  # more chunks than workers keeps every worker busy when chunks take different times
+MIN_CHUNK_SIZE = 1024 * 1024  # bytes, smaller chunks aren't worth sending to another process
+RESYNC_MESSAGES = 8  # messages that have to decode cleanly after a candidate boundary to trust it
+BOUNDARY_WINDOW = 64 * 1024  # bytes searched for a message boundary at a time
+
+
+def is_message(data) -> bool:
+    """Check if unpacked data looks like a [channel, timestamp, payload] log message"""
+
+    return isinstance(data, list) and len(data) == 3 and isinstance(data[0], str) and isinstance(data[1], (int, float))
+
+
+def find_boundary(infile, offset: int, size: int) -> int:
+    """Find the first message boundary at or after offset, for logs without an index to tell us where messages start. A position is a boundary if the next few messages all decode as log messages from it. Returns size if there's no boundary before the end of the log."""
+
+    while offset < size:
+        infile.seek(offset)
+        window = infile.read(BOUNDARY_WINDOW)
+        for i in range(len(window)):
+            if window[i] == 0x93 and is_boundary(infile, offset + i):  # every message is a msgpack array of 3 items
+                return offset + i
+        if not window:
+            break
+        offset += len(window)
+    return size
+
+
+def is_boundary(infile, offset: int) -> bool:
+    """Check if the next RESYNC_MESSAGES messages (or the rest of the log) decode cleanly as log messages from offset"""
+
+    infile.seek(offset)
+    checked = 0
+    try:
+        for data in msgpack.Unpacker(infile):
+            if not is_message(data):
+                return False
+            checked += 1
+            if checked >= RESYNC_MESSAGES:
+                break
+    except (ValueError, TypeError, msgpack.UnpackException):
+        return False
+    # running out of log is fine as long as what was there decoded cleanly
+    return True
+
+
+def chunk_offsets(log_path: str, chunks: int) -> List[int]:
+    """Split the log into about the given number of chunks, returning the byte offset each chunk starts at plus the end of the log. The log's summary index is used for the offsets if it has one, otherwise the chunks are resynchronized on message boundaries."""
+
+    size = os.path.getsize(log_path)
+    chunk_size = max(size // max(chunks, 1), MIN_CHUNK_SIZE)
+    summary = LogSummary.load(summary_path(log_path))
+    offsets = [0]
+    if summary is not None and summary.size == size:
+        for offset, _, _ in summary.index:
+            if offset - offsets[-1] >= chunk_size:
+                offsets.append(offset)
+    else:
+        with open(log_path, "rb") as infile:
+            for target in range(chunk_size, size, chunk_size):
+                offset = find_boundary(infile, max(target, offsets[-1] + 1), size)
+                if offset < size:
+                    offsets.append(offset)
+    return offsets + [size]
+
+
+def extract_chunk(log_path: str, start: int, end: int, aggregate_function_name: str) -> dict:
+    """Extract every DAQ and CAN column from the messages starting between byte offsets start and end. Whether a CAN message is in the ahead or behind stream depends on messages in earlier chunks, so every CAN message is extracted along with the running max time before it within the chunk, and the filtering is done once the chunks are put together."""
+
+    daq_extractor = DaqExtractor(aggregate_function_name=aggregate_function_name)
+    can_extractor = CanExtractor()
+    running_max = []  # for each CAN line, the max time of the messages before it in this chunk
+    chunk_max = -np.inf
+    with open(log_path, "rb") as infile:
+        infile.seek(start)
+        unpacker = msgpack.Unpacker(infile)
+        for channel, timestamp, payload in unpacker:
+            if channel.startswith("DAQ"):
+                daq_extractor.feed(timestamp, payload)
+            elif channel.startswith("CAN/Parsley"):
+                lines = len(can_extractor.builder.times)
+                can_extractor.feed(timestamp, payload)
+                if len(can_extractor.builder.times) > lines:
+                    running_max.append(chunk_max)
+            chunk_max = max(chunk_max, timestamp)
+            if start + unpacker.tell() >= end:
+                break
+
+    return {
+        "daq": daq_extractor.builder.to_dict(),
+        "can": can_extractor.builder.to_dict(),
+        "can_running_max": np.array(running_max, dtype=np.float64).tobytes(),
+        "max": chunk_max,
+    }
+
+
+def parallel_extraction(log_path: str, aggregate_function_name="average", msg_packed_filtering="behind_stream", workers=None) -> Tuple[DaqExtractor, CanExtractor]:
+    """Extract every DAQ and CAN column of the log like extract_lines does, but with the log split into chunks that are extracted in parallel by a pool of worker processes. The chunks' data is joined back together in order."""
+
+    workers = workers or os.cpu_count()
+    offsets = chunk_offsets(log_path, workers * CHUNKS_PER_WORKER)
+    print(f"Processing msgpacked messages in mode {msg_packed_filtering} in {len(offsets) - 1} chunks on {workers} workers")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = list(executor.map(extract_chunk, [log_path] * (len(offsets) - 1), offsets[:-1], offsets[1:],
+                                   [aggregate_function_name] * (len(offsets) - 1)))
+
+    daq_builders = []
+    can_builders = []
+    previous_max = 0  # the running max time starts at 0, like TimestampFilter
+    for chunk in chunks:
+        daq_builders.append(ColumnBuilder.from_dict(chunk["daq"]))
+        can_builder = ColumnBuilder.from_dict(chunk["can"])
+        # the running max time before each CAN message is the max of this chunk's messages before it and every earlier chunk's
+        running_max = np.maximum(np.frombuffer(chunk["can_running_max"], dtype=np.float64), previous_max)
+        can_builder.select_rows(stream_mask(np.asarray(can_builder.times), running_max, msg_packed_filtering))
+        can_builders.append(can_builder)
+        previous_max = max(previous_max, chunk["max"])
+
+    daq_extractor = DaqExtractor(aggregate_function_name=aggregate_function_name)
+    can_extractor = CanExtractor()
+    daq_extractor.builder = ColumnBuilder.concatenate(daq_builders)
+    can_extractor.builder = ColumnBuilder.concatenate(can_builders)
+    return daq_extractor, can_extractor
@@ -0,0 +1,67 @@
+import msgpack
+import pytest
+
+import parallel_extraction
+from can_processing import CanExtractor
+from conftest import assert_same_data
+from daq_processing import DaqExtractor
+from log_extraction import extract_lines
+from omnibus.util import LogSummary, summary_path
+from parallel_extraction import chunk_offsets, find_boundary, parallel_extraction as extract_in_parallel
+
+
+def serial_extraction(log_path, msg_packed_filtering):
+    daq_extractor = DaqExtractor()
+    can_extractor = CanExtractor()
+    with open(log_path, "rb") as infile:
+        extract_lines(infile, daq_extractor, can_extractor, msg_packed_filtering)
+    return daq_extractor, can_extractor
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+@pytest.mark.parametrize("msg_packed_filtering", ["ahead_stream", "behind_stream"])
+def test_matches_serial(log_path, small_chunks, indexed, msg_packed_filtering):
+    if indexed:
+        LogSummary.for_log(log_path)
+        assert LogSummary.load(summary_path(log_path)) is not None
+    offsets = chunk_offsets(log_path, 8)
+    assert len(offsets) > 3
+
+    daq_extractor, can_extractor = extract_in_parallel(log_path, msg_packed_filtering=msg_packed_filtering, workers=2)
+    serial_daq, serial_can = serial_extraction(log_path, msg_packed_filtering)
+
+    assert_same_data(daq_extractor.finish(), serial_daq.finish())
+    assert_same_data(can_extractor.finish(), serial_can.finish())
+    assert len(can_extractor.finish()) > 0
+
+
+def test_chunk_offsets_are_boundaries(log_path, small_chunks):
+    unindexed = chunk_offsets(log_path, 8)
+    LogSummary.for_log(log_path)
+    indexed = chunk_offsets(log_path, 8)
+
+    with open(log_path, "rb") as infile:
+        unpacker = msgpack.Unpacker(infile)
+        boundaries = {0}
+        for _ in unpacker:
+            boundaries.add(unpacker.tell())
+    assert set(unindexed) <= boundaries
+    assert set(indexed) <= boundaries
+    assert unindexed == sorted(unindexed) and indexed == sorted(indexed)
+
+
+def test_find_boundary_past_long_garbage(tmp_path, monkeypatch):
+    # many windows with no boundary in them, which used to recurse once per window
+    monkeypatch.setattr(parallel_extraction, "BOUNDARY_WINDOW", 16)
+    path = tmp_path / "test.log"
+    garbage = b"\xc1" * 100_000
+    message = msgpack.packb(["DAQ", 1.0, {"timestamp": 1.0, "data": {}}])
+    path.write_bytes(garbage + message * 3)
+    size = len(garbage) + 3 * len(message)
+
+    with open(path, "rb") as infile:
+        assert find_boundary(infile, 0, size) == len(garbage)
+        assert find_boundary(infile, len(garbage) + 1, size) == len(garbage) + len(message)
+    path.write_bytes(garbage)
+    with open(path, "rb") as infile:
+        assert find_boundary(infile, 0, len(garbage)) == len(garbage)
@@ -0,0 +1,80 @@
+# Plot columns with millions of rows quickly by only drawing the min and max of the rows under each pixel, redrawn from the full data whenever the view changes
+import numpy as np
+
+POINTS_PER_PIXEL = 2  # a min and a max for every pixel column keeps spikes visible
+
+
+def envelope_indexes(values: np.ndarray, buckets: int) -> np.ndarray:
+    """Split the values into about the given number of buckets of consecutive rows, and return the indexes of the smallest and largest value of each bucket along with the first and last row, in order. Missing (NaN) values are only picked in buckets with nothing else."""
+
+    n = len(values)
+    if n <= buckets * POINTS_PER_PIXEL:
+        return np.arange(n)
+    size = -(-n // buckets)  # rows per bucket, rounded up so there are at most the given number of buckets
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(buckets, size)
+    smallest = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    largest = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    indexes = np.sort(np.stack([smallest, largest], axis=1), axis=1) + np.arange(buckets)[:, None] * size
+    # the first and last rows too, so the line spans the same time as the data
+    return np.concatenate([[0], np.minimum(indexes.ravel(), n - 1), [n - 1]])
+
+
+def change_indexes(values: np.ndarray, buckets: int) -> np.ndarray:
+    """For columns that aren't numbers (like actuator states) there's no min or max, but their values only change now and then, so return the indexes of the rows on either side of every change plus the first and last row"""
+
+    n = len(values)
+    if n <= buckets * POINTS_PER_PIXEL:
+        return np.arange(n)
+    changes = np.flatnonzero(values[1:] != values[:-1]) + 1
+    return np.unique(np.concatenate([[0], changes - 1, changes, [n - 1]]))
+
+
+class DecimatedLine:
+    """A line on a plot that only draws about POINTS_PER_PIXEL points per pixel of its axes' width, picked from the full resolution data for the part of it that's in view"""
+
+    def __init__(self, ax, time: np.ndarray, values: np.ndarray, **kwargs):
+        if values.dtype == object:
+            # missing values can't be drawn like NaN can in numeric columns, so leave them out
+            present = np.array([value is not None for value in values], dtype=bool)
+            time, values = time[present], values[present]
+        order = np.argsort(time, kind="stable")  # the visible rows are found by searching the times
+        self.time = time[order]
+        self.values = values[order]
+        self.ax = ax
+        # plotted with the points for the whole data straight away, so matplotlib sets up the axis for the values (like categories for strings)
+        self.line, = ax.plot(*self.points(-np.inf, np.inf), **kwargs)
+
+    def points(self, start: float, stop: float):
+        """Pick the times and values to draw for the rows between start and stop"""
+
+        # one row past each edge, so the line carries on out of view instead of stopping short
+        first = max(np.searchsorted(self.time, start, side="left") - 1, 0)
+        last = min(np.searchsorted(self.time, stop, side="right") + 1, len(self.time))
+        buckets = max(int(self.ax.bbox.width), 1)
+
+        values = self.values[first:last]
+        if values.dtype == object:
+            indexes = change_indexes(values, buckets)
+        else:
+            indexes = envelope_indexes(values, buckets)
+        return self.time[first:last][indexes], values[indexes]
+
+    def update(self) -> None:
+        """Redraw the line for the current view"""
+
+        if self.ax.get_autoscalex_on():
+            self.line.set_data(*self.points(-np.inf, np.inf))  # the view is still being fit to the data, so all of it is in view
+        else:
+            self.line.set_data(*self.points(*self.ax.get_xlim()))
+
+
+def plot_decimated(ax, time: np.ndarray, values: np.ndarray, **kwargs) -> DecimatedLine:
+    """Plot a column like ax.plot, but decimated to the axes' width and redrawn from the full data when the plot is zoomed, panned or resized"""
+
+    line = DecimatedLine(ax, time, values, **kwargs)
+    ax.callbacks.connect("xlim_changed", lambda ax: line.update())
+    ax.figure.canvas.mpl_connect("resize_event", lambda event: line.update())
+    return line
@@ -0,0 +1,56 @@
+import numpy as np
+
+from preview_plotting import POINTS_PER_PIXEL, change_indexes, envelope_indexes
+
+
+class TestEnvelopeIndexes:
+    def test_few_points(self):
+        # with no more points than would be drawn anyway, every point is kept
+        values = np.array([3.0, np.nan, 1.0, 2.0])
+        np.testing.assert_array_equal(envelope_indexes(values, 2), [0, 1, 2, 3])
+        np.testing.assert_array_equal(envelope_indexes(values[:0], 2), [])
+
+    def test_min_and_max_of_each_bucket(self):
+        values = np.array([5, 1, 9, 2,   4, 4, 4, 4,   0, 7, 3, 8,   6, 2, 6, 1,   3, 3], dtype=float)
+        indexes = envelope_indexes(values, 5)
+
+        # buckets of 4 rows: the min and max of each in order, plus the first and last row
+        np.testing.assert_array_equal(indexes, [0, 1, 2, 4, 4, 8, 11, 12, 15, 16, 16, 17])
+        assert np.all(np.diff(indexes) >= 0)
+
+    def test_first_and_last_kept(self):
+        # the first and last rows are neither the min nor the max of their buckets
+        values = np.array([5, 0, 9, 5] * 10 + [5, 9, 0, 5], dtype=float)
+        indexes = envelope_indexes(values, 4)
+        assert indexes[0] == 0 and indexes[-1] == len(values) - 1
+        assert len(indexes) <= 2 * 4 + 2
+
+    def test_spikes_kept(self):
+        values = np.zeros(10_000)
+        values[1234], values[8765] = 100, -100
+        indexes = envelope_indexes(values, 10)
+        assert 1234 in indexes and 8765 in indexes
+        assert len(indexes) <= 2 * 10 + 2
+
+    def test_missing_values(self):
+        values = np.array([np.nan, 2, np.nan, 1,   np.nan, np.nan, np.nan, np.nan,   3, np.nan, 4, np.nan])
+        indexes = envelope_indexes(values, 3)
+        assert len(values) > 3 * POINTS_PER_PIXEL
+
+        # NaN is only picked in the bucket with nothing else
+        np.testing.assert_array_equal(indexes, [0, 1, 3, 4, 4, 8, 10, 11])
+        assert not np.isnan(values[indexes[[1, 2, 5, 6]]]).any()
+
+    def test_uneven_buckets(self):
+        # 10 rows in buckets of 3 leave a last bucket of one row, which mustn't pick the padding after it
+        values = np.arange(10, dtype=float)[::-1]
+        indexes = envelope_indexes(values, 4)
+        assert indexes.max() == 9
+        np.testing.assert_array_equal(indexes, [0, 0, 2, 3, 5, 6, 8, 9, 9, 9])
+
+
+class TestChangeIndexes:
+    def test_changes(self):
+        values = np.array(["a"] * 5 + ["b"] * 5 + ["a"] * 5, dtype=object)
+        np.testing.assert_array_equal(change_indexes(values, 2), [0, 4, 5, 9, 10, 14])
+        np.testing.assert_array_equal(change_indexes(values[:4], 2), [0, 1, 2, 3])
@@ -0,0 +1,117 @@
+# Query the messages of a log by channel, time and payload fields, and write the matches as JSON lines, CSV or NumPy arrays
+# The query engine itself is omnibus.util.LogQuery, so other tools can run the same queries
+import argparse
+import csv
+import sys
+from typing import IO, Iterable, List
+
+import numpy as np
+
+from omnibus.util import LogQuery, encode_json, encode_line
+from omnibus.util.log_query import MISSING, field_path, get_field
+
+OUTPUT_FORMATS = ["jsonl", "csv", "npz"]
+
+
+def write_jsonl(messages: Iterable[tuple], outfile: IO) -> int:
+    """Write every message as a JSON list of [channel, timestamp, payload] on its own line, and return how many there were. NaN is written as null and keys that aren't strings as strings, so every line is valid JSON."""
+
+    count = 0
+    for message in messages:
+        outfile.write(encode_line(message).decode())
+        count += 1
+    return count
+
+
+def write_csv(messages: Iterable[tuple], outfile: IO, fields: List[str]) -> int:
+    """Write the channel, timestamp and the given fields (or the whole payload as JSON) of every message as a csv row, with empty cells for missing fields, and return how many there were"""
+
+    paths = [field_path(field) for field in fields]
+    writer = csv.writer(outfile)
+    writer.writerow(["channel", "time"] + (fields or ["payload"]))
+    count = 0
+    for channel, timestamp, payload in messages:
+        if paths:
+            values = [get_field(payload, path) for path in paths]
+            writer.writerow([channel, timestamp] + ["" if value is MISSING else value for value in values])
+        else:
+            writer.writerow([channel, timestamp, encode_json(payload).decode()])
+        count += 1
+    return count
+
+
+def write_npz(messages: Iterable[tuple], file_path: str, fields: List[str]) -> int:
+    """Save the channel, timestamp and the given fields of every message as NumPy arrays in a .npz archive, and return how many there were. Fields that are all numbers are stored as floats with NaN where they're missing, anything else as strings."""
+
+    paths = [field_path(field) for field in fields]
+    channels, times = [], []
+    values = [[] for _ in paths]
+    for channel, timestamp, payload in messages:
+        channels.append(channel)
+        times.append(timestamp)
+        for path, field_values in zip(paths, values):
+            field_values.append(get_field(payload, path))
+
+    arrays = {"channel": np.array(channels, dtype=str), "time": np.array(times, dtype=np.float64)}
+    for field, field_values in zip(fields, values):
+        if all(value is MISSING or (isinstance(value, (int, float)) and not isinstance(value, bool)) for value in field_values):
+            arrays[field] = np.array([np.nan if value is MISSING else value for value in field_values], dtype=np.float64)
+        else:
+            arrays[field] = np.array(["" if value is MISSING else str(value) for value in field_values], dtype=str)
+    np.savez(file_path, **arrays)
+    return len(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the messages in a log matching a query, like: msg_type == \"SENSOR_ANALOG\" and data.value > 3000")
+    parser.add_argument("file", help="The log file to query")
+    parser.add_argument("query", nargs="?", default=None,
+                        help="An expression over the payload fields (like data.value), channel, time (the logged timestamp) and whole payload of each message, with comparisons, in, and, or, not, startswith and endswith. Leave out to match every message")
+    parser.add_argument("-c", "--channel", default="", help="Only match channels starting with this prefix")
+    parser.add_argument("--start", type=float, help="Only match messages logged at or after this timestamp")
+    parser.add_argument("--stop", type=float, help="Only match messages logged at or before this timestamp")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="jsonl", help="The output format (default: jsonl)")
+    parser.add_argument("--fields", action="append", default=[],
+                        help="A payload field to output for csv and npz, like data.value, repeatable. csv outputs the whole payload if none are given")
+    parser.add_argument("-o", "--output", help="The file to write to (default: stdout, or <log>_query.npz for npz)")
+    parser.add_argument("--count", action="store_true", help="Only print the number of matching messages")
+    args = parser.parse_args()
+
+    try:
+        query = LogQuery(args.query, args.channel, args.start, args.stop)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    messages = query.run(args.file)
+
+    if args.count:
+        print(sum(1 for _ in messages))
+        return
+
+    if args.format == "npz":
+        if not args.fields:
+            print("npz output needs the fields to output, pass them with --fields", file=sys.stderr)
+            sys.exit(1)
+        output_path = args.output or f"{args.file.split('.log')[0]}_query.npz"
+        count = write_npz(messages, output_path, args.fields)
+        print(f"{count} matching messages written to {output_path}", file=sys.stderr)
+        return
+
+    outfile = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "jsonl":
+            count = write_jsonl(messages, outfile)
+        else:
+            count = write_csv(messages, outfile, args.fields)
+    except BrokenPipeError:  # piped into something like head that stopped reading
+        sys.stderr.close()
+        return
+    finally:
+        if args.output:
+            outfile.close()
+    print(f"{count} matching messages", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
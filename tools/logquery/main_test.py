@@ -0,0 +1,32 @@
+import csv
+import io
+import json
+
+from tools.logquery.main import write_csv, write_jsonl
+
+MESSAGES = [
+    ("DAQ", 1.0, {"timestamp": 1.0, "data": {"fake0": [float("nan"), 0]}}),
+    ("CAN/Parsley", 2.0, {"msg_type": "SENSOR_ANALOG", "data": {"value": float("inf")}, b"\x01": 1}),
+]
+
+
+def test_write_jsonl():
+    outfile = io.StringIO()
+    assert write_jsonl(MESSAGES, outfile) == 2
+    lines = outfile.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        ["DAQ", 1.0, {"timestamp": 1.0, "data": {"fake0": [None, 0]}}],
+        ["CAN/Parsley", 2.0, {"msg_type": "SENSOR_ANALOG", "data": {"value": None}, "01": 1}],
+    ]
+
+
+def test_write_csv():
+    outfile = io.StringIO()
+    assert write_csv(MESSAGES, outfile, []) == 2
+    rows = list(csv.reader(io.StringIO(outfile.getvalue())))
+    assert rows[0] == ["channel", "time", "payload"]
+    assert json.loads(rows[2][2]) == {"msg_type": "SENSOR_ANALOG", "data": {"value": None}, "01": 1}
+
+    outfile = io.StringIO()
+    write_csv(MESSAGES, outfile, ["msg_type"])
+    assert outfile.getvalue().splitlines() == ["channel,time,msg_type", "DAQ,1.0,", "CAN/Parsley,2.0,SENSOR_ANALOG"]